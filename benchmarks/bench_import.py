@@ -0,0 +1,83 @@
+"""Import time gate of the scraping core - fails when a heavy dependency or a slow import sneaks in.
+
+Every module is imported in a fresh interpreter under `python -X importtime`; the
+cumulative import time of the module (median of --repeat runs) and the heavy packages
+it pulled in are reported:
+
+    python benchmarks/bench_import.py --max-ms 400 --output imports.json
+    python benchmarks/bench_import.py --baseline imports.json --tolerance 1.5
+
+The exit code is 1 if a core module imports one of HEAVY, takes longer than --max-ms,
+or is slower than --tolerance times its --baseline time.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC = Path(__file__).parents[1] / 'src'
+# The scraping core (fetch, parse, write) - pandas and pyarrow load only in the stages needing them
+CORE_MODULES = ['main', 'scrape.voting', 'scrape.member', 'scrape.stages', 'scrape.shards', 'scrape.incremental', 'scrape.store']
+HEAVY = ['pandas', 'pyarrow', 'numpy', 'openpyxl']
+
+def import_time(module):
+    """(cumulative import time in ms, imported top-level packages) of a fresh import of the module."""
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        cwd=SRC, check=True, capture_output=True, text=True
+    ).stderr
+    cumulative = None
+    packages = set()
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, total, name = line.split('|')
+        if not total.strip().isdigit():
+            continue
+        packages.add(name.strip().split('.')[0])
+        if name.strip() == module:
+            cumulative = int(total) / 1000
+    return cumulative, packages
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure and gate the import time of the scraping core.')
+    parser.add_argument('--modules', type=str, default=','.join(CORE_MODULES), help='Comma separated modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of fresh imports per module, the median is reported')
+    parser.add_argument('--max-ms', type=float, default=400.0, help='Fail if a module takes longer to import')
+    parser.add_argument('--baseline', type=str, default='', help='Results of a previous run (--output) to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.5, help='Fail if a module is this many times slower than in --baseline')
+    parser.add_argument('--output', type=str, default='', help='Save the results as JSON')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    failures = []
+    for module in args.modules.split(','):
+        runs = [import_time(module) for _ in range(args.repeat)]
+        milliseconds = statistics.median(run[0] for run in runs)
+        heavy = sorted(set(HEAVY) & set.union(*(run[1] for run in runs)))
+        results[module] = {'import_ms': round(milliseconds, 1), 'heavy': heavy}
+        print(f"{module:22} {milliseconds:8.1f} ms  {', '.join(heavy) or '-'}")
+
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)}")
+        if milliseconds > args.max_ms:
+            failures.append(f"{module} takes {milliseconds:.0f} ms to import (limit {args.max_ms:.0f} ms)")
+        if module in baseline and milliseconds > baseline[module]['import_ms'] * args.tolerance:
+            failures.append(f"{module} takes {milliseconds:.0f} ms to import, {baseline[module]['import_ms']:.0f} ms in the baseline")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': {k: v for k, v in vars(args).items() if k != 'output'}, 'results': results}, f, indent=4)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark suite - parse time per page, end-to-end throughput and peak memory of every stage.
+
+Runs against the local fixture server (see fixture_server.py), every stage in its own
+process so that the peak RSS is measured per stage:
+
+    python benchmarks/bench_suite.py --votings 500 --latency 0.005 --concurrency 16 --output bench.json
+
+Stages: parse (us/page of each page type), voting (`scrape_voting_data` to JSONL),
+member (`add_member_info_to_voting_data`), document (`add_documents_to_voting_data`)
+and convert (`convert_to_excel.py`); the last three work on the votings of the voting stage.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from fixture_server import FIXTURES, base_url, start_server
+
+SRC = Path(__file__).parents[1] / 'src'
+STAGES = ['parse', 'voting', 'member', 'document', 'convert']
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _per_page_us(function, content, repeat):
+    function(content)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(content)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def bench_parse(args, logger):
+    from scrape.document import parse_document_details, parse_voting_document_id
+    from scrape.member import parse_member_info, parse_member_membership
+    from scrape.page import MEMBER_PANELS, make_soup
+    from scrape.voting import build_voting_record
+
+    def parse_member(content):
+        soup = make_soup(content, parse_only=MEMBER_PANELS)
+        return parse_member_info(soup, logger), parse_member_membership(soup, logger)
+
+    pages = {name: (FIXTURES / f"{name}.html").read_bytes() for name in ['hlasklub', 'poslanec', 'vyhladavanie_vysledok', 'cpt']}
+    return {
+        'hlasklub_us': _per_page_us(lambda content: build_voting_record(1, content, logger), pages['hlasklub'], args.repeat),
+        'poslanec_us': _per_page_us(parse_member, pages['poslanec'], args.repeat),
+        'vyhladavanie_vysledok_us': _per_page_us(lambda content: parse_voting_document_id(content, logger), pages['vyhladavanie_vysledok'], args.repeat),
+        'cpt_us': _per_page_us(lambda content: parse_document_details(content, logger), pages['cpt'], args.repeat),
+    }
+
+def bench_voting(args, logger):
+    from scrape.voting import scrape_voting_data
+    start = time.perf_counter()
+    scrape_voting_data(1, args.votings, os.path.join(args.workdir, 'votings.jsonl'), logger=logger, concurrency=args.concurrency, rate=args.rate, parse_workers=args.parse_workers)
+    return {'seconds': time.perf_counter() - start}
+
+def bench_member(args, logger):
+    from scrape.member import add_member_info_to_voting_data
+    start = time.perf_counter()
+    add_member_info_to_voting_data(os.path.join(args.workdir, 'votings.jsonl'), logger=logger, save_to_file=os.path.join(args.workdir, 'votings_member.jsonl'))
+    return {'seconds': time.perf_counter() - start}
+
+def bench_document(args, logger):
+    from scrape.document import add_documents_to_voting_data
+    start = time.perf_counter()
+    add_documents_to_voting_data(os.path.join(args.workdir, 'votings.jsonl'), logger=logger, save_to_file=os.path.join(args.workdir, 'votings_document.jsonl'))
+    return {'seconds': time.perf_counter() - start}
+
+def bench_convert(args, logger):
+    sys.argv = ['convert_to_excel.py', '--input-voting', os.path.join(args.workdir, 'votings.jsonl'), '--output-file', os.path.join(args.workdir, 'voting.xlsx')]
+    start = time.perf_counter()
+    runpy.run_path(str(SRC / 'convert' / 'convert_to_excel.py'), run_name='__main__')
+    return {'seconds': time.perf_counter() - start}
+
+def run_stage(args):
+    """Child process - run one stage and print its results as JSON."""
+    sys.path.insert(0, str(SRC))
+    logger = logging.getLogger('bench')
+    logger.setLevel(logging.CRITICAL)
+    result = globals()[f"bench_{args.stage}"](args, logger)
+    if 'seconds' in result:
+        result['votings_per_second'] = args.votings / result['seconds']
+    result['peak_rss_mb'] = _peak_rss_mb()
+    print(json.dumps(result))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scraper stages against the local fixture server.')
+    parser.add_argument('--votings', type=int, default=200, help='Number of votings scraped')
+    parser.add_argument('--latency', type=float, default=0.0, help='Server side latency per page in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=1000.0)
+    parser.add_argument('--parse-workers', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=200, help='Number of parses per page type')
+    parser.add_argument('--stages', type=str, default=','.join(STAGES), help='Comma separated stages to run')
+    parser.add_argument('--output', type=str, default='', help='Save the results as JSON, e.g. to compare two commits')
+    parser.add_argument('--stage', type=str, default='', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', type=str, default='', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        return run_stage(args)
+
+    server = start_server(latency=args.latency, error_rate=args.error_rate)
+    env = {**os.environ, 'NRSR_BASE_URL': base_url(server)}
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for stage in args.stages.split(','):
+            command = [
+                sys.executable, __file__, '--stage', stage, '--workdir', workdir,
+                '--votings', str(args.votings), '--concurrency', str(args.concurrency), '--rate', str(args.rate),
+                '--parse-workers', str(args.parse_workers), '--repeat', str(args.repeat),
+            ]
+            output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+            results[stage] = json.loads(output.strip().splitlines()[-1])
+    server.shutdown()
+
+    for stage, result in results.items():
+        print(f"{stage}:")
+        for key, value in result.items():
+            print(f"    {key:26} {value:12.1f}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'args': {k: v for k, v in vars(args).items() if k not in ('stage', 'workdir', 'output')}, 'results': results}, f, indent=4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Compare the serial and the concurrent voting scrape against a local stand-in server.
+
+    python benchmarks/bench_voting_fetch.py --start-id 1 --end-id 200 --latency 0.05 --concurrency 16
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from fixture_server import base_url, start_server
+
+def main():
+    parser = argparse.ArgumentParser(description='Serial vs. concurrent voting scrape throughput.')
+    parser.add_argument('--start-id', type=int, default=1)
+    parser.add_argument('--end-id', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05, help='Server side latency per page in seconds')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=200.0)
+    parser.add_argument('--parse-workers', type=int, default=0, help='Also run the fetch/parse pipeline with this many parser processes')
+    args = parser.parse_args()
+
+    server = start_server(latency=args.latency)
+    os.environ['NRSR_BASE_URL'] = base_url(server)
+    sys.path.insert(0, str(Path(__file__).parents[1] / 'src'))
+    from scrape.voting import scrape_voting_data
+
+    logger = logging.getLogger('bench')
+    logger.setLevel(logging.WARNING)
+    nr_votings = args.end_id - args.start_id + 1
+
+    start = time.perf_counter()
+    serial = scrape_voting_data(args.start_id, args.end_id, None, logger=logger)
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    concurrent = scrape_voting_data(args.start_id, args.end_id, None, logger=logger, concurrency=args.concurrency, rate=args.rate)
+    concurrent_time = time.perf_counter() - start
+
+    if args.parse_workers:
+        start = time.perf_counter()
+        pipelined = scrape_voting_data(args.start_id, args.end_id, None, logger=logger, concurrency=args.concurrency, rate=args.rate, parse_workers=args.parse_workers)
+        pipelined_time = time.perf_counter() - start
+
+    server.shutdown()
+
+    print(f"serial:     {serial_time:7.2f} s  {nr_votings / serial_time:8.1f} votings/s")
+    print(f"concurrent: {concurrent_time:7.2f} s  {nr_votings / concurrent_time:8.1f} votings/s  (concurrency={args.concurrency}, rate={args.rate}/s)")
+    print(f"speedup:    {serial_time / concurrent_time:7.1f}x")
+    print(f"identical output: {serial == concurrent and list(serial) == list(concurrent)}")
+    if args.parse_workers:
+        print(f"pipelined:  {pipelined_time:7.2f} s  {nr_votings / pipelined_time:8.1f} votings/s  (fetch={args.concurrency}, parse={args.parse_workers})")
+        print(f"identical output: {serial == pipelined and list(serial) == list(pipelined)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Local stand-in for nrsr.sk serving the recorded pages in `fixtures/`.
+
+The pages are served under the same URL scheme (`/web/Default.aspx?sid=...`), picked by
+the last part of `sid`: hlasklub, poslanec, vyhladavanie_vysledok and cpt. Point the
+scraper to it with the NRSR_BASE_URL environment variable:
+
+    python benchmarks/fixture_server.py --port 8000 --latency 0.05 --error-rate 0.1
+    NRSR_BASE_URL=http://127.0.0.1:8000/web/Default.aspx python src/main.py --type voting --cache-dir ''
+"""
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = Path(__file__).parent / 'fixtures'
+PAGES = ['hlasklub', 'poslanec', 'vyhladavanie_vysledok', 'cpt']
+# nrsr.sk answers unknown IDs with a 200 error page
+ERROR_PAGE = b'<html><body>Nastala unexpected error.</body></html>'
+
+def load_pages():
+    return {name: (FIXTURES / f"{name}.html").read_bytes() for name in PAGES}
+
+def start_server(latency: float = 0.0, error_rate: float = 0.0, error_status: int = 503, max_voting_id: int | None = None, port: int = 0, seed: int | None = None):
+    """Serve the fixtures from a background thread.
+
+    Args:
+        latency (float): Seconds slept before every response.
+        error_rate (float): Share of requests answered with `error_status` instead of the page.
+        error_status (int): The status of injected errors, e.g. 503 or 429.
+        max_voting_id (int | None): Votings with a higher ID get the nrsr.sk error page.
+        port (int): The port, 0 picks a free one.
+        seed (int | None): Seed of the error injection.
+
+    Returns:
+        ThreadingHTTPServer: The server; `server.hits` counts requests per page, `server.shutdown()` stops it.
+    """
+    pages = load_pages()
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            query = parse_qs(urlsplit(self.path).query)
+            name = query.get('sid', [''])[0].split('/')[-1]
+            with lock:
+                server.hits[name] = server.hits.get(name, 0) + 1
+                fail = rng.random() < error_rate
+            time.sleep(latency)
+            if fail:
+                self.send_response(error_status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            body = pages.get(name, ERROR_PAGE)
+            if name == 'hlasklub' and max_voting_id is not None and int(query.get('ID', ['0'])[0]) > max_voting_id:
+                body = ERROR_PAGE
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    server.hits = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/web/Default.aspx"
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the recorded nrsr.sk pages locally.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds slept before every response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with --error-status')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--max-voting-id', type=int, default=None, help='Votings above this ID do not exist')
+    args = parser.parse_args()
+
+    server = start_server(args.latency, args.error_rate, args.error_status, args.max_voting_id, port=args.port)
+    print(f"Serving fixtures at {base_url(server)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
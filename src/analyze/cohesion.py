@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+from analyze.vote_matrix import NO_PARTY, VOTE_INDEX, VoteMatrix
+
+# Votes counted as an expressed position: [Z] za, [P] proti, [?] zdrzal sa
+CAST_CODES = [VOTE_INDEX['[Z]'], VOTE_INDEX['[P]'], VOTE_INDEX['[?]']]
+CHUNK_SIZE = 2048
+
+def _chunks(n_rows, chunk_size):
+    for start in range(0, n_rows, chunk_size):
+        yield slice(start, min(start + chunk_size, n_rows))
+
+def _cast_one_hot(votes):
+    """(votings, members, 3) float32 one-hot of the cast votes, all zeros for other codes."""
+    return np.stack([votes == code for code in CAST_CODES], axis=2).astype(np.float32)
+
+def agreement_matrix(matrix: VoteMatrix, chunk_size: int = CHUNK_SIZE):
+    """MP x MP share of votings where both members cast the same vote.
+
+    Only votings where both cast a vote ([Z], [P] or [?]) count. Computed as a sum of
+    matrix products over chunks of votings, so memory does not grow with the number of votings.
+
+    Returns:
+        pd.DataFrame: Agreement in 0-1 (NaN if the members never voted together), indexed by member ID.
+    """
+    n_members = len(matrix.member_ids)
+    same = np.zeros((n_members, n_members), dtype=np.float64)
+    both = np.zeros((n_members, n_members), dtype=np.float64)
+    for rows in _chunks(matrix.shape[0], chunk_size):
+        one_hot = _cast_one_hot(np.asarray(matrix.votes[rows]))
+        cast = one_hot.sum(axis=2)
+        # stack the one-hot planes as extra rows: sum over codes of X_k.T @ X_k in one product
+        stacked = one_hot.transpose(0, 2, 1).reshape(-1, n_members)
+        same += stacked.T @ stacked
+        both += cast.T @ cast
+    with np.errstate(invalid='ignore', divide='ignore'):
+        agreement = np.where(both > 0, same / both, np.nan)
+    return pd.DataFrame(agreement, index=matrix.member_ids, columns=matrix.member_ids)
+
+def _party_vote_counts(votes, parties, n_parties):
+    """(votings, parties, 3) counts of [Z]/[P]/[?] votes per party in each voting."""
+    n_rows = votes.shape[0]
+    code = np.full(votes.shape, -1, dtype=np.int64)
+    for i, cast_code in enumerate(CAST_CODES):
+        code[votes == cast_code] = i
+    valid = (code >= 0) & (parties != NO_PARTY)
+    rows = np.broadcast_to(np.arange(n_rows)[:, None], votes.shape)
+    flat = (rows[valid] * n_parties + parties[valid]) * len(CAST_CODES) + code[valid]
+    counts = np.bincount(flat, minlength=n_rows * n_parties * len(CAST_CODES))
+    return counts.reshape(n_rows, n_parties, len(CAST_CODES))
+
+def party_cohesion(matrix: VoteMatrix, chunk_size: int = CHUNK_SIZE):
+    """Rice index |za - proti| / (za + proti) of every party in every voting.
+
+    Returns:
+        pd.DataFrame: One row per voting and party with the vote counts and `rice_index`.
+    """
+    n_parties = len(matrix.party_names)
+    frames = []
+    for rows in _chunks(matrix.shape[0], chunk_size):
+        counts = _party_vote_counts(np.asarray(matrix.votes[rows]), np.asarray(matrix.parties[rows]), n_parties)
+        za, proti, zdrzal = counts[..., 0], counts[..., 1], counts[..., 2]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rice = np.abs(za - proti) / (za + proti)
+        voting, party = np.nonzero(counts.sum(axis=2) > 0)
+        frames.append(pd.DataFrame({
+            'voting_id': matrix.voting_ids[rows][voting],
+            'poslanec_klub': pd.Categorical.from_codes(party, categories=matrix.party_names),
+            'za': za[voting, party],
+            'proti': proti[voting, party],
+            'zdrzal': zdrzal[voting, party],
+            'rice_index': rice[voting, party],
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['voting_id', 'poslanec_klub', 'za', 'proti', 'zdrzal', 'rice_index'])
+    return pd.concat(frames, ignore_index=True)
+
+def rebellions(matrix: VoteMatrix, chunk_size: int = CHUNK_SIZE):
+    """Count votes against the majority of the member's party (hlasovanie_klub) in each voting.
+
+    The party majority is the most frequent cast vote; votings where the party is tied
+    are skipped. Only cast votes ([Z], [P], [?]) can be rebellions.
+
+    Returns:
+        pd.DataFrame: Per member the number of cast votes with a party majority, rebellions and their share.
+    """
+    n_parties = len(matrix.party_names)
+    n_members = len(matrix.member_ids)
+    votes_with_majority = np.zeros(n_members, dtype=np.int64)
+    rebel_votes = np.zeros(n_members, dtype=np.int64)
+    for rows in _chunks(matrix.shape[0], chunk_size):
+        votes = np.asarray(matrix.votes[rows])
+        parties = np.asarray(matrix.parties[rows])
+        counts = _party_vote_counts(votes, parties, n_parties)
+        majority = np.array(CAST_CODES)[counts.argmax(axis=2)]
+        top = np.sort(counts, axis=2)
+        has_majority = top[..., -1] > top[..., -2]
+
+        member_party = np.where(parties == NO_PARTY, 0, parties)
+        row_index = np.arange(votes.shape[0])[:, None]
+        member_majority = majority[row_index, member_party]
+        counted = np.isin(votes, CAST_CODES) & (parties != NO_PARTY) & has_majority[row_index, member_party]
+        votes_with_majority += counted.sum(axis=0)
+        rebel_votes += (counted & (votes != member_majority)).sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = rebel_votes / votes_with_majority
+    return pd.DataFrame({
+        'poslanec_id': matrix.member_ids,
+        'poslanec_priezvisko_meno': matrix.member_names,
+        'hlasov': votes_with_majority,
+        'hlasov_proti_klubu': rebel_votes,
+        'podiel_proti_klubu': share,
+    })
+
+def export_analytics(matrix: VoteMatrix, output_file: str):
+    """Save the agreement matrix, party cohesion and rebellions as sheets of one Excel file."""
+    agreement = agreement_matrix(matrix)
+    names = dict(zip(matrix.member_ids, matrix.member_names))
+    agreement.index = [names[member_id] for member_id in agreement.index]
+    agreement.columns = agreement.index
+    with pd.ExcelWriter(output_file) as writer:
+        party_cohesion(matrix).to_excel(writer, sheet_name='cohesion', index=False)
+        rebellions(matrix).to_excel(writer, sheet_name='rebellions', index=False)
+        agreement.to_excel(writer, sheet_name='agreement')
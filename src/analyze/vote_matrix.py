@@ -0,0 +1,170 @@
+import json
+import os
+from datetime import datetime
+import numpy as np
+from scrape.jsonl import iter_votings
+
+# Vote codes stored in the matrix, the position is the int8 code
+VOTE_CODES = ['[Z]', '[P]', '[?]', '[N]', '[0]', '[X]']
+VOTE_INDEX = {code: i for i, code in enumerate(VOTE_CODES)}
+# The member did not take part in the voting (was not a member of the parliament at the time)
+NO_VOTE = -1
+NO_PARTY = -1
+# The party (club) of votes without one, e.g. of members who are not in any club
+NO_PARTY_NAME = 'nezávislý'
+
+ARRAYS = ['votes', 'parties', 'voting_ids', 'member_ids', 'meetings', 'dates']
+
+def _parse_date(cas_hlasovania):
+    try:
+        return np.datetime64(datetime.strptime(cas_hlasovania, '%d. %m. %Y %H:%M'), 'm')
+    except (TypeError, ValueError):
+        return np.datetime64('NaT', 'm')
+
+class VoteMatrix:
+    """Votings x members matrix of int8 vote codes with index arrays for fast queries.
+
+    Rows are votings ordered by voting ID, columns members ordered by member ID.
+    `votes[i, j]` is the position of the vote code in `VOTE_CODES` (-1 if the member did not
+    take part), `parties[i, j]` the position of the member's party (club) in the voting in
+    `party_names`. Sorted views of meetings and dates make the meeting and date range
+    lookups a binary search, so queries cost O(slice) rather than O(dataset).
+
+    Args:
+        votes (np.ndarray): int8 (votings, members) vote codes.
+        parties (np.ndarray): int16 (votings, members) party codes.
+        voting_ids (np.ndarray): Voting ID of each row.
+        member_ids (np.ndarray): Member ID of each column.
+        meetings (np.ndarray): Meeting number (cislo_schodze) of each row.
+        dates (np.ndarray): datetime64[m] of each row.
+        party_names (list[str]): Names of the parties.
+        member_names (list[str]): Names of the members.
+    """
+    def __init__(self, votes, parties, voting_ids, member_ids, meetings, dates, party_names, member_names):
+        self.votes = votes
+        self.parties = parties
+        self.voting_ids = voting_ids
+        self.member_ids = member_ids
+        self.meetings = meetings
+        self.dates = dates
+        # matrices saved before missing parties were labelled have None among the names
+        self.party_names = [NO_PARTY_NAME if name is None else name for name in party_names]
+        self.member_names = list(member_names)
+        self._party_index = {name: i for i, name in enumerate(self.party_names)}
+        self._meeting_order = np.argsort(meetings, kind='stable')
+        self._sorted_meetings = meetings[self._meeting_order]
+        self._date_order = np.argsort(dates, kind='stable')
+        self._sorted_dates = dates[self._date_order]
+
+    @property
+    def shape(self):
+        return self.votes.shape
+
+    @classmethod
+    def from_votings(cls, source):
+        """Build the matrix from `scrape_voting_data` output - a dict or a JSON/JSONL/Parquet dataset."""
+        rows = []
+        member_names = {}
+        party_names = {}
+        for voting_id, voting in iter_votings(source):
+            votes = []
+            for vote in voting.get('hlasovanie', []):
+                member_id = int(vote['poslanec_id'])
+                member_names.setdefault(member_id, vote.get('poslanec_meno'))
+                party = party_names.setdefault(vote.get('hlasovanie_klub') or NO_PARTY_NAME, len(party_names))
+                votes.append((member_id, VOTE_INDEX.get(vote.get('hlas_id'), NO_VOTE), party))
+            meeting = voting.get('cislo_schodze')
+            rows.append((int(voting_id), int(meeting) if meeting and str(meeting).isdigit() else -1, _parse_date(voting.get('cas_hlasovania')), votes))
+        rows.sort(key=lambda row: row[0])
+
+        member_ids = np.array(sorted(member_names), dtype=np.int32)
+        column = {member_id: j for j, member_id in enumerate(member_ids.tolist())}
+        votes = np.full((len(rows), len(member_ids)), NO_VOTE, dtype=np.int8)
+        parties = np.full((len(rows), len(member_ids)), NO_PARTY, dtype=np.int16)
+        for i, (_, _, _, row_votes) in enumerate(rows):
+            if not row_votes:
+                continue
+            columns, codes, row_parties = zip(*row_votes)
+            columns = [column[member_id] for member_id in columns]
+            votes[i, columns] = codes
+            parties[i, columns] = row_parties
+
+        return cls(
+            votes=votes,
+            parties=parties,
+            voting_ids=np.array([row[0] for row in rows], dtype=np.int64),
+            member_ids=member_ids,
+            meetings=np.array([row[1] for row in rows], dtype=np.int32),
+            dates=np.array([row[2] for row in rows], dtype='datetime64[m]'),
+            party_names=list(party_names),
+            member_names=[member_names[member_id] for member_id in member_ids.tolist()],
+        )
+
+    def save(self, directory):
+        """Save the arrays as .npy files (plus names in meta.json) to the directory."""
+        os.makedirs(directory, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'party_names': self.party_names, 'member_names': self.member_names}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory, mmap: bool = True):
+        """Load a saved matrix; with `mmap` the arrays are memory-mapped, i.e. loading is instant."""
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r' if mmap else None) for name in ARRAYS}
+        with open(os.path.join(directory, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return cls(**arrays, **meta)
+
+    def member_column(self, member_id):
+        j = np.searchsorted(self.member_ids, int(member_id))
+        if j == len(self.member_ids) or self.member_ids[j] != int(member_id):
+            raise KeyError(f"Unknown member ID {member_id}")
+        return j
+
+    def voting_row(self, voting_id):
+        i = np.searchsorted(self.voting_ids, int(voting_id))
+        if i == len(self.voting_ids) or self.voting_ids[i] != int(voting_id):
+            raise KeyError(f"Unknown voting ID {voting_id}")
+        return i
+
+    def meeting_rows(self, meeting):
+        """Row indices of all votings of the meeting (cislo_schodze)."""
+        start = np.searchsorted(self._sorted_meetings, int(meeting), side='left')
+        end = np.searchsorted(self._sorted_meetings, int(meeting), side='right')
+        return self._meeting_order[start:end]
+
+    def date_rows(self, date_from=None, date_to=None):
+        """Row indices of votings from `date_from` (included) to `date_to` (excluded)."""
+        start = 0 if date_from is None else np.searchsorted(self._sorted_dates, np.datetime64(date_from, 'm'), side='left')
+        end = len(self._sorted_dates) if date_to is None else np.searchsorted(self._sorted_dates, np.datetime64(date_to, 'm'), side='left')
+        return np.sort(self._date_order[start:end])
+
+    def member_votes(self, member_id):
+        """All votes of the member - (voting IDs, vote codes) of votings they took part in."""
+        column = self.votes[:, self.member_column(member_id)]
+        mask = column != NO_VOTE
+        return self.voting_ids[mask], column[mask]
+
+    def voting_votes(self, voting_id):
+        """All votes in the voting - (member IDs, vote codes) of members who took part."""
+        row = self.votes[self.voting_row(voting_id)]
+        mask = row != NO_VOTE
+        return self.member_ids[mask], row[mask]
+
+    def meeting_votes(self, meeting):
+        """All MPs in the meeting - (voting IDs, member IDs, votes sub-matrix)."""
+        rows = self.meeting_rows(meeting)
+        members = np.flatnonzero((self.votes[rows] != NO_VOTE).any(axis=0))
+        return self.voting_ids[rows], self.member_ids[members], self.votes[np.ix_(rows, members)]
+
+    def party_votes(self, party, date_from=None, date_to=None):
+        """Votes of the party members in the date range - (voting IDs, member IDs, votes sub-matrix).
+
+        Membership is taken per voting, cells of members outside the party in that voting are -1.
+        """
+        rows = self.date_rows(date_from, date_to)
+        in_party = self.parties[rows] == self._party_index[party]
+        members = np.flatnonzero(in_party.any(axis=0))
+        votes = np.where(in_party[:, members], self.votes[np.ix_(rows, members)], NO_VOTE).astype(np.int8)
+        return self.voting_ids[rows], self.member_ids[members], votes
@@ -1,72 +1,269 @@
+import bz2
+import gzip
 import json
+import lzma
+import os
+import re
+import sys
+from contextlib import suppress
+from pathlib import Path
 import pandas as pd
 import argparse
+from openpyxl import Workbook
 
-def voting_to_dataframe(json_file):
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    records = []
-    for voting_id, details in data.items():
-        base_info = {
-            'voting_id': voting_id,
-            'cas_hlasovania': details.get('cas_hlasovania'),
-            'schodza': details.get('schodza'),
-            'cislo_schodze': details.get('cislo_schodze'),
-            'cislo_hlasovania': details.get('cislo_hlasovania'),
-            'nazov_hlasovania': details.get('nazov_hlasovania'),
-            'vysledok_hlasovania': details.get('vysledok_hlasovania'),
-            'schvalene': _map_result(details.get('vysledok_hlasovania')),
-            'pritomni': details.get('pritomni'),
-            'hlasujucich': details.get('hlasujucich'),
-            'za_hlasovalo': details.get('za_hlasovalo'),
-            'proti_hlasovalo': details.get('proti_hlasovalo'),
-            'zdrzalo_sa': details.get('zdrzalo_sa'),
-            'nehlasovalo': details.get('nehlasovalo'),
-            'nepritomni': details.get('nepritomni')
-        }
-        
+if __name__ == '__main__':
+    # run as a script (python src/convert/convert_to_excel.py) - make the scrape and analyze packages importable
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from scrape.columnar import is_parquet, read_members_parquet, read_table
+from scrape.election import match_election
+from scrape.jsonl import iter_votings
+from scrape import store
+
+VOTING_FIELDS = [
+    'cas_hlasovania', 'schodza', 'cislo_schodze', 'cislo_hlasovania', 'nazov_hlasovania', 'vysledok_hlasovania',
+    'pritomni', 'hlasujucich', 'za_hlasovalo', 'proti_hlasovalo', 'zdrzalo_sa', 'nehlasovalo', 'nepritomni'
+]
+VOTING_COLUMNS = ['voting_id'] + VOTING_FIELDS[:6] + ['schvalene'] + VOTING_FIELDS[6:]
+VOTE_COLUMNS = ['poslanec_klub', 'poslanec_priezvisko_meno', 'poslanec_id', 'hlas_id', 'hlas']
+# Columns with few distinct values repeated on many rows
+CATEGORY_COLUMNS = ['schodza', 'cislo_schodze', 'schvalene', 'poslanec_klub', 'poslanec_priezvisko_meno', 'poslanec_id', 'hlas_id', 'hlas']
+MEMBER_FIELDS = {
+    'poslanec_meno': 'meno',
+    'poslanec_priezvisko': 'priezvisko',
+    'poslanec_titul': 'titul',
+    'kandidoval_za': 'kandidoval_za',
+    'poslanec_narodeny': 'narodeny',
+    'poslanec_narodnost': 'narodnost',
+    'poslanec_bydlisko': 'bydlisko',
+    'poslanec_kraj': 'kraj',
+    'poslanec_email': 'email',
+    'poslanec_www': 'www',
+    'poslanec_photo': 'photo',
+}
+
+# Rows of an Excel sheet including the header
+EXCEL_MAX_ROWS = 1048576
+CHUNK_ROWS = 50000
+OUTPUT_PATTERN = re.compile(r'^(.*?)(\.xlsx|\.csv(?:\.gz|\.bz2|\.xz)?)$')
+CSV_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+def _voting_frames(source):
+    """Return one frame of votings and one frame of votes (with `voting_id`), no per-vote dicts are built.
+
+    Parquet datasets are read column-wise, SQLite stores by two queries, JSON/JSONL votings
+    are collected into column lists.
+    """
+    if store.is_sqlite(source):
+        db = store.connect(source)
+        try:
+            # the numbers are stored as integers, the other sources have them as str
+            columns = [f"CAST({field} AS TEXT) AS {field}" if field in ('voting_id', 'cislo_schodze', 'cislo_hlasovania') or field in VOTING_FIELDS[6:] else field for field in ['voting_id'] + VOTING_FIELDS]
+            votings = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM votings ORDER BY votings.voting_id", db)
+            votes = pd.read_sql_query(
+                'SELECT CAST(voting_id AS TEXT) AS voting_id, hlasovanie_klub AS poslanec_klub, poslanec_meno AS poslanec_priezvisko_meno, '
+                'CAST(poslanec_id AS TEXT) AS poslanec_id, hlas_id FROM votes ORDER BY votes.voting_id, poradie', db
+            )
+        finally:
+            db.close()
+        return votings, votes
+
+    if is_parquet(source):
+        votings = read_table(source, 'votings').to_pandas()
+        votings = votings.sort_values('voting_id', kind='stable')
+        votings['voting_id'] = votings['voting_id'].astype(str)
+        votes = read_table(source, 'votes').to_pandas().rename(columns={'hlasovanie_klub': 'poslanec_klub', 'poslanec_meno': 'poslanec_priezvisko_meno'})
+        votes = votes.sort_values('voting_id', kind='stable')
+        votes['voting_id'] = votes['voting_id'].astype(str)
+        votes['poslanec_id'] = votes['poslanec_id'].astype(str)
+        return votings, votes
+
+    voting_columns = {field: [] for field in ['voting_id'] + VOTING_FIELDS}
+    vote_columns = {field: [] for field in ['voting_id', 'poslanec_klub', 'poslanec_priezvisko_meno', 'poslanec_id', 'hlas_id']}
+    for voting_id, details in iter_votings(source):
+        voting_columns['voting_id'].append(voting_id)
+        for field in VOTING_FIELDS:
+            voting_columns[field].append(details.get(field))
         for vote in details.get('hlasovanie', []):
-            record = base_info.copy()
-            record.update({
-                'poslanec_klub': vote.get('hlasovanie_klub'),
-                'poslanec_priezvisko_meno': vote.get('poslanec_meno'),
-                'poslanec_id': vote.get('poslanec_id'),
-                'hlas_id': vote.get('hlas_id'),
-                'hlas': _map_voting(vote.get('hlas_id'))
-            })
-            records.append(record)
-    
-    df = pd.DataFrame(records)
+            vote_columns['voting_id'].append(voting_id)
+            vote_columns['poslanec_klub'].append(vote.get('hlasovanie_klub'))
+            vote_columns['poslanec_priezvisko_meno'].append(vote.get('poslanec_meno'))
+            vote_columns['poslanec_id'].append(vote.get('poslanec_id'))
+            vote_columns['hlas_id'].append(vote.get('hlas_id'))
+    return pd.DataFrame(voting_columns), pd.DataFrame(vote_columns)
+
+def _map_categorical(series, mapping):
+    """Apply a scalar mapping function once per distinct value instead of once per row."""
+    series = series.astype('category')
+    lookup = {value: mapping(value) for value in series.cat.categories}
+    return series.map(lookup).astype('category')
+
+def voting_to_dataframe(json_file):
+    """Flatten the votings (JSON, lazily read JSONL or Parquet dataset) to one row per member vote.
+
+    Votings and votes are built as two frames and joined on `voting_id`; the vote and
+    result labels are mapped per category and repeated values are stored as categories.
+    """
+    votings, votes = _voting_frames(json_file)
+    votings['schvalene'] = _map_categorical(votings['vysledok_hlasovania'], _map_result)
+    votes['hlas'] = _map_categorical(votes['hlas_id'], _map_voting)
+
+    # votes are grouped by voting, so the join is a positional take from the votings frame
+    positions = pd.Index(votings['voting_id']).get_indexer(votes['voting_id'])
+    df = votings.iloc[positions].reset_index(drop=True)
+    for column in VOTE_COLUMNS:
+        df[column] = votes[column].reset_index(drop=True)
+    df = df[VOTING_COLUMNS + VOTE_COLUMNS]
+
+    for column in CATEGORY_COLUMNS:
+        df[column] = df[column].astype('category')
     return df
 
 def member_to_dataframe(json_file):
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    records = []
-    for member_id, details in data.items():
-        base_info = {
-            'poslanec_id': member_id,
-            'poslanec_meno': details['info'].get('meno'),
-            'poslanec_priezvisko': details['info'].get('priezvisko'),
-            'poslanec_titul': details['info'].get('titul'),
-            'kandidoval_za': str(details['info'].get('kandidoval_za')).replace(' – ', ' - '),
-            'poslanec_narodeny': details['info'].get('narodeny'),
-            'poslanec_narodnost': details['info'].get('narodnost'),
-            'poslanec_bydlisko': details['info'].get('bydlisko'),
-            'poslanec_kraj': details['info'].get('kraj'),
-            'poslanec_email': details['info'].get('email'),
-            'poslanec_www': details['info'].get('www'),
-            'poslanec_photo': details['info'].get('photo'),
-            'poslanec_clenstvo': ';'.join(details.get('clenstvo', []))
-        }
-        records.append(base_info)
-    
-    df = pd.DataFrame(records)
+    if is_parquet(json_file):
+        data = read_members_parquet(json_file)
+    elif store.is_sqlite(json_file):
+        data = store.read_members(json_file)
+    else:
+        with open(json_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+    df = pd.DataFrame({
+        'poslanec_id': list(data),
+        **{column: [details['info'].get(field) for details in data.values()] for column, field in MEMBER_FIELDS.items()},
+        'poslanec_clenstvo': [';'.join(details.get('clenstvo', [])) for details in data.values()],
+    })
+    df['kandidoval_za'] = df['kandidoval_za'].astype(str).str.replace(' – ', ' - ', regex=False)
     df = df.drop_duplicates()
     return df
 
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+def joined_chunks(voting, member=None, document=None, chunk_rows: int = CHUNK_ROWS):
+    """Join the member and document columns to the votes chunk by chunk, so the wide table is never built as a whole."""
+    for chunk in _chunks(voting, chunk_rows):
+        rows = chunk.shape[0]
+        if member is not None:
+            chunk = pd.merge(
+                chunk,
+                member,
+                on='poslanec_id',
+                how='left',
+                validate='m:1',
+                suffixes=('', '_y')
+            ).drop(columns=['poslanec_priezvisko_meno_y'], errors='ignore')
+        if document is not None:
+            chunk = pd.merge(
+                chunk.astype({'cislo_schodze': 'int', 'cislo_hlasovania': 'int'}),
+                document.drop(columns=['cas_hlasovania']),
+                on=['cislo_schodze', 'cislo_hlasovania'],
+                how='left',
+                validate='m:1',
+                suffixes=('', '_y')
+            )
+        if chunk.shape[0] != rows:
+            raise ValueError(f"The number of rows in the voting data has changed from {rows} to {chunk.shape[0]} after joining with member data.")
+        yield chunk
+
+def _rows(chunk):
+    """Plain Python rows of the chunk, missing values as None."""
+    chunk = chunk.astype(object)
+    return chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+def _output_file(path, tag):
+    """`votes.xlsx` -> `votes_<tag>.xlsx`, `votes.csv.gz` -> `votes_<tag>.csv.gz`."""
+    stem, extension = OUTPUT_PATTERN.match(path).groups()
+    return f"{stem}_{tag}{extension}"
+
+def _tmp_file(file):
+    return f"{file}.tmp"
+
+def _remove_tmp_files(files):
+    for file in files:
+        if os.path.exists(_tmp_file(file)):
+            os.remove(_tmp_file(file))
+
+def _replace_tmp_files(files):
+    for file in files:
+        os.replace(_tmp_file(file), file)
+
+def write_xlsx(path, tables, max_rows: int = EXCEL_MAX_ROWS, split: str = 'sheets'):
+    """Stream the tables to xlsx with a write-only (constant memory) workbook.
+
+    A table longer than the sheet row limit continues on the sheet `<name>_2`, `<name>_3`...
+    or, with `split='files'`, on the sheet of the same name in `<file>_2.xlsx`, `<file>_3.xlsx`...
+    The files are written to temporary files which replace the outputs only when all tables
+    are written, so a failed export leaves no partial output.
+
+    Args:
+        path (str): The xlsx file.
+        tables (list[tuple[str, Iterable[pd.DataFrame]]]): The sheet name and the chunks of every table.
+        max_rows (int): Rows per sheet including the header.
+        split (str): 'sheets' or 'files'.
+
+    Returns:
+        list[str]: The written files.
+    """
+    files = [path]
+    workbook = Workbook(write_only=True)
+    try:
+        for name, chunks in tables:
+            sheet = None
+            part = 0
+            rows = max_rows
+            for chunk in chunks:
+                header = list(chunk.columns)
+                for row in _rows(chunk):
+                    if rows >= max_rows:
+                        part += 1
+                        if part > 1 and split == 'files':
+                            workbook.save(_tmp_file(files[-1]))
+                            files.append(_output_file(path, len(files) + 1))
+                            workbook = Workbook(write_only=True)
+                        sheet = workbook.create_sheet(name if part == 1 or split == 'files' else f"{name}_{part}")
+                        sheet.append(header)
+                        rows = 1
+                    sheet.append(row)
+                    rows += 1
+                if sheet is None:
+                    sheet = workbook.create_sheet(name)
+                    sheet.append(header)
+        workbook.save(_tmp_file(files[-1]))
+    except BaseException:
+        # finish the sheet streams of the unsaved workbook, they are not valid to collect half-written
+        for sheet in workbook.worksheets:
+            with suppress(Exception):
+                sheet.close()
+        _remove_tmp_files(files)
+        raise
+    _replace_tmp_files(files)
+    return files
+
+def write_csv(path, tables):
+    """Stream the tables to CSV, compressed by the extension (.csv.gz, .csv.bz2, .csv.xz).
+
+    The first table is saved to `path`, the others (lookup tables) next to it as `<file>_<name>.csv`.
+    As in `write_xlsx`, the outputs are replaced only when all tables are written.
+
+    Returns:
+        list[str]: The written files.
+    """
+    files = []
+    try:
+        for i, (name, chunks) in enumerate(tables):
+            file = path if i == 0 else _output_file(path, name)
+            files.append(file)
+            opener = CSV_OPENERS.get(Path(file).suffix, open)
+            with opener(_tmp_file(file), 'wt', encoding='utf-8', newline='') as f:
+                for j, chunk in enumerate(chunks):
+                    chunk.to_csv(f, header=j == 0, index=False)
+    except BaseException:
+        _remove_tmp_files(files)
+        raise
+    _replace_tmp_files(files)
+    return files
+
 def _count_academic_titles(title_string):
     if not title_string:
         return 0
@@ -121,54 +318,64 @@ def _map_result(result_str):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Convert JSON data to Excel format.')
-    parser.add_argument('--input-voting', type=str, help='The JSON file to convert to Excel')
-    parser.add_argument('--input-member', type=str, help='The JSON file to join with voting')
-    parser.add_argument('--input-election', type=str, help='The excel containing election data and join with voting')
-    parser.add_argument('--input-document', type=str, help='The XLSX file to join with voting')
-    parser.add_argument('--output-file', type=str, help='The Excel file to save the converted data')
+    parser.add_argument('--input-voting', type=str, help='The JSON/JSONL file, Parquet dataset or SQLite store to convert to Excel')
+    parser.add_argument('--input-member', type=str, help='The JSON or Parquet file or SQLite store to join with voting')
+    parser.add_argument('--input-election', type=str, help='The Excel or Parquet file with election data (--type election output) to join with voting')
+    parser.add_argument('--input-document', type=str, help='The XLSX or Parquet file or SQLite store to join with voting')
+    parser.add_argument('--output-file', type=str, help='The Excel (.xlsx) or CSV (.csv, .csv.gz, .csv.bz2, .csv.xz) file to save the converted data')
+    parser.add_argument('--lookup-sheets', action='store_true', help='Save the members and documents once to their own sheets (or CSV files) instead of to every vote row')
+    parser.add_argument('--split', type=str, default='sheets', choices=['sheets', 'files'], help='Continue on a new sheet or a new file when the Excel row limit is reached')
+    parser.add_argument('--max-rows', type=int, default=EXCEL_MAX_ROWS, help='Rows per Excel sheet including the header')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='Number of vote rows joined and written at once')
+    parser.add_argument('--output-analytics', type=str, help='The Excel file to save party cohesion, rebellions and MP agreement to')
 
     args = parser.parse_args()
 
     if args.input_voting is None or args.output_file is None:
         print("Please provide the input and output file paths.")
         exit(1)
+    elif not OUTPUT_PATTERN.match(args.output_file):
+        print("The output file has to be .xlsx, .csv, .csv.gz, .csv.bz2 or .csv.xz.")
+        exit(1)
     else:
         voting = voting_to_dataframe(args.input_voting)
-        nr_check = voting.shape[0]
+        member = None
+        document = None
         if args.input_member:
             member = member_to_dataframe(args.input_member)
             member['poslanec_titul_pocet'] = member['poslanec_titul'].apply(_count_academic_titles)
             if args.input_election:
-                election = pd.read_excel(args.input_election)
-                member = pd.merge(
-                    member.assign(temp_priezvisko=member.poslanec_priezvisko.str.split().str[-1]),
-                    election.assign(temp_priezvisko=election.poslanec_priezvisko.str.split().str[-1]).drop(columns=['poslanec_priezvisko']),
-                    on=['kandidoval_za', 'poslanec_meno', 'temp_priezvisko'],
-                    how='left',
-                    validate='m:1',
-                    suffixes=('', '_y')
-                ).drop(columns=['temp_priezvisko', 'poslanec_priezvisko_y'], errors='ignore')
-            voting = pd.merge(
-                voting,
-                member, 
-                on='poslanec_id',
-                how='left',
-                validate='m:1',
-                suffixes=('', '_y')
-            ).drop(columns=['poslanec_priezvisko_meno_y'], errors='ignore')
+                election = pd.read_parquet(args.input_election) if is_parquet(args.input_election) else pd.read_excel(args.input_election)
+                member, report = match_election(member, election)
+                for problem, names in report.items():
+                    if names:
+                        print(f"Warning: {len(names)} members {problem} in the election data: {', '.join(names)}")
         if args.input_document:
-            document = pd.read_excel(args.input_document)
-            voting = pd.merge(
-                voting.astype({'cislo_schodze': 'int', 'cislo_hlasovania': 'int'}),
-                document.drop(columns=['cas_hlasovania']),
-                on=['cislo_schodze', 'cislo_hlasovania'],
-                how='left',
-                validate='m:1',
-                suffixes=('', '_y')
-            )
-        if voting.shape[0] != nr_check:
-            print(f"Error: The number of rows in the voting data has changed from {nr_check} to {voting.shape[0]} after joining with member data.")
-            exit(1)
+            if store.is_sqlite(args.input_document):
+                document = pd.DataFrame(store.read_voting_documents(args.input_document))
+            else:
+                document = pd.read_parquet(args.input_document) if is_parquet(args.input_document) else pd.read_excel(args.input_document)
+
+        if args.lookup_sheets:
+            tables = [('hlasovanie', _chunks(voting, args.chunk_rows))]
+            if member is not None:
+                tables.append(('poslanci', [member]))
+            if document is not None:
+                tables.append(('dokumenty', [document]))
         else:
-            voting.to_excel(args.output_file, index=False)
-            print(f"Data saved to {args.output_file}")
+            tables = [('hlasovanie', joined_chunks(voting, member, document, args.chunk_rows))]
+
+        try:
+            if args.output_file.endswith('.xlsx'):
+                files = write_xlsx(args.output_file, tables, max_rows=args.max_rows, split=args.split)
+            else:
+                files = write_csv(args.output_file, tables)
+        except ValueError as e:
+            print(f"Error: {e}")
+            exit(1)
+        print(f"Data saved to {', '.join(files)}")
+        if args.output_analytics:
+            from analyze.cohesion import export_analytics
+            from analyze.vote_matrix import VoteMatrix
+            export_analytics(VoteMatrix.from_votings(args.input_voting), args.output_analytics)
+            print(f"Analytics saved to {args.output_analytics}")
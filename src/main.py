@@ -1,9 +1,21 @@
 import logging
 import argparse
+import cProfile
+import io
+import pstats
+import os
+from functools import partial
+from scrape import client, metrics
+from scrape.cache import PageCache
 from scrape.voting import scrape_voting_data
-from scrape.member import scrape_member_data_all, add_member_info_to_voting_data
-from scrape.election import get_election_member_votes
+from scrape.incremental import update_voting_data
+from scrape.discovery import find_frontier, map_voting_ranges, ranges_to_ids
+from scrape.member import scrape_member_data_all, add_member_info_to_voting_data, members_file
 from scrape.document import add_documents_to_voting_data, scrape_voting_documents
+from scrape.policy import AimdLimiter, FetchPolicy
+from scrape.registry import DocumentRegistry
+from scrape.shards import DEFAULT_LEASE_SECONDS, DEFAULT_SHARD_SIZE, WorkQueue, merge_shards, run_worker
+from scrape.stages import scrape_enriched_voting_data
 
 def setup_logging(log_file):
     """
@@ -28,61 +40,205 @@ def setup_logging(log_file):
 
     return logger
 
+def _with_format(path, output_format):
+    """Replace the extension of the output path with the one of the requested format."""
+    if not output_format:
+        return path
+    return f"{os.path.splitext(path.rstrip('/'))[0]}.{output_format}"
+
 def main():
     # Set up argument parser
     parser = argparse.ArgumentParser(description='Scrape voting data from the Slovak National Council website.')
     parser.add_argument('--start-id', type=int, default=51426, help='The starting ID for scraping')
-    parser.add_argument('--end-id', type=int, default=51427, help='The ending ID for scraping')
+    parser.add_argument('--end-id', type=int, default=None, help='The ending ID for scraping (default 51427, in incremental mode the high-watermark + --lookahead)')
     parser.add_argument('--save-to', type=str, default='', help='The file path to save the scraped data')
     parser.add_argument('--log-file', type=str, default='scraper.log', help='The file path to save the logs')
-    parser.add_argument('--type', type=str, default='voting', help='The type of data to scrape')
+    parser.add_argument('--type', type=str, default='voting', help='The type of data to scrape: voting, member, document, election or voting+document, voting+member, voting+document+member; the voting+ stages overlap and fetch in parallel - up to --concurrency votings, one document page and --member-workers members in flight')
     parser.add_argument('--input-file', type=str, default='data/raw/voting.json', help='The file path to load the input data')
+    parser.add_argument('--concurrency', type=int, default=1, help='Number of voting requests in flight (1 = serial scraping)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Timeout in seconds for a single request')
+    parser.add_argument('--pool-size', type=int, default=client.DEFAULT_POOL_SIZE, help='Number of keep-alive connections to nrsr.sk')
+    parser.add_argument('--max-bytes', type=int, default=client.DEFAULT_MAX_BYTES, help='Maximum size of a single page in bytes')
+    parser.add_argument('--cache-dir', type=str, default='data/cache', help='Directory of the raw page cache (empty string disables the cache)')
+    parser.add_argument('--cache-size-mb', type=int, default=2048, help='Size limit of the raw page cache in MB')
+    parser.add_argument('--offline', action='store_true', help='Replay mode - serve all pages from the cache without network access')
+    parser.add_argument('--incremental', action='store_true', help='Scrape only votings missing in --dataset (new and previously failed IDs) and merge them into it')
+    parser.add_argument('--dataset', type=str, default='', help='The JSON/JSONL dataset, Parquet dataset or SQLite store updated in incremental mode')
+    parser.add_argument('--lookahead', type=int, default=200, help='Number of IDs past the high-watermark checked in incremental mode without --end-id')
+    parser.add_argument('--discover', action='store_true', help='Map the existing voting IDs by sparse sampling and binary search before scraping (without --end-id the highest voting ID is searched)')
+    parser.add_argument('--sample-step', type=int, default=250, help='Distance between sampled IDs when discovering voting ranges')
+    parser.add_argument('--format', type=str, default='', choices=['', 'json', 'jsonl', 'parquet', 'sqlite'], help='Output format, replaces the extension of --save-to (default: by extension); sqlite upserts into an indexed store')
+    parser.add_argument('--fsync-every', type=int, default=100, help='Number of votings between two fsync calls when saving to a .jsonl file')
+    parser.add_argument('--parse-workers', type=int, default=0, help='Number of parser processes fed by --concurrency fetching threads (0 = parse in the fetching threads)')
+    parser.add_argument('--retries', type=int, default=3, help='Number of retries (with jittered exponential backoff) of timeouts, 429 and 5xx responses')
+    parser.add_argument('--latency-target', type=float, default=2.0, help='Response time in seconds above which the adaptive concurrency limit is cut')
+    parser.add_argument('--document-registry', type=str, default='data/cache/cpt_registry.jsonl', help='Append-only registry of scraped CPT documents, only unseen CPTs are fetched (empty string = in-memory only)')
+    parser.add_argument('--metrics-out', type=str, default='', help='Save the per-stage counters and latency histograms at the end - Prometheus textfile for .prom, JSON otherwise')
+    parser.add_argument('--profile', type=str, nargs='?', const='scraper.prof', default='', help='Run under cProfile, log the top hot spots and save the stats to this file (default scraper.prof); only the main thread is profiled, use --concurrency 1 to profile fetching and parsing')
+    parser.add_argument('--member-workers', type=int, default=8, help='Number of members fetched concurrently before the votings are enriched (own request budget, independent of --concurrency)')
+    parser.add_argument('--normalize-members', action='store_true', help='Save the member info once to a side table (<save-to>.members.json) instead of to every vote')
+    parser.add_argument('--shard-queue', type=str, default='', help='SQLite work queue of a sharded run shared by several workers, see --shard-role')
+    parser.add_argument('--shard-role', type=str, default='work', choices=['init', 'work', 'merge'], help='init splits --start-id..--end-id into shards, work scrapes shards until none is left, merge combines the shard outputs into --save-to')
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE, help='Number of voting IDs per shard')
+    parser.add_argument('--shard-dir', type=str, default='', help='Directory of the shard outputs (default <shard-queue>.shards)')
+    parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS, help='Shard lease duration - a shard whose worker stops heartbeating is re-queued after it')
+    parser.add_argument('--rate', type=float, default=10.0, help='Maximum number of requests per second to nrsr.sk when concurrency > 1')
 
     # Parse arguments
     args = parser.parse_args()
+    if args.incremental and not args.dataset:
+        parser.error('--incremental requires --dataset')
+    if args.incremental and args.type != 'voting' and 'voting+' not in args.type:
+        parser.error('--incremental is supported only for voting types')
+    if args.shard_queue and (args.incremental or (args.type != 'voting' and 'voting+' not in args.type)):
+        parser.error('--shard-queue is supported only for voting types without --incremental')
     
     start_id = args.start_id
-    end_id = args.end_id
+    end_id = args.end_id if args.end_id is not None or args.incremental or args.discover else 51427
     save_to = args.save_to if args.save_to != '' else f'data/raw/voting_{start_id}-{end_id}.json'
+    if args.type != 'election':
+        save_to = _with_format(save_to, args.format)
+    if args.type == 'document' and save_to.endswith(('.json', '.jsonl')):
+        # the document table is saved as a spreadsheet, Parquet or SQLite, it is not a voting dataset
+        parser.error('--type document saves to .xlsx, .parquet or .sqlite - use --format parquet/sqlite or --save-to <file>.xlsx')
     log_file = args.log_file
 
     # Configure logging
     setup_logging(log_file)
+    cache = PageCache(args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024) if args.cache_dir else None
+    if args.offline and cache is None:
+        parser.error('--offline requires --cache-dir')
+    registry = DocumentRegistry(args.document_registry or None)
+    # the document stage fetches one page at a time
+    document_limiter = AimdLimiter(max_limit=1, latency_target=args.latency_target)
+    client.configure(
+        pool_size=args.pool_size,
+        timeout=(min(5.0, args.timeout), args.timeout),
+        max_bytes=args.max_bytes,
+        cache=cache,
+        offline=args.offline,
+        policy=FetchPolicy(
+            retries=args.retries,
+            limiter=AimdLimiter(max_limit=max(args.concurrency, 1), latency_target=args.latency_target),
+            # every stage gets its own budget, so the overlapped voting+ stages never wait for each other;
+            # the member prefetch batches are too short to wait for the ramp-up
+            stage_limiters={
+                'member': AimdLimiter(max_limit=max(args.member_workers, 1), initial=max(args.member_workers, 1), latency_target=args.latency_target),
+                'search': document_limiter,
+                'document': document_limiter
+            }
+        )
+    )
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
 
     # Perform the scraping
     try:
-        if args.type == 'voting':
+        voting_ids = None
+        if args.discover and not args.incremental and not args.shard_queue and (args.type == 'voting' or 'voting+' in args.type):
+            logging.info(f"Discovering existing voting IDs from {start_id}...")
+            if end_id is None:
+                end_id = find_frontier(start_id) or start_id
+                save_to = _with_format(args.save_to if args.save_to != '' else f'data/raw/voting_{start_id}-{end_id}.json', args.format)
+            voting_ids = ranges_to_ids(map_voting_ranges(start_id, end_id, step=args.sample_step))
+        if args.shard_queue and args.shard_role == 'init':
+            end_id = end_id if end_id is not None else find_frontier(start_id) or start_id
+            with WorkQueue(args.shard_queue) as work_queue:
+                created = work_queue.create_shards(start_id, end_id, shard_size=args.shard_size, scrape_type=args.type)
+                logging.info(f"Created {created} shards of IDs {start_id} to {end_id} in {args.shard_queue}: {work_queue.status()}")
+        elif args.shard_queue and args.shard_role == 'work':
+            with WorkQueue(args.shard_queue) as work_queue:
+                scrape_type = work_queue.scrape_type
+            scrape_kwargs = dict(concurrency=args.concurrency, rate=args.rate, fsync_every=args.fsync_every, parse_workers=args.parse_workers)
+            if 'voting+' in scrape_type:
+                scrape_shard = partial(scrape_enriched_voting_data, document='document' in scrape_type, member='member' in scrape_type, registry=registry, member_workers=args.member_workers)
+            else:
+                scrape_shard = scrape_voting_data
+            completed = run_worker(args.shard_queue, args.shard_dir or f"{args.shard_queue}.shards", scrape_shard, lease_seconds=args.lease_seconds, **scrape_kwargs)
+            logging.info(f"Scraped {completed} shards of type {scrape_type}.")
+        elif args.shard_queue and args.shard_role == 'merge':
+            data = merge_shards(args.shard_queue, save_to)
+            logging.info(f"Merged {len(data)} votings into {save_to}.")
+        elif args.incremental:
+            enrich = []
+            if 'voting+' in args.type and 'document' in args.type:
+                enrich.append(partial(add_documents_to_voting_data, registry=registry))
+            if 'voting+' in args.type and 'member' in args.type:
+                if args.normalize_members:
+                    enrich.append(partial(add_member_info_to_voting_data, normalized=True, members_to_file=members_file(args.dataset), workers=args.member_workers))
+                else:
+                    enrich.append(partial(add_member_info_to_voting_data, workers=args.member_workers))
+            logging.info(f"Updating {args.dataset} with new votings...")
+            data = update_voting_data(
+                args.dataset,
+                start_id,
+                end_id,
+                enrich=enrich,
+                lookahead=args.lookahead,
+                discover=args.discover,
+                concurrency=args.concurrency,
+                rate=args.rate,
+                parse_workers=args.parse_workers
+            )
+            logging.info(f"Added {len(data)} new votings to {args.dataset}.")
+        elif args.type == 'voting':
             logging.info(f"Scraping data for IDs {start_id} to {end_id} and saving to {save_to}...")
-            data = scrape_voting_data(start_id, end_id, save_to)
+            data = scrape_voting_data(start_id, end_id, save_to, concurrency=args.concurrency, rate=args.rate, fsync_every=args.fsync_every, voting_ids=voting_ids, parse_workers=args.parse_workers)
             logging.info(f"Scraped data for {len(data)} votings.")
         elif args.type == 'member':
             logging.info(f"Scraping member info...")
-            data = scrape_member_data_all(args.input_file, save_to_file=save_to)
+            data = scrape_member_data_all(args.input_file, save_to_file=save_to, workers=args.member_workers)
             logging.info(f"Scraped data for {len(data)} members.")
         elif args.type == 'election':
             logging.info(f"Scraping election member votes...")
-            data = get_election_member_votes(input_xlsx=args.input_file, output_xlsx=save_to)
+            # imported here as it loads pandas, which no other type needs
+            from scrape.election import get_election_member_votes
+            data = get_election_member_votes(input_xlsx=args.input_file, output_xlsx=save_to, cache_dir=os.path.join(args.cache_dir, 'elections') if args.cache_dir else None)
             logging.info(f"Scraped data for {len(data)} members.")
         elif args.type == 'document':
             logging.info(f"Sraping documents for votings in {args.input_file}...")
-            data = scrape_voting_documents(args.input_file, save_to_file=save_to)
+            data = scrape_voting_documents(args.input_file, save_to_file=save_to, registry=registry)
             logging.info(f"Scraped data for {len(data)} votings.")
         elif 'voting+' in args.type:
-            logging.info(f"Scraping data for IDs {start_id} to {end_id} and saving to {save_to}...")
-            data = scrape_voting_data(start_id, end_id, save_to)
+            logging.info(f"Scraping data with {args.type.split('+', 1)[1]} for IDs {start_id} to {end_id} and saving to {save_to}...")
+            data = scrape_enriched_voting_data(
+                start_id,
+                end_id,
+                save_to,
+                document='document' in args.type,
+                member='member' in args.type,
+                registry=registry,
+                normalized=args.normalize_members,
+                member_workers=args.member_workers,
+                fsync_every=args.fsync_every,
+                concurrency=args.concurrency,
+                rate=args.rate,
+                voting_ids=voting_ids,
+                parse_workers=args.parse_workers
+            )
             logging.info(f"Scraped data for {len(data)} votings.")
-            if 'document' in args.type:
-                logging.info(f"Adding documents to votings...")
-                data = add_documents_to_voting_data(data, save_to_file=save_to)
-                logging.info(f"Added documents to {len(data)} votings.")
-            if 'member' in args.type:
-                logging.info(f"Adding member info to votings...")
-                data = add_member_info_to_voting_data(data, save_to_file=save_to)
-                logging.info(f"Added member info to {len(data)} votings.")
         else:
             logging.error(f"Invalid type: {args.type}")
     except Exception as e:
         logging.error(f"An error occurred during scraping: {e}", exc_info=True)
+    finally:
+        registry.close()
+        dead_letters = client.get_policy().dead_letters
+        if dead_letters:
+            logging.warning(f"{len(dead_letters)} URLs failed after all retries: {dead_letters}")
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            stats = io.StringIO()
+            pstats.Stats(profiler, stream=stats).sort_stats('tottime').print_stats(25)
+            logging.info(f"Profile saved to {args.profile}, top hot spots:\n{stats.getvalue()}")
+        for line in metrics.summary_lines():
+            logging.info(line)
+        if args.metrics_out:
+            metrics.write_metrics(args.metrics_out)
+            logging.info(f"Metrics saved to {args.metrics_out}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DAY = 24 * 60 * 60
+
+# Time to live of cached pages in seconds per page kind, None = never expires
+PAGE_KIND_TTL = {
+    'voting': None,  # past votings never change
+    'document': 7 * DAY,
+    'search': DAY,
+    'member': DAY,
+    'other': DAY,
+}
+
+def page_kind(url):
+    """Map the nrsr.sk URL to the page kind used to pick the time to live."""
+    if 'sid=schodze/hlasovanie/hlasklub' in url:
+        return 'voting'
+    if 'sid=schodze/hlasovanie/vyhladavanie_vysledok' in url:
+        return 'search'
+    if 'sid=zakony/cpt' in url:
+        return 'document'
+    if 'sid=poslanci/poslanec' in url:
+        return 'member'
+    return 'other'
+
+class CacheEntry:
+    def __init__(self, content, etag, last_modified, fresh):
+        self.content = content
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+class PageCache:
+    """On-disk cache of raw pages keyed by URL.
+
+    Bodies are stored zlib-compressed under the SHA-256 of their content (identical pages
+    are stored once), the URL index with validators and timestamps lives in SQLite.
+    Least recently used pages are evicted once the cache grows over `max_bytes`.
+
+    Args:
+        directory (str): The cache directory.
+        max_bytes (int): Size limit of the stored bodies.
+        ttl (dict): Time to live per page kind, overrides `PAGE_KIND_TTL`.
+    """
+    def __init__(self, directory: str, max_bytes: int = 2 * 1024 ** 3, ttl: dict | None = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = {**PAGE_KIND_TTL, **(ttl or {})}
+        os.makedirs(os.path.join(directory, 'objects'), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False, timeout=30)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def lookup(self, url):
+        """Return the cached entry for the URL or None. `fresh` is False once the TTL of the page kind expired."""
+        with self._lock:
+            row = self._db.execute("SELECT digest, kind, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            digest, kind, etag, last_modified, fetched_at = row
+            try:
+                with open(self._blob_path(digest), 'rb') as f:
+                    content = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        ttl = self.ttl.get(kind)
+        fresh = ttl is None or time.time() - fetched_at < ttl
+        return CacheEntry(content, etag, last_modified, fresh)
+
+    def store(self, url, content, headers=None):
+        headers = headers or {}
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(zlib.compress(content))
+            os.replace(tmp_path, path)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM pages WHERE url = ?", (url,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, len(content), page_kind(url), headers.get('ETag'), headers.get('Last-Modified'), now, now)
+            )
+            self._db.commit()
+            self._size += len(content) - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def touch(self, url):
+        """Mark the page as revalidated (the server answered 304 Not Modified)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            self._db.commit()
+
+    def _evict(self):
+        """Drop least recently used pages until the cache is at 90 % of its size limit."""
+        target = self.max_bytes * 0.9
+        rows = self._db.execute("SELECT url, digest, size FROM pages ORDER BY accessed_at").fetchall()
+        for url, digest, size in rows:
+            if self._size <= target:
+                break
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._size -= size
+            if self._db.execute("SELECT 1 FROM pages WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                try:
+                    os.remove(self._blob_path(digest))
+                except OSError:
+                    pass
+        self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from scrape import metrics
+from scrape.cache import page_kind
+from scrape.policy import RETRY_STATUSES, AimdLimiter, FetchPolicy
+
+# Canonical root of the site - used in the saved data and as the cache key
+SITE_URL = 'https://www.nrsr.sk/web/Default.aspx'
+# Root the requests are actually sent to, e.g. a local stand-in server in benchmarks
+BASE_URL = os.environ.get('NRSR_BASE_URL', SITE_URL)
+
+DEFAULT_POOL_SIZE = 16
+DEFAULT_TIMEOUT = (5.0, 30.0)  # (connect, read) in seconds
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# Pages with this text are nrsr.sk error pages (e.g. not yet existing voting) and are never cached
+ERROR_MARKER = b'unexpected error'
+
+def _accept_encoding():
+    """gzip/deflate are always decoded by urllib3, brotli only if a brotli package is installed."""
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        try:
+            import brotlicffi  # noqa: F401
+        except ImportError:
+            return 'gzip, deflate'
+    return 'gzip, deflate, br'
+
+class Page:
+    """Body and metadata of a fetched page.
+
+    Args:
+        url (str): The canonical URL of the page.
+        status_code (int): The HTTP status code.
+        content (bytes): The (decompressed) body.
+        headers (CaseInsensitiveDict): The response headers.
+        from_cache (bool): True if the body was served from the page cache.
+    """
+    def __init__(self, url, status_code, content, headers, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+_config = {
+    'pool_size': DEFAULT_POOL_SIZE,
+    'timeout': DEFAULT_TIMEOUT,
+    'max_bytes': DEFAULT_MAX_BYTES,
+    'cache': None,
+    'offline': False,
+    'policy': FetchPolicy(limiter=AimdLimiter(max_limit=DEFAULT_POOL_SIZE)),
+}
+_session = None
+_session_lock = threading.Lock()
+
+def configure(pool_size: int | None = None, timeout: float | tuple | None = None, max_bytes: int | None = None, cache=None, offline: bool | None = None, policy: FetchPolicy | None = None):
+    """Change the client settings. The pooled session is re-created on the next request.
+
+    Args:
+        pool_size (int): Number of keep-alive connections kept per host.
+        timeout (float | tuple): Timeout in seconds, or a (connect, read) tuple.
+        max_bytes (int): Maximum size of a response body; larger responses are dropped.
+        cache (PageCache): The page cache to read from and write to.
+        offline (bool): Serve pages only from the cache, never touch the network.
+        policy (FetchPolicy): Retry, backoff, concurrency limit and circuit breaker of the requests.
+    """
+    global _session
+    with _session_lock:
+        if pool_size is not None:
+            _config['pool_size'] = pool_size
+        if timeout is not None:
+            _config['timeout'] = timeout
+        if max_bytes is not None:
+            _config['max_bytes'] = max_bytes
+        if cache is not None:
+            _config['cache'] = cache
+        if offline is not None:
+            _config['offline'] = offline
+        if policy is not None:
+            _config['policy'] = policy
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def get_policy() -> FetchPolicy:
+    return _config['policy']
+
+def get_session():
+    """Return the shared session with keep-alive connection pooling."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_config['pool_size'])
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Accept-Encoding': _accept_encoding()})
+            _session = session
+        return _session
+
+def _request_url(url):
+    if BASE_URL != SITE_URL and url.startswith(SITE_URL):
+        return BASE_URL + url[len(SITE_URL):]
+    return url
+
+def _download(url, logger, headers=None):
+    """Single request; raises RequestException on connection errors and timeouts."""
+    max_bytes = _config['max_bytes']
+    with get_session().get(_request_url(url), headers=headers, timeout=_config['timeout'], stream=True) as response:
+        content = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            content.extend(chunk)
+            if max_bytes and len(content) > max_bytes:
+                logger.error(f"Response from {url} exceeds {max_bytes} bytes - dropped")
+                return None
+        return Page(url, response.status_code, bytes(content), response.headers.copy())
+
+def _fetch(url, logger, headers=None):
+    """Request the url under the fetch policy - retried with backoff while the failure is retryable."""
+    policy = _config['policy']
+    kind = page_kind(url)
+    limiter = policy.limiter_for(kind)
+    attempt = 0
+    while True:
+        probe = policy.breaker.wait(logger)
+        limiter.acquire()
+        started = time.monotonic()
+        error = None
+        try:
+            page = _download(url, logger, headers=headers)
+        except requests.RequestException as e:
+            page, error = None, e
+        except BaseException:
+            # not an answer of the site - neither the limit nor the breaker may stay held by it
+            limiter.cancel()
+            if probe:
+                policy.breaker.cancel_probe()
+            raise
+        latency = time.monotonic() - started
+        retryable = error is not None or (page is not None and page.status_code in RETRY_STATUSES)
+        limiter.release(ok=not retryable, latency=latency)
+        metrics.observe('fetch_seconds', latency, kind=kind)
+        metrics.inc('fetch_requests', kind=kind, status=type(error).__name__ if error is not None else (page.status_code if page is not None else 'too_large'))
+        if page is not None:
+            metrics.inc('fetch_bytes', len(page.content), kind=kind)
+
+        if not retryable:
+            policy.breaker.record_success()
+            policy.remove_dead_letter(url)
+            return page
+
+        policy.breaker.record_failure(logger)
+        reason = f"{error}" if error is not None else f"HTTP {page.status_code}"
+        if attempt >= policy.retries:
+            logger.error(f"Request to {url} failed after {attempt + 1} attempts: {reason}")
+            policy.add_dead_letter(url, reason)
+            metrics.inc('fetch_dead_letters', kind=kind)
+            return page
+        delay = policy.backoff(attempt, page.headers.get('Retry-After') if page is not None else None)
+        logger.warning(f"Request to {url} failed ({reason}) - retry {attempt + 1}/{policy.retries} in {delay:.1f}s")
+        metrics.inc('fetch_retries', kind=kind)
+        time.sleep(delay)
+        attempt += 1
+
+def get(url, logger, headers=None):
+    """GET the url through the shared session and the page cache (if configured).
+
+    Fresh cached pages are returned without a request, stale ones are revalidated with
+    If-None-Match/If-Modified-Since. The body is streamed and the request is abandoned
+    once it exceeds the byte budget. Timeouts, connection errors, 429 and 5xx responses
+    are retried according to the fetch policy (see `scrape.policy`).
+
+    Args:
+        url (str): The canonical URL of the page.
+        logger (Logger): The logger object.
+        headers (dict): Extra request headers.
+
+    Returns:
+        Page | None: The fetched page (the last failed response once the retries run out), or None
+            on connection errors and timeouts, too large bodies or pages missing in the cache in offline mode.
+    """
+    cache = _config['cache']
+    entry = cache.lookup(url) if cache is not None else None
+
+    if entry is not None and (entry.fresh or _config['offline']):
+        metrics.inc('cache_hits', kind=page_kind(url))
+        return Page(url, 200, entry.content, CaseInsensitiveDict(), from_cache=True)
+    if _config['offline']:
+        logger.info(f"Offline mode - {url} is not cached")
+        return None
+
+    headers = dict(headers or {})
+    if entry is not None:
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+
+    page = _fetch(url, logger, headers=headers)
+
+    if page is not None and cache is not None:
+        if page.status_code == 304 and entry is not None:
+            metrics.inc('cache_revalidated', kind=page_kind(url))
+            cache.touch(url)
+            return Page(url, 200, entry.content, page.headers, from_cache=True)
+        metrics.inc('cache_misses', kind=page_kind(url))
+        if page.status_code == 200 and ERROR_MARKER not in page.content:
+            cache.store(url, page.content, page.headers)
+
+    return page
@@ -0,0 +1,245 @@
+"""Columnar Parquet dataset of votings (requires pyarrow).
+
+A dataset is a directory (by convention named `*.parquet`) with these tables:
+
+- `votings/` - one row per voting, hive-partitioned by `cislo_schodze`
+- `votes.parquet` - one row per member vote with integer IDs and dictionary-encoded
+  vote code, member name and party
+- `documents.parquet` - parliamentary press (CPT) of each voting, if the documents were added
+- `members.parquet` - bio and memberships of each member, if the member info was added
+"""
+import os
+import shutil
+from scrape import metrics
+
+# pyarrow is imported on first use - it takes longer to import than the whole scraping core
+pa = None
+ds = None
+pq = None
+
+BATCH_SIZE = 1000
+
+INT_FIELDS = ['pritomni', 'hlasujucich', 'za_hlasovalo', 'proti_hlasovalo', 'zdrzalo_sa', 'nehlasovalo', 'nepritomni', 'neplatne']
+STR_FIELDS = ['cas_hlasovania', 'schodza', 'nazov_hlasovania', 'vysledok_hlasovania', 'url_hlasovania']
+DOCUMENT_FIELDS = ['cislo_parlamentna_tlac', 'url_parlamentna_tlac', 'typ_parlamentna_tlac', 'cas_parlamentna_tlac', 'nazov_parlamentna_tlac']
+MEMBER_FIELDS = ['meno', 'titul', 'priezvisko', 'kandidoval_za', 'narodeny', 'narodnost', 'bydlisko', 'kraj', 'email', 'www', 'photo']
+
+def is_parquet(path):
+    return isinstance(path, str) and path.rstrip('/').endswith('.parquet')
+
+def _require_pyarrow():
+    global pa, ds, pq
+    if pa is not None:
+        return
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet output requires pyarrow - pip install pyarrow")
+    pa, ds, pq = pyarrow, pyarrow.dataset, pyarrow.parquet
+
+def to_int(value):
+    """The value as int, None if it is missing or not a number (e.g. '' of a missing count)."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def to_str(value):
+    """The value as str, None stays None - the IDs and counts are str in the JSON shape."""
+    return None if value is None else str(value)
+
+def _dictionary(values):
+    return pa.array(values, type=pa.string()).dictionary_encode()
+
+class ParquetVotingWriter:
+    """Write votings to a Parquet dataset in batches of `batch_size` votings.
+
+    Has the same `write(voting_id, voting)`/`close()` interface as `JsonlWriter`, so
+    it can be used as the sink of `scrape_voting_data` and of the enrichment stages.
+
+    Args:
+        path (str): The dataset directory, replaced if it exists.
+        batch_size (int): Number of votings buffered before writing.
+    """
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE):
+        _require_pyarrow()
+        self.path = path
+        self.batch_size = batch_size
+        self.count = 0
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        self._batch = 0
+        self._votings = []
+        self._members = {}
+        self._votes_writer = None
+        self._documents_writer = None
+
+    def write(self, voting_id, voting):
+        self._votings.append((int(voting_id), voting))
+        self.count += 1
+        if len(self._votings) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._votings:
+            return
+        with metrics.timer('write_seconds', format='parquet'):
+            self._write_batch()
+
+    def _write_batch(self):
+        votings = self._votings
+        self._votings = []
+
+        columns = {'voting_id': pa.array([voting_id for voting_id, _ in votings], type=pa.int32())}
+        for field in STR_FIELDS:
+            columns[field] = pa.array([voting.get(field) for _, voting in votings], type=pa.string())
+        columns['cislo_schodze'] = pa.array([to_int(voting.get('cislo_schodze')) for _, voting in votings], type=pa.int32())
+        columns['cislo_hlasovania'] = pa.array([to_int(voting.get('cislo_hlasovania')) for _, voting in votings], type=pa.int32())
+        for field in INT_FIELDS:
+            columns[field] = pa.array([to_int(voting.get(field)) for _, voting in votings], type=pa.int32())
+        pq.write_to_dataset(
+            pa.table(columns),
+            os.path.join(self.path, 'votings'),
+            partition_cols=['cislo_schodze'],
+            basename_template=f"part-{self._batch}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore'
+        )
+        self._batch += 1
+
+        votes = {'voting_id': [], 'poslanec_id': [], 'hlas_id': [], 'poslanec_meno': [], 'hlasovanie_klub': []}
+        documents = {'voting_id': [], **{field: [] for field in DOCUMENT_FIELDS}, 'dokumenty_parlamentna_tlac': []}
+        for voting_id, voting in votings:
+            for vote in voting.get('hlasovanie', []):
+                votes['voting_id'].append(voting_id)
+                votes['poslanec_id'].append(to_int(vote.get('poslanec_id')))
+                votes['hlas_id'].append(vote.get('hlas_id'))
+                votes['poslanec_meno'].append(vote.get('poslanec_meno'))
+                votes['hlasovanie_klub'].append(vote.get('hlasovanie_klub'))
+                if vote.get('poslanec_bio') and vote.get('poslanec_id') not in self._members:
+                    self._members[vote.get('poslanec_id')] = {'info': vote['poslanec_bio'], 'clenstvo': vote.get('poslanec_clenstvo', [])}
+            document = voting.get('parlamentna_tlac')
+            if document:
+                documents['voting_id'].append(voting_id)
+                for field in DOCUMENT_FIELDS:
+                    documents[field].append(document.get(field))
+                documents['dokumenty_parlamentna_tlac'].append(document.get('dokumenty_parlamentna_tlac', []))
+
+        votes_table = pa.table({
+            'voting_id': pa.array(votes['voting_id'], type=pa.int32()),
+            'poslanec_id': pa.array(votes['poslanec_id'], type=pa.int32()),
+            'hlas_id': _dictionary(votes['hlas_id']),
+            'poslanec_meno': _dictionary(votes['poslanec_meno']),
+            'hlasovanie_klub': _dictionary(votes['hlasovanie_klub']),
+        })
+        if self._votes_writer is None:
+            self._votes_writer = pq.ParquetWriter(os.path.join(self.path, 'votes.parquet'), votes_table.schema)
+        self._votes_writer.write_table(votes_table.cast(self._votes_writer.schema))
+
+        if documents['voting_id']:
+            documents_table = pa.table({
+                'voting_id': pa.array(documents['voting_id'], type=pa.int32()),
+                **{field: pa.array(documents[field], type=pa.string()) for field in DOCUMENT_FIELDS},
+                'dokumenty_parlamentna_tlac': pa.array(
+                    documents['dokumenty_parlamentna_tlac'],
+                    type=pa.list_(pa.struct([('link', pa.string()), ('description', pa.string())]))
+                ),
+            })
+            if self._documents_writer is None:
+                self._documents_writer = pq.ParquetWriter(os.path.join(self.path, 'documents.parquet'), documents_table.schema)
+            self._documents_writer.write_table(documents_table)
+
+    def close(self):
+        self._flush()
+        if self._votes_writer is not None:
+            self._votes_writer.close()
+        if self._documents_writer is not None:
+            self._documents_writer.close()
+        if self._members:
+            write_members_parquet(self._members, os.path.join(self.path, 'members.parquet'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_members_parquet(members, save_to_file):
+    """Save members (`{poslanec_id: {'info': {...}, 'clenstvo': [...]}}`) to a Parquet file."""
+    _require_pyarrow()
+    ids = list(members)
+    table = pa.table({
+        'poslanec_id': pa.array([to_int(member_id) for member_id in ids], type=pa.int32()),
+        **{field: pa.array([members[member_id]['info'].get(field) for member_id in ids], type=pa.string()) for field in MEMBER_FIELDS},
+        'clenstvo': pa.array([members[member_id].get('clenstvo', []) for member_id in ids], type=pa.list_(pa.string())),
+    })
+    pq.write_table(table, save_to_file)
+
+def read_members_parquet(path):
+    """Load the members table back to `{poslanec_id: {'info': {...}, 'clenstvo': [...]}}`."""
+    _require_pyarrow()
+    members = {}
+    for row in pq.read_table(path).to_pylist():
+        members[str(row.pop('poslanec_id'))] = {'clenstvo': row.pop('clenstvo') or [], 'info': row}
+    return members
+
+def read_table(path, name, columns=None):
+    """Read one table of the dataset (only `columns` if given), None if the dataset does not have it."""
+    _require_pyarrow()
+    if name == 'votings':
+        return ds.dataset(os.path.join(path, 'votings'), format='parquet', partitioning='hive').to_table(columns=columns)
+    file = os.path.join(path, f"{name}.parquet")
+    return pq.read_table(file, columns=columns) if os.path.exists(file) else None
+
+def iter_parquet_votings(path):
+    """Yield (voting_id, voting) pairs in the nested JSON shape, ordered by voting ID."""
+    votings = read_table(path, 'votings').sort_by('voting_id').to_pylist()
+    votes = {}
+    for vote in read_table(path, 'votes').to_pylist():
+        votes.setdefault(vote.pop('voting_id'), []).append(vote)
+    documents_table = read_table(path, 'documents')
+    documents = {row.pop('voting_id'): row for row in documents_table.to_pylist()} if documents_table is not None else None
+    members = read_members_parquet(os.path.join(path, 'members.parquet')) if os.path.exists(os.path.join(path, 'members.parquet')) else None
+
+    for voting in votings:
+        voting_id = voting.pop('voting_id')
+        record = {field: voting.get(field) for field in STR_FIELDS[:2]}
+        record['cislo_schodze'] = to_str(voting.get('cislo_schodze'))
+        record['cislo_hlasovania'] = to_str(voting.get('cislo_hlasovania'))
+        record.update({field: voting.get(field) for field in STR_FIELDS[2:]})
+        record.update({field: to_str(voting.get(field)) for field in INT_FIELDS})
+        record['hlasovanie'] = []
+        for vote in votes.get(voting_id, []):
+            vote = {
+                'hlas_id': vote['hlas_id'],
+                'poslanec_id': to_str(vote['poslanec_id']),
+                'poslanec_meno': vote['poslanec_meno'],
+                'hlasovanie_klub': vote['hlasovanie_klub'],
+            }
+            if members is not None:
+                member = members.get(vote['poslanec_id'], {})
+                vote['poslanec_bio'] = member.get('info', {})
+                vote['poslanec_clenstvo'] = member.get('clenstvo', [])
+            record['hlasovanie'].append(vote)
+        if documents is not None:
+            record['parlamentna_tlac'] = documents.get(voting_id, [])
+        yield str(voting_id), record
+
+class ParquetVotings:
+    """Read-only dict-like view of a Parquet voting dataset."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def items(self):
+        return iter_parquet_votings(self.path)
+
+    def values(self):
+        return (voting for _, voting in iter_parquet_votings(self.path))
+
+    def __iter__(self):
+        return (str(voting_id) for voting_id in sorted(read_table(self.path, 'votings').column('voting_id').to_pylist()))
+
+    def __len__(self):
+        return read_table(self.path, 'votings').num_rows
@@ -0,0 +1,127 @@
+import logging
+from scrape.voting import _fetch_voting
+
+DEFAULT_WINDOW = 3
+DEFAULT_SAMPLE_STEP = 250
+
+class VotingIdProbe:
+    """Checks whether voting IDs exist, remembering every answer.
+
+    A probe of ID `x` is positive if any voting in `[x, x + window)` exists, so a single
+    missing ID inside a session is not mistaken for the end of the data.
+
+    Args:
+        logger (Logger): The logger object.
+        window (int): Number of consecutive IDs checked by one probe.
+        retries (int): Attempts per ID when the request fails, at least 1.
+    """
+    def __init__(self, logger, window: int = DEFAULT_WINDOW, retries: int = 3):
+        if retries < 1:
+            raise ValueError(f"A voting ID probe needs at least 1 attempt per ID, got retries={retries}")
+        self.logger = logger
+        self.window = window
+        self.retries = retries
+        self.requests = 0
+        self._known = {}
+
+    def exists(self, voting_id):
+        if voting_id not in self._known:
+            for _ in range(self.retries):
+                self.requests += 1
+                content, failed = _fetch_voting(voting_id, self.logger)
+                if not failed:
+                    break
+            if failed:
+                self.logger.error(f"Could not check voting ID {voting_id} - treated as nonexistent")
+            self._known[voting_id] = content is not None
+        return self._known[voting_id]
+
+    def alive(self, voting_id):
+        return any(self.exists(i) for i in range(voting_id, voting_id + self.window))
+
+    def last_existing(self, voting_id):
+        """The highest existing ID in the probe window of `voting_id`, None if there is none."""
+        return next((i for i in range(voting_id + self.window - 1, voting_id - 1, -1) if self.exists(i)), None)
+
+def _bisect(probe, lo, hi):
+    """Find the boundary between an alive `lo` and a dead `hi` probe. Returns the last alive probe ID."""
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if probe.alive(mid):
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+def find_frontier(id_start: int, logger=None, probe: VotingIdProbe | None = None):
+    """Find the highest existing voting ID at or above `id_start`.
+
+    Gallops with an exponentially growing step until a probe is dead, then binary
+    searches the last step - O(log n) requests instead of a linear scan.
+
+    Returns:
+        int | None: The highest existing voting ID, None if no voting exists at `id_start`.
+    """
+    logger = logger or logging.getLogger(__name__)
+    probe = probe or VotingIdProbe(logger)
+    if not probe.alive(id_start):
+        logger.warning(f"No voting found at ID {id_start}")
+        return None
+
+    lo, step = id_start, 1
+    while probe.alive(lo + step):
+        lo += step
+        step *= 2
+    frontier = probe.last_existing(_bisect(probe, lo, lo + step))
+    logger.info(f"Voting ID frontier is {frontier} ({probe.requests} requests)")
+    return frontier
+
+def _rising_edge(probe, lo, hi):
+    """Find the first alive probe ID between a dead `lo` and an alive `hi`."""
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if probe.alive(mid):
+            hi = mid
+        else:
+            lo = mid
+    return hi
+
+def map_voting_ranges(id_start: int, id_end: int, logger=None, step: int = DEFAULT_SAMPLE_STEP, probe: VotingIdProbe | None = None):
+    """Map where votings exist between `id_start` and `id_end` (both included) by sparse sampling.
+
+    Every `step`-th ID is probed; runs of alive samples become ranges whose edges are
+    then found by binary search, so large gaps (e.g. between electoral terms) cost only
+    a few requests. Ranges shorter than `step` lying entirely between two samples are missed.
+
+    Returns:
+        list[tuple[int, int]]: The candidate (start, end) ranges, both ends included.
+    """
+    logger = logger or logging.getLogger(__name__)
+    if id_end < id_start:
+        logger.warning(f"Empty ID range {id_start} to {id_end} - nothing to discover")
+        return []
+    probe = probe or VotingIdProbe(logger)
+
+    samples = list(range(id_start, id_end + 1, step))
+    if samples[-1] != id_end:
+        samples.append(id_end)
+
+    ranges = []
+    prev_id, prev_alive, range_start = None, False, None
+    for voting_id in samples:
+        alive = probe.alive(voting_id)
+        if alive and not prev_alive:
+            range_start = voting_id if prev_id is None else _rising_edge(probe, prev_id, voting_id)
+        elif not alive and prev_alive:
+            ranges.append((range_start, probe.last_existing(_bisect(probe, prev_id, voting_id))))
+        prev_id, prev_alive = voting_id, alive
+    if prev_alive:
+        ranges.append((range_start, id_end))
+
+    ranges = [(max(start, id_start), min(end, id_end)) for start, end in ranges]
+    logger.info(f"Found {len(ranges)} voting ranges between {id_start} and {id_end} ({probe.requests} requests): {ranges}")
+    return ranges
+
+def ranges_to_ids(ranges):
+    """Expand (start, end) ranges to the voting IDs to scrape."""
+    return [voting_id for start, end in ranges for voting_id in range(start, end + 1)]
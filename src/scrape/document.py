@@ -1,10 +1,11 @@
-import requests
-from bs4 import BeautifulSoup
-import json
 import logging
 from datetime import datetime, timedelta
-import pandas as pd
 import re
+from scrape import client, metrics, store
+from scrape.columnar import is_parquet
+from scrape.jsonl import iter_votings, write_votings
+from scrape.page import DOCUMENT_PANELS, DOCUMENT_TABLE, make_soup, label_values
+from scrape.registry import DocumentRegistry
 
 def _generate_datetime_string(dt):
     """Generate NRSR page specific type string with %20 between date and time.
@@ -14,22 +15,28 @@ def _generate_datetime_string(dt):
     datetime_str = f"{date_str}%20{time_str}"
     return datetime_str
 
-def fetch_voting_document_table(meeting_id, voting_time, logger):
-    """Aux function to fetch the html content of the voting table for a specific meeting and time.
+# A voting table page with more rows than fit on one page has a pager row
+PAGER_MARKER = 'class="pager"'
+# Windows shorter than this are not split further, even if the result is paged
+MIN_SEARCH_WINDOW = timedelta(minutes=2)
+
+def fetch_document_search(meeting_id, datetime_from, datetime_to, logger):
+    """Aux function to fetch the html content of the voting table for a meeting and a time window.
 
     Args:
         meeting_id (int): The ID of the meeting = 'Schôdza č {meeting_id}'.
-        voting_time (datetime): The time of the voting
+        datetime_from (datetime): The start of the window.
+        datetime_to (datetime): The end of the window.
         logger (Logger): The logger object.
     """
-    datetime_start = _generate_datetime_string(voting_time - timedelta(minutes=1))
-    datetime_end = _generate_datetime_string(voting_time + timedelta(minutes=1))
-    url = f"https://www.nrsr.sk/web/Default.aspx?sid=schodze/hlasovanie/vyhladavanie_vysledok&Text=&CPT=&CisSchodze={meeting_id}&DatumOd={datetime_start}&DatumDo={datetime_end}"
+    datetime_start = _generate_datetime_string(datetime_from)
+    datetime_end = _generate_datetime_string(datetime_to)
+    url = f"{client.SITE_URL}?sid=schodze/hlasovanie/vyhladavanie_vysledok&Text=&CPT=&CisSchodze={meeting_id}&DatumOd={datetime_start}&DatumDo={datetime_end}"
 
-    response = requests.get(url)
+    response = client.get(url, logger)
     
-    if response.status_code != 200:
-        logger.error(f"Failed to fetch content for voting table for meeting {meeting_id} and time {voting_time}")
+    if response is None or response.status_code != 200:
+        logger.error(f"Failed to fetch content for voting table for meeting {meeting_id} from {datetime_from} to {datetime_to}")
         return None
     if "unexpected error" in response.text:
         logger.info(f"Skipping {meeting_id} - no such page")
@@ -37,6 +44,16 @@ def fetch_voting_document_table(meeting_id, voting_time, logger):
   
     return response.content
 
+def fetch_voting_document_table(meeting_id, voting_time, logger):
+    """Aux function to fetch the html content of the voting table for a specific meeting and time.
+
+    Args:
+        meeting_id (int): The ID of the meeting = 'Schôdza č {meeting_id}'.
+        voting_time (datetime): The time of the voting
+        logger (Logger): The logger object.
+    """
+    return fetch_document_search(meeting_id, voting_time - timedelta(minutes=1), voting_time + timedelta(minutes=1), logger)
+
 def parse_voting_document_id(content, logger):
     """Aux function to parse the voting table content and return the data in a structured way.
 
@@ -44,7 +61,7 @@ def parse_voting_document_id(content, logger):
         content (bytes): The html content of the voting table.
         logger (Logger): The logger object.
     """
-    soup = BeautifulSoup(content, 'html.parser')
+    soup = make_soup(content, parse_only=DOCUMENT_TABLE)
     table = soup.find('table', class_='tab_zoznam')
     
     if not table:
@@ -68,6 +85,52 @@ def parse_voting_document_id(content, logger):
     
     return data
 
+def _search_window(meeting_id, datetime_from, datetime_to, logger):
+    """All voting table rows of the meeting in the window, split in halves while the result is paged."""
+    content = fetch_document_search(meeting_id, datetime_from, datetime_to, logger)
+    if not content:
+        return []
+    if PAGER_MARKER in content.decode('utf-8', errors='ignore') and datetime_to - datetime_from > MIN_SEARCH_WINDOW:
+        middle = datetime_from + (datetime_to - datetime_from) / 2
+        middle = middle.replace(second=0, microsecond=0)
+        return _search_window(meeting_id, datetime_from, middle, logger) + _search_window(meeting_id, middle, datetime_to, logger)
+    with metrics.timer('parse_seconds', stage='document_table'):
+        return parse_voting_document_id(content, logger) or []
+
+class DocumentIndex:
+    """In-memory (cislo_schodze, cislo_hlasovania) -> CPT number index of the voting tables.
+
+    The voting table is searched once per meeting day instead of once per voting; a voting
+    missing in the day result falls back to the one minute window around its time.
+
+    Args:
+        logger (Logger): The logger object.
+    """
+    def __init__(self, logger):
+        self.logger = logger
+        self._index = {}
+        self._days = set()
+
+    def _add(self, rows):
+        for row in rows:
+            self._index.setdefault((row['cislo_schodze'], row['cislo_hlasovania']), row['cislo_parlamentna_tlac'])
+
+    def lookup(self, meeting_id, voting_number, voting_time):
+        """The CPT number of the voting, '' if the voting has none and None if it was not found."""
+        key = (str(meeting_id), str(voting_number))
+        day = (key[0], voting_time.date())
+        if day not in self._days:
+            self._days.add(day)
+            day_start = datetime.combine(voting_time.date(), datetime.min.time())
+            self.logger.info(f"Scraping voting table for meeting {meeting_id} on {voting_time.date()}...")
+            self._add(_search_window(meeting_id, day_start, day_start + timedelta(days=1), self.logger))
+        if key not in self._index:
+            content = fetch_voting_document_table(meeting_id, voting_time, self.logger)
+            with metrics.timer('parse_seconds', stage='document_table'):
+                self._add((content and parse_voting_document_id(content, self.logger)) or [])
+            self._index.setdefault(key, None)
+        return self._index[key]
+
 def fetch_document_details(url, logger):
     """Fetch the html content of the document details.
 
@@ -75,9 +138,9 @@ def fetch_document_details(url, logger):
         url (str): The URL of the document details.
         logger (Logger): The logger object.
     """
-    response = requests.get(url)
+    response = client.get(url, logger)
     
-    if response.status_code != 200:
+    if response is None or response.status_code != 200:
         logger.error(f"Failed to fetch content for document details")
         return None
     if "unexpected error" in response.text:
@@ -86,6 +149,8 @@ def fetch_document_details(url, logger):
   
     return response.content
 
+DOCUMENT_DETAIL_FIELDS = ['cislo_parlamentna_tlac', 'parlamentna_tlac_typ', 'parlamentna_tlac_datum', 'parlamentna_tlac_nazov', 'parlamentna_tlac_dokumenty']
+
 def parse_document_details(content, logger):
     """Parse the document details content and return the data in a structured way.
 
@@ -93,7 +158,7 @@ def parse_document_details(content, logger):
         content (bytes): The html content of the document details.
         logger (Logger): The logger object.
     """
-    soup = BeautifulSoup(content, 'html.parser')
+    soup = make_soup(content, parse_only=DOCUMENT_PANELS)
     details_div = soup.find('div', class_='parliamentary_press_details')
     
     if not details_div:
@@ -103,13 +168,14 @@ def parse_document_details(content, logger):
     details = {}
     
     try:
-        details['cislo_parlamentna_tlac'] = details_div.find('strong', text='Číslo').find_next('span').text.strip()
-        details['parlamentna_tlac_typ'] = details_div.find('strong', text='Typ').find_next('span').text.strip()
-        details['parlamentna_tlac_datum'] = details_div.find('strong', text='Dátum doručenia').find_next('span').text.strip()
-        details['parlamentna_tlac_nazov'] = details_div.find('strong', text='Názov').find_next('span').text.strip()
+        labels = label_values(details_div)
+        details['cislo_parlamentna_tlac'] = labels['Číslo'].text.strip()
+        details['parlamentna_tlac_typ'] = labels['Typ'].text.strip()
+        details['parlamentna_tlac_datum'] = labels['Dátum doručenia'].text.strip()
+        details['parlamentna_tlac_nazov'] = labels['Názov'].text.strip()
 
         documents = []
-        documents_div = details_div.find('strong', text='Dokumenty').find_next('span')
+        documents_div = labels['Dokumenty']
         for a in documents_div.find_all('a', href=True):
             doc = {
                 'link': a['href'],
@@ -118,62 +184,85 @@ def parse_document_details(content, logger):
             documents.append(doc)
         details['parlamentna_tlac_dokumenty'] = documents
 
-    except AttributeError as e:
+    except (AttributeError, KeyError) as e:
         logger.error(f"Error parsing document details: {e}")
         return None
     
     return details
 
-def add_documents_to_voting_data(voting_data, logger = None, save_to_file = None):
+def _document_url(cislo_parlamentna_tlac):
+    return f"{client.SITE_URL}?sid=zakony/cpt&ID={cislo_parlamentna_tlac}"
+
+def get_document_details(cislo_parlamentna_tlac, registry, logger):
+    """Parsed details of the CPT from the registry; unseen CPTs are fetched and registered.
+
+    Args:
+        cislo_parlamentna_tlac (str): The CPT number.
+        registry (DocumentRegistry): The registry of parsed CPT details.
+        logger (Logger): The logger object.
+    """
+    details = registry.get(cislo_parlamentna_tlac)
+    metrics.inc('registry_hits' if details is not None else 'registry_misses')
+    if details is None:
+        content = fetch_document_details(_document_url(cislo_parlamentna_tlac), logger)
+        if content:
+            with metrics.timer('parse_seconds', stage='document'):
+                details = parse_document_details(content, logger)
+            if details:
+                registry.put(cislo_parlamentna_tlac, details)
+    return details
+
+def add_documents(details, document_index, registry, logger):
+    """Add the parliamentary press (CPT) details to one voting, looked up in `document_index` and `registry`."""
+    cislo_schodze = details.get('cislo_schodze')
+    cislo_hlasovania = details.get('cislo_hlasovania')
+    cas_hlasovania = datetime.strptime(details.get('cas_hlasovania'), '%d. %m. %Y %H:%M')
+
+    details['parlamentna_tlac'] = []
+
+    with metrics.timer('enrich_seconds', stage='document'):
+        cislo_parlamentna_tlac = document_index.lookup(cislo_schodze, cislo_hlasovania, cas_hlasovania)
+        if cislo_parlamentna_tlac:
+            document_details = get_document_details(cislo_parlamentna_tlac, registry, logger)
+            if document_details:
+                details['parlamentna_tlac'] = {
+                    'cislo_parlamentna_tlac': cislo_parlamentna_tlac,
+                    'url_parlamentna_tlac': _document_url(cislo_parlamentna_tlac),
+                    'typ_parlamentna_tlac': document_details['parlamentna_tlac_typ'],
+                    'cas_parlamentna_tlac': document_details['parlamentna_tlac_datum'],
+                    'nazov_parlamentna_tlac': document_details['parlamentna_tlac_nazov'],
+                    'dokumenty_parlamentna_tlac': document_details['parlamentna_tlac_dokumenty']
+                }
+    return details
+
+def add_documents_to_voting_data(voting_data, logger = None, save_to_file = None, registry = None):
+    """Add the parliamentary press (CPT) details to each voting.
+
+    Args:
+        voting_data (dict | str | JsonlVotings): The votings, or a JSON/JSONL file with votings.
+        logger (Logger): The logger object.
+        save_to_file (str): The JSON/JSONL file to save the result to. JSONL is written
+            voting by voting without loading all votings into memory.
+        registry (DocumentRegistry): The registry of parsed CPT details, in-memory if None.
+    """
     logger = logger or logging.getLogger()
-    document_cache = {}
-    
-    for _, details in voting_data.items():
-        cislo_schodze = details.get('cislo_schodze')
-        cislo_hlasovania = details.get('cislo_hlasovania')
-        cas_hlasovania = datetime.strptime(details.get('cas_hlasovania'), '%d. %m. %Y %H:%M')
-
-        cache_key = (cislo_schodze, cislo_hlasovania)
-
-        details['parlamentna_tlac'] = []
-
-        if cache_key in document_cache:
-            details['parlamentna_tlac'] = document_cache[cache_key]
-        else:
-            content = fetch_voting_document_table(cislo_schodze, cas_hlasovania, logger)
-            if content:
-                document_ids = parse_voting_document_id(content, logger)
-                if document_ids:
-                    matching_document = next((doc for doc in document_ids if doc['cislo_schodze'] == cislo_schodze and doc['cislo_hlasovania'] == cislo_hlasovania), None)
-                    if matching_document:
-                        url_parlamentna_tlac = f"https://www.nrsr.sk/web/Default.aspx?sid=zakony/cpt&ID={matching_document['cislo_parlamentna_tlac']}"
-                        document_content = fetch_document_details(url_parlamentna_tlac, logger)
-                        if document_content:
-                            document_details = parse_document_details(document_content, logger)
-                            if document_details:
-                                all_info = {
-                                    'cislo_parlamentna_tlac': matching_document['cislo_parlamentna_tlac'],
-                                    'url_parlamentna_tlac': url_parlamentna_tlac,
-                                    'typ_parlamentna_tlac': document_details['parlamentna_tlac_typ'],
-                                    'cas_parlamentna_tlac': document_details['parlamentna_tlac_datum'],
-                                    'nazov_parlamentna_tlac': document_details['parlamentna_tlac_nazov'],
-                                    'dokumenty_parlamentna_tlac': document_details['parlamentna_tlac_dokumenty']
-                                }
-                                document_cache[cache_key] = all_info
-                                details['parlamentna_tlac'] = all_info
-    if save_to_file:
-        with open(save_to_file, 'w', encoding='utf-8') as f:
-            json.dump(voting_data, f, ensure_ascii=False, indent=4)
+    registry = registry if registry is not None else DocumentRegistry()
+    document_index = DocumentIndex(logger)
 
-    return voting_data
+    votings = ((voting_id, add_documents(details, document_index, registry, logger)) for voting_id, details in iter_votings(voting_data))
+
+    if save_to_file:
+        return write_votings(votings, save_to_file)
+    if isinstance(voting_data, dict):
+        for _ in votings:
+            pass
+        return voting_data
+    return dict(votings)
 
 def _extract_unique_ids(json_file: str | None = None, data: dict | None = None):
-    if json_file is not None and data is None:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    
+    import pandas as pd
     records = []
-    for _, details in data.items():
+    for _, details in iter_votings(data if data is not None else json_file):
         schodza = re.search(r'\d+', details.get('schodza'))
         record = {
             'cas_hlasovania': datetime.strptime(details.get('cas_hlasovania'), '%d. %m. %Y %H:%M'),
@@ -186,45 +275,48 @@ def _extract_unique_ids(json_file: str | None = None, data: dict | None = None):
     df = df.drop_duplicates()
     return df
 
-def scrape_voting_documents(voting_file: str | dict, save_to_file, logger = None):
+def scrape_voting_documents(voting_file: str | dict, save_to_file, logger = None, registry = None):
+    # pandas is needed only by this stage, the rest of the module is part of the scraping core
+    import pandas as pd
     logger = logger or logging.getLogger()
+    registry = registry if registry is not None else DocumentRegistry()
     # get all meetings in order to get unique meeting and voting IDs needet to find the CPT (document id)
-    meetings = _extract_unique_ids(json_file=voting_file if isinstance(voting_file, str) else None, data=voting_file if isinstance(voting_file, dict) else None)
-
-    # run a loop over all unique ID combination and fetch all possible document CPT IDs
-    df = pd.DataFrame()
-    for _, meeting in meetings.iterrows():
-        meeting_id = meeting['cislo_schodze']
-        voting_time = meeting['cas_hlasovania']
-        
-        logger.info(f"Scraping voting table for meeting {meeting_id} and time {voting_time}...")
-        content = fetch_voting_document_table(meeting_id, voting_time, logger)
+    meetings = _extract_unique_ids(json_file=voting_file if isinstance(voting_file, str) else None, data=voting_file if not isinstance(voting_file, str) else None)
 
-        if content:
-            df = pd.concat([df,pd.DataFrame(parse_voting_document_id(content, logger))], ignore_index=True)
-    
-    df = df.drop_duplicates().dropna().astype({'cislo_schodze': int, 'cislo_hlasovania': int})
-
-    # having the CPT ID related to voting, now get the data related to the CPT
-    meetings = pd.merge(meetings, df, on=['cislo_schodze', 'cislo_hlasovania'])
+    # find the CPT (document id) of each voting in the voting tables, searched once per meeting day
+    document_index = DocumentIndex(logger)
+    meetings['cislo_parlamentna_tlac'] = [
+        document_index.lookup(meeting_id, voting_number, voting_time)
+        for meeting_id, voting_number, voting_time in zip(meetings['cislo_schodze'], meetings['cislo_hlasovania'], meetings['cas_hlasovania'])
+    ]
+    meetings = meetings.dropna(subset=['cislo_parlamentna_tlac'])
     meetings = meetings[meetings['cislo_parlamentna_tlac'] != ''].drop_duplicates()
-    meetings["url_parlamentna_tlac"] = meetings['cislo_parlamentna_tlac'].apply(lambda x: f"https://www.nrsr.sk/web/Default.aspx?sid=zakony/cpt&ID={x}")
+    meetings["url_parlamentna_tlac"] = meetings['cislo_parlamentna_tlac'].apply(_document_url)
 
-    # run a loop over all unique CPT IDs and fetch all possible document details
-    df = pd.DataFrame()
-    for url in meetings['url_parlamentna_tlac'].unique():
+    # run a loop over all unique CPT IDs and get the document details, the registry is asked first
+    records = []
+    for cislo_parlamentna_tlac in meetings['cislo_parlamentna_tlac'].unique():
         
-        logger.info(f"Scraping document details for CPT {url}...")
-        content = fetch_document_details(url, logger)
+        logger.info(f"Scraping document details for CPT {cislo_parlamentna_tlac}...")
+        details = get_document_details(cislo_parlamentna_tlac, registry, logger)
 
-        if content:
-            df = pd.concat([df,pd.DataFrame([parse_document_details(content, logger)])], ignore_index=True)
+        if details:
+            records.append(details)
     
+    df = pd.DataFrame(records, columns=DOCUMENT_DETAIL_FIELDS)
     df = df.drop_duplicates(subset=['cislo_parlamentna_tlac']).dropna()
 
-    output = pd.merge(meetings, df, on='cislo_parlamentna_tlac', validate='m:1')
+    with metrics.timer('merge_seconds', stage='document'):
+        output = pd.merge(meetings, df, on='cislo_parlamentna_tlac', validate='m:1')
 
-    if save_to_file:
-        output.to_excel(save_to_file, index=False)
+    if store.is_sqlite(save_to_file):
+        with metrics.timer('write_seconds', format='sqlite'):
+            store.write_documents(output.to_dict('records'), save_to_file)
+    elif is_parquet(save_to_file):
+        with metrics.timer('write_seconds', format='parquet'):
+            output.to_parquet(save_to_file, index=False)
+    elif save_to_file:
+        with metrics.timer('write_seconds', format='xlsx'):
+            output.to_excel(save_to_file, index=False)
 
     return output
@@ -1,15 +1,77 @@
+import hashlib
+import logging
+import os
+import re
+import unicodedata
 import pandas as pd
+from scrape.columnar import is_parquet
 
-def get_election_member_votes(
-        input_xlsx: str = 'https://volby.statistics.sk/nrsr/nrsr2023/files/xlsx/NRSR2023_SK_tab07a.xlsx',
-        output_xlsx: str | None = 'data/interim/election_member_votes.xlsx',
-        elected_only: bool = True
-    ):
+# The tab07a (preferential votes of candidates) table of the election results
+ELECTION_URL = 'https://volby.statistics.sk/nrsr/nrsr{year}/files/xlsx/NRSR{year}_SK_tab07a.xlsx'
+ELECTION_CACHE_DIR = 'data/cache/elections'
+ELECTION_COLUMNS = ['volby_rok', 'kandidoval_za', 'poslanec_meno', 'poslanec_priezvisko', 'poslanec_volby_hlasov', 'poslanec_volby_hlasov_podiel', 'poslanec_volby_poradie', 'poslanec_volby_poradie_listok']
+# Academic titles without a dot, the ones with a dot are recognized by it
+TITLES = {'mba', 'msc', 'mim', 'phd', 'llm', 'dis'}
+
+def _fold(text):
+    """Lowercase without diacritics, e.g. 'Ľubomír Šutaj' -> 'lubomir sutaj'."""
+    text = unicodedata.normalize('NFKD', str(text))
+    return ''.join(char for char in text if not unicodedata.combining(char)).lower()
+
+def _words(text):
+    if not isinstance(text, str):
+        return []
+    return [word for word in re.split(r'[\s,]+', _fold(text)) if word and '.' not in word and word not in TITLES]
+
+def name_key(first_name, last_name, surname_word: int = -1):
+    """Normalized key of a person - folded first name and one word of the surname, titles stripped.
+
+    By default the last word of the surname is used, so that double surnames match the single one.
     """
-    Get the election member votes from the given URL - should be the tab07a of the election results.
+    first = _words(first_name)
+    last = _words(last_name)
+    return ' '.join(first[:1] + last[surname_word:][:1] if last else first[:1])
+
+def party_key(party):
+    """Normalized party name - folded, dashes and whitespace unified."""
+    return re.sub(r'\s+', ' ', re.sub(r'\s*[-–—]\s*', ' - ', _fold(party))).strip()
+
+def election_source(year_or_source):
+    """The tab07a URL of an election year, other sources (URL or file) are returned as they are."""
+    source = str(year_or_source).strip()
+    return ELECTION_URL.format(year=source) if re.fullmatch(r'\d{4}', source) else source
+
+def _election_year(source):
+    match = re.search(r'(?<!\d)(?:19|20)\d{2}(?!\d)', source)
+    return int(match.group(0)) if match else None
+
+def _cache_file(source, cache_dir):
+    # local files are re-parsed when they change, the published results never change
+    version = str(os.path.getmtime(source)) if os.path.exists(source) else ''
+    digest = hashlib.sha256(f"{source}|{version}".encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{digest}.pkl")
+
+def load_election_table(source: str, cache_dir: str | None = ELECTION_CACHE_DIR, logger=None):
+    """Parsed tab07a table of one election, cached as a pickle so that the xlsx is read only once.
+
+    Args:
+        source (str): The election year (e.g. '2023'), or the URL or file of the tab07a xlsx.
+        cache_dir (str | None): The directory of the parsed tables, None disables the cache.
+        logger (Logger): The logger object.
+
+    Returns:
+        pd.DataFrame: All candidates with the `ELECTION_COLUMNS`.
     """
-    df = pd.read_excel(input_xlsx, skiprows=2)
-    
+    logger = logger or logging.getLogger(__name__)
+    source = election_source(source)
+    cache_file = _cache_file(source, cache_dir) if cache_dir else None
+    if cache_file and os.path.exists(cache_file):
+        logger.info(f"Loading election table {source} from {cache_file}")
+        return pd.read_pickle(cache_file)
+
+    logger.info(f"Reading election table {source}")
+    df = pd.read_excel(source, skiprows=2)
+
     df = df.rename(
         columns={
             'Názov politického subjektu': 'kandidoval_za',
@@ -21,12 +83,107 @@ def get_election_member_votes(
             'Poradie na hlasovacom lístku': 'poslanec_volby_poradie_listok'
         }
     )
-    df = df[['kandidoval_za', 'poslanec_meno', 'poslanec_priezvisko', 'poslanec_volby_hlasov', 'poslanec_volby_hlasov_podiel', 'poslanec_volby_poradie', 'poslanec_volby_poradie_listok']]
-    
+    df['volby_rok'] = _election_year(source)
+    df = df[ELECTION_COLUMNS]
+
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        df.to_pickle(cache_file)
+    return df
+
+def get_election_member_votes(
+        input_xlsx: str | list = 'https://volby.statistics.sk/nrsr/nrsr2023/files/xlsx/NRSR2023_SK_tab07a.xlsx',
+        output_xlsx: str | None = 'data/interim/election_member_votes.xlsx',
+        elected_only: bool = True,
+        cache_dir: str | None = ELECTION_CACHE_DIR
+    ):
+    """
+    Get the election member votes from the given URL - should be the tab07a of the election results.
+    Several elections can be passed as a list or a comma separated string of years, URLs or files;
+    the `volby_rok` column tells them apart.
+    """
+    sources = input_xlsx.split(',') if isinstance(input_xlsx, str) else list(input_xlsx)
+    df = pd.concat([load_election_table(source, cache_dir) for source in sources], ignore_index=True)
+
     if elected_only:
         df = df[df.poslanec_volby_poradie.notna()]
 
-    if output_xlsx:
+    if is_parquet(output_xlsx):
+        df.to_parquet(output_xlsx, index=False)
+    elif output_xlsx:
         df.to_excel(output_xlsx, index=False)
 
-    return df
\ No newline at end of file
+    return df
+
+def build_election_index(election: pd.DataFrame):
+    """Hash index of the election rows by (party key, name key) and by name key alone.
+
+    Election sheets saved before `volby_rok` was added hold a single election and are
+    indexed as one.
+
+    Returns:
+        tuple[dict, dict]: Both map the key to the row positions of the latest election with the key.
+    """
+    by_party = {}
+    by_name = {}
+    years = election['volby_rok'].fillna(0) if 'volby_rok' in election else pd.Series(0, index=election.index)
+    for position, (year, party, first_name, last_name) in enumerate(zip(
+        years, election['kandidoval_za'], election['poslanec_meno'], election['poslanec_priezvisko']
+    )):
+        key = name_key(first_name, last_name)
+        for index, index_key in ((by_party, (party_key(party), key)), (by_name, key)):
+            latest = index.get(index_key)
+            if latest is None or year > latest[0]:
+                index[index_key] = (year, [position])
+            elif year == latest[0]:
+                latest[1].append(position)
+    return ({key: positions for key, (_, positions) in by_party.items()},
+            {key: positions for key, (_, positions) in by_name.items()})
+
+def match_election(member: pd.DataFrame, election: pd.DataFrame, logger=None):
+    """Join every member to their row of the latest election they ran in.
+
+    Members are matched by party and normalized name, members who ran for another party by
+    the name alone. Members without a match, or with more candidates of the same key in one
+    election, get empty election columns and are reported.
+
+    Args:
+        member (pd.DataFrame): Members with `kandidoval_za`, `poslanec_meno` and `poslanec_priezvisko`.
+        election (pd.DataFrame): Output of `get_election_member_votes`.
+        logger (Logger): The logger object.
+
+    Returns:
+        tuple[pd.DataFrame, dict]: The members with the election columns, and the report
+            `{'unmatched': [names], 'ambiguous': [names]}`.
+    """
+    logger = logger or logging.getLogger(__name__)
+    election = election.reset_index(drop=True)
+    by_party, by_name = build_election_index(election)
+
+    positions = []
+    report = {'unmatched': [], 'ambiguous': []}
+    for party, first_name, last_name in zip(member['kandidoval_za'], member['poslanec_meno'], member['poslanec_priezvisko']):
+        candidates = None
+        # the last word of a double surname first, then the first one (e.g. a maiden name in the election)
+        for key in dict.fromkeys([name_key(first_name, last_name), name_key(first_name, last_name, surname_word=0)]):
+            candidates = by_party.get((party_key(party), key)) or by_name.get(key)
+            if candidates:
+                break
+        if candidates is None:
+            report['unmatched'].append(f"{first_name} {last_name}")
+            positions.append(-1)
+        elif len(candidates) > 1:
+            report['ambiguous'].append(f"{first_name} {last_name}")
+            positions.append(-1)
+        else:
+            positions.append(candidates[0])
+
+    columns = [column for column in election.columns if column not in ('kandidoval_za', 'poslanec_meno', 'poslanec_priezvisko')]
+    matched = election[columns].reindex(positions).reset_index(drop=True)
+    result = pd.concat([member.reset_index(drop=True), matched], axis=1)
+
+    if report['unmatched']:
+        logger.warning(f"{len(report['unmatched'])} members not found in the election results: {report['unmatched']}")
+    if report['ambiguous']:
+        logger.warning(f"{len(report['ambiguous'])} members with more election candidates of the same name: {report['ambiguous']}")
+    return result, report
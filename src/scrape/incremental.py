@@ -0,0 +1,102 @@
+import heapq
+import json
+import logging
+import os
+from scrape import columnar, metrics, store
+from scrape.discovery import find_frontier
+from scrape.jsonl import is_jsonl, iter_votings, write_votings
+from scrape.voting import failed_ids_file, scrape_voting_data
+
+DEFAULT_LOOKAHEAD = 200
+
+def load_dataset_state(dataset):
+    """Return the set of voting IDs present in the dataset and the set of previously failed IDs."""
+    present = set()
+    if store.is_sqlite(dataset) and os.path.exists(dataset):
+        present = set(store.voting_ids(dataset))
+    elif columnar.is_parquet(dataset) and os.path.exists(dataset):
+        present = set(columnar.read_table(dataset, 'votings', columns=['voting_id']).column('voting_id').to_pylist())
+    elif os.path.exists(dataset):
+        present = {int(voting_id) for voting_id, _ in iter_votings(dataset)}
+
+    failed = set()
+    if os.path.exists(failed_ids_file(dataset)):
+        with open(failed_ids_file(dataset), 'r', encoding='utf-8') as f:
+            failed = set(json.load(f))
+
+    return present, failed - present
+
+def merge_votings(dataset, new_data, logger):
+    """Merge the new votings into the dataset - upserted into SQLite, the other formats are rewritten ordered by voting ID.
+
+    JSONL and Parquet are merged with the new votings in one streaming pass into a temporary
+    file which replaces the dataset, so an interrupted merge keeps the old dataset.
+    """
+    if store.is_sqlite(dataset):
+        with store.SqliteVotingWriter(dataset) as writer:
+            for voting_id in sorted(new_data, key=int):
+                writer.write(voting_id, new_data[voting_id])
+        return
+    if is_jsonl(dataset) or columnar.is_parquet(dataset):
+        new_votings = sorted(((str(voting_id), voting) for voting_id, voting in new_data.items()), key=lambda item: int(item[0]))
+        new_ids = {voting_id for voting_id, _ in new_votings}
+        existing = ((voting_id, voting) for voting_id, voting in iter_votings(dataset) if voting_id not in new_ids) if os.path.exists(dataset) else ()
+        data = write_votings(heapq.merge(existing, new_votings, key=lambda item: int(item[0])), dataset)
+        logger.info(f"Merged {len(new_data)} votings into {dataset} ({len(data)} in total)")
+        return
+
+    data = {}
+    if os.path.exists(dataset):
+        with open(dataset, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    data.update({str(voting_id): voting for voting_id, voting in new_data.items()})
+    data = {voting_id: data[voting_id] for voting_id in sorted(data, key=int)}
+    with metrics.timer('write_seconds', format='json'), open(dataset, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    logger.info(f"Merged {len(new_data)} votings into {dataset} ({len(data)} in total)")
+
+def update_voting_data(dataset: str, id_start: int, id_end: int | None = None, enrich=(), logger=None, lookahead: int = DEFAULT_LOOKAHEAD, discover: bool = False, **scrape_kwargs):
+    """Scrape only votings missing in the dataset and merge them into it.
+
+    The candidates are all previously failed IDs plus the IDs above the high-watermark
+    (the highest voting ID present or failed) up to `id_end`. Without an end the voting ID
+    frontier is discovered (`discover`), or `lookahead` IDs past the watermark are checked.
+    Votings which fail again are kept in the failed IDs file.
+
+    Args:
+        dataset (str): The JSON/JSONL file, the Parquet dataset or the SQLite store to update; created if missing.
+        id_start (int): The first voting ID used when the dataset is empty.
+        id_end (int | None): The last voting ID to check.
+        enrich (Iterable[Callable]): Functions applied to the dict of new votings before the merge,
+            e.g. `add_documents_to_voting_data`.
+        logger (Logger): The logger object.
+        lookahead (int): Number of IDs past the watermark to check when `id_end` is None.
+        discover (bool): Find the highest existing voting ID by galloping search when `id_end` is None.
+        scrape_kwargs: Passed to `scrape_voting_data` (concurrency, rate...).
+
+    Returns:
+        dict: The new votings.
+    """
+    logger = logger or logging.getLogger(__name__)
+    present, failed = load_dataset_state(dataset)
+
+    watermark = max(present | failed, default=id_start - 1)
+    if id_end is None and discover:
+        id_end = find_frontier(max(watermark, id_start), logger) or watermark
+    elif id_end is None:
+        id_end = watermark + lookahead
+    candidates = sorted(failed) + [voting_id for voting_id in range(watermark + 1, id_end + 1) if voting_id not in present]
+    logger.info(f"{len(present)} votings in {dataset}, watermark {watermark} - retrying {len(failed)} failed and checking {len(candidates) - len(failed)} new IDs")
+
+    still_failed = []
+    new_data = scrape_voting_data(id_start, id_end, None, logger=logger, voting_ids=candidates, failed=still_failed, **scrape_kwargs)
+    for step in enrich:
+        new_data = step(new_data, logger=logger)
+
+    if new_data:
+        merge_votings(dataset, new_data, logger)
+
+    with open(failed_ids_file(dataset), 'w', encoding='utf-8') as f:
+        json.dump(sorted(still_failed), f)
+
+    return new_data
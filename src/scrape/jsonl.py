@@ -0,0 +1,154 @@
+import heapq
+import json
+import os
+import shutil
+from scrape import metrics
+from scrape.columnar import ParquetVotingWriter, ParquetVotings, is_parquet, iter_parquet_votings
+from scrape.store import SqliteVotingWriter, SqliteVotings, is_sqlite, iter_sqlite_votings
+
+def is_jsonl(path):
+    return isinstance(path, str) and path.endswith('.jsonl')
+
+class JsonlWriter:
+    """Append one voting per line to a JSONL file.
+
+    Every line is `{"voting_id": <id>, ...voting fields}`. The file is flushed after
+    each record and fsynced every `fsync_every` records, so a crash loses at most the
+    records since the last fsync.
+
+    Args:
+        path (str): The JSONL file.
+        fsync_every (int): Number of records between two fsync calls.
+        append (bool): Append to an existing file instead of truncating it.
+    """
+    def __init__(self, path: str, fsync_every: int = 100, append: bool = False):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.count = 0
+        self._file = open(path, 'a' if append else 'w', encoding='utf-8')
+
+    def write(self, voting_id, voting):
+        with metrics.timer('write_seconds', format='jsonl'):
+            self._file.write(json.dumps({'voting_id': int(voting_id), **voting}, ensure_ascii=False))
+            self._file.write('\n')
+            self._file.flush()
+            self.count += 1
+            if self.fsync_every and self.count % self.fsync_every == 0:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def iter_jsonl(path):
+    """Lazily yield (voting_id, voting) pairs from a JSONL file. The ID is a str, same as keys of a loaded JSON."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                voting = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line of a crashed run may be cut in half
+                continue
+            yield str(voting.pop('voting_id')), voting
+
+class JsonlVotings:
+    """Read-only dict-like view of a JSONL voting file which never loads the whole file.
+    """
+    def __init__(self, path: str):
+        self.path = path
+
+    def items(self):
+        return iter_jsonl(self.path)
+
+    def values(self):
+        return (voting for _, voting in iter_jsonl(self.path))
+
+    def __iter__(self):
+        return (voting_id for voting_id, _ in iter_jsonl(self.path))
+
+    def __len__(self):
+        return sum(1 for _ in iter_jsonl(self.path))
+
+def iter_votings(source):
+    """Yield (voting_id, voting) pairs from a dict, a dict-like view, a JSON, JSONL, Parquet or SQLite dataset.
+
+    JSONL files are read lazily, JSON files are loaded as a whole.
+    """
+    if isinstance(source, str):
+        if is_parquet(source):
+            yield from iter_parquet_votings(source)
+            return
+        if is_sqlite(source):
+            yield from iter_sqlite_votings(source)
+            return
+        if is_jsonl(source):
+            yield from iter_jsonl(source)
+            return
+        with open(source, 'r', encoding='utf-8') as f:
+            source = json.load(f)
+    yield from source.items()
+
+def write_votings(votings, save_to_file, fsync_every=100):
+    """Save (voting_id, voting) pairs to a JSON, JSONL, Parquet or SQLite dataset (by extension).
+
+    JSONL and Parquet are written record by record to a temporary file which replaces
+    `save_to_file` at the end, so the input may be a lazy reader of the same file.
+    JSON and JSONL are saved ordered by voting ID: the (few) votings coming after a higher
+    ID, e.g. re-driven ones, are held back and merged in by one more pass over the file.
+    A SQLite store is updated in place - the votings are upserted, other votings are kept.
+
+    Returns:
+        dict | JsonlVotings | ParquetVotings | SqliteVotings: The saved data - a dict for JSON, a lazy view otherwise.
+    """
+    if is_sqlite(save_to_file):
+        with SqliteVotingWriter(save_to_file) as writer:
+            for voting_id, voting in votings:
+                writer.write(voting_id, voting)
+        return SqliteVotings(save_to_file)
+
+    if is_parquet(save_to_file):
+        tmp_dir = f"{save_to_file.rstrip('/')}.tmp"
+        with ParquetVotingWriter(tmp_dir) as writer:
+            for voting_id, voting in votings:
+                writer.write(voting_id, voting)
+        if os.path.exists(save_to_file):
+            shutil.rmtree(save_to_file)
+        os.replace(tmp_dir, save_to_file)
+        return ParquetVotings(save_to_file)
+
+    if is_jsonl(save_to_file):
+        tmp_file = f"{save_to_file}.tmp"
+        held_back = []
+        last_id = None
+        with JsonlWriter(tmp_file, fsync_every=fsync_every) as writer:
+            for voting_id, voting in votings:
+                if last_id is not None and int(voting_id) < last_id:
+                    held_back.append((voting_id, voting))
+                    continue
+                last_id = int(voting_id)
+                writer.write(voting_id, voting)
+        if held_back:
+            held_back.sort(key=lambda item: int(item[0]))
+            merged_file = f"{save_to_file}.merged.tmp"
+            with JsonlWriter(merged_file, fsync_every=fsync_every) as writer:
+                for voting_id, voting in heapq.merge(iter_jsonl(tmp_file), held_back, key=lambda item: int(item[0])):
+                    writer.write(voting_id, voting)
+            os.replace(merged_file, tmp_file)
+        os.replace(tmp_file, save_to_file)
+        return JsonlVotings(save_to_file)
+
+    data = dict(votings)
+    data = {voting_id: data[voting_id] for voting_id in sorted(data, key=int)}
+    with metrics.timer('write_seconds', format='json'), open(save_to_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    return data
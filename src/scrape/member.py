@@ -1,14 +1,20 @@
-import requests
-from bs4 import BeautifulSoup
 import json
 import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from scrape import client, metrics
+from scrape.columnar import is_parquet, read_members_parquet, read_table, write_members_parquet
+from scrape.jsonl import JsonlVotings, iter_votings, write_votings
+from scrape.page import MEMBER_PANELS, make_soup, label_values
+from scrape import store
 
 def fetch_mp_content(mp_id, logger):
-    url = f"https://www.nrsr.sk/web/Default.aspx?sid=poslanci/poslanec&PoslanecID={mp_id}"
+    url = f"{client.SITE_URL}?sid=poslanci/poslanec&PoslanecID={mp_id}"
     
-    response = requests.get(url)
+    response = client.get(url, logger)
     
-    if response.status_code != 200:
+    if response is None or response.status_code != 200:
         logger.error(f"Failed to fetch content for MP ID {mp_id}")
         return None
     if "unexpected error" in response.text:
@@ -18,7 +24,7 @@ def fetch_mp_content(mp_id, logger):
     return response.content
 
 def parse_member_info(content, logger):
-    soup = BeautifulSoup(content, 'html.parser')
+    soup = make_soup(content, parse_only=MEMBER_PANELS)
     personal_data_div = soup.find('div', class_='mp_personal_data')
     
     if not personal_data_div:
@@ -28,17 +34,18 @@ def parse_member_info(content, logger):
     member_info = {}
     
     try:
-        member_info['meno'] = personal_data_div.find('strong', text='Meno').find_next('span').text.strip()
-        member_info['titul'] = personal_data_div.find('strong', text='Titul').find_next('span').text.strip()
-        member_info['priezvisko'] = personal_data_div.find('strong', text='Priezvisko').find_next('span').text.strip()
-        member_info['kandidoval_za'] = personal_data_div.find('strong', text='Kandidoval(a) za').find_next('span').text.strip()
-        member_info['narodeny'] = personal_data_div.find('strong', text='Narodený(á)').find_next('span').text.strip()
-        member_info['narodnost'] = personal_data_div.find('strong', text='Národnosť').find_next('span').text.strip()
-        member_info['bydlisko'] = personal_data_div.find('strong', text='Bydlisko').find_next('span').text.strip()
-        member_info['kraj'] = personal_data_div.find('strong', text='Kraj').find_next('span').text.strip()
-        member_info['email'] = personal_data_div.find('strong', text='E-mail').find_next('span').find('a').text.strip()
-        member_info['www'] = personal_data_div.find('strong', text='WWW').find_next('span').text.strip()
-    except AttributeError:
+        labels = label_values(personal_data_div)
+        member_info['meno'] = labels['Meno'].text.strip()
+        member_info['titul'] = labels['Titul'].text.strip()
+        member_info['priezvisko'] = labels['Priezvisko'].text.strip()
+        member_info['kandidoval_za'] = labels['Kandidoval(a) za'].text.strip()
+        member_info['narodeny'] = labels['Narodený(á)'].text.strip()
+        member_info['narodnost'] = labels['Národnosť'].text.strip()
+        member_info['bydlisko'] = labels['Bydlisko'].text.strip()
+        member_info['kraj'] = labels['Kraj'].text.strip()
+        member_info['email'] = labels['E-mail'].find('a').text.strip()
+        member_info['www'] = labels['WWW'].text.strip()
+    except (AttributeError, KeyError):
         logger.error("Error parsing member info")
         return None
     
@@ -51,7 +58,7 @@ def parse_member_info(content, logger):
     return member_info
 
 def parse_member_membership(content, logger):
-    soup = BeautifulSoup(content, 'html.parser')
+    soup = make_soup(content, parse_only=MEMBER_PANELS)
     memberships_div = soup.find('div', class_='box')
     
     if not memberships_div:
@@ -77,8 +84,10 @@ def scrape_member_data(mp_id, save_to_file="data/raw/member.json", logger=None):
     logger.info(f"Scraping data for MP ID {mp_id}")
     content = fetch_mp_content(mp_id, logger)
     if content:
-        info = parse_member_info(content, logger)
-        memberships = parse_member_membership(content, logger)
+        with metrics.timer('parse_seconds', stage='member'):
+            content = make_soup(content, parse_only=MEMBER_PANELS)
+            info = parse_member_info(content, logger)
+            memberships = parse_member_membership(content, logger)
         
         if info:
             data[mp_id] = {
@@ -94,49 +103,190 @@ def scrape_member_data(mp_id, save_to_file="data/raw/member.json", logger=None):
         
     return None
 
-def scrape_member_data_all(voting_file, save_to_file="data/raw/members.json", logger=None):
+MEMBER_ID_PATTERN = re.compile(rb'"poslanec_id"\s*:\s*"?(\d+)(?=\D)')
+SCAN_CHUNK_SIZE = 1024 * 1024
+DEFAULT_MEMBER_WORKERS = 8
+
+def _scan_member_ids(path):
+    """Regex scan of a JSON/JSONL file in chunks - memory does not grow with the file size."""
+    member_ids = set()
+    tail = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(SCAN_CHUNK_SIZE)
+            buffer = tail + chunk
+            member_ids.update(match.decode() for match in MEMBER_ID_PATTERN.findall(buffer))
+            if not chunk:
+                break
+            # an ID cut by the chunk end is matched again with the next chunk
+            tail = buffer[-128:]
+    return member_ids
+
+def extract_member_ids(voting_data):
+    """Unique member IDs (str) of all votes, without loading the votings.
+
+    JSON and JSONL files are scanned in chunks, from a Parquet dataset only the `poslanec_id`
+    column of the votes is read and a SQLite store answers from its `poslanec_id` index.
+    """
+    if isinstance(voting_data, JsonlVotings):
+        voting_data = voting_data.path
+    elif hasattr(voting_data, 'path') and (is_parquet(voting_data.path) or store.is_sqlite(voting_data.path)):
+        voting_data = voting_data.path
+    if store.is_sqlite(voting_data):
+        return store.member_ids(voting_data)
+    if isinstance(voting_data, str) and is_parquet(voting_data):
+        votes = read_table(voting_data, 'votes', columns=['poslanec_id'])
+        return {str(member_id) for member_id in votes.column('poslanec_id').unique().to_pylist() if member_id is not None} if votes is not None else set()
+    if isinstance(voting_data, str):
+        return _scan_member_ids(voting_data)
+    return {member['poslanec_id'] for _, voting in iter_votings(voting_data) for member in voting['hlasovanie']}
+
+def prefetch_members(member_ids, logger, workers: int = DEFAULT_MEMBER_WORKERS):
+    """Scrape the members concurrently.
+
+    Returns:
+        dict: `{poslanec_id: {'info': {...}, 'clenstvo': [...]}}`, None for members which failed.
+    """
+    member_ids = sorted(member_ids, key=int)
+    logger.info(f"Prefetching {len(member_ids)} members with {workers} workers...")
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        results = executor.map(lambda member_id: scrape_member_data(member_id, save_to_file=None, logger=logger), member_ids)
+        return {member_id: member_data[member_id] if member_data else None for member_id, member_data in zip(member_ids, results)}
+
+def scrape_member_data_all(voting_file, save_to_file="data/raw/members.json", logger=None, workers: int = DEFAULT_MEMBER_WORKERS):
     logger = logger or logging.getLogger(__name__)
-    with open(voting_file, 'r', encoding='utf-8') as f:
-        votings = json.load(f)
-    
-    members = set()
-    for voting in votings.values():
-        for result in voting['hlasovanie']:
-            members.add(result['poslanec_id'])
-    
-    data = {}
-    for member in members:
-        member_data = scrape_member_data(member, save_to_file=None, logger=logger)
-        if member_data:
-            data.update(member_data)
+    members = extract_member_ids(voting_file)
+
+    data = {member_id: member_data for member_id, member_data in prefetch_members(members, logger, workers).items() if member_data}
 
     if data != {}:
-        with open(save_to_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
+        save_members(data, save_to_file)
 
     return data
 
-def add_member_info_to_voting_data(voting_data, logger=None, save_to_file=None):
-    logger = logger or logging.getLogger(__name__)
-    member_cache = {}
+def save_members(members, save_to_file):
+    """Save members (`{poslanec_id: {'info': {...}, 'clenstvo': [...]}}`) to a JSON or Parquet file or upsert them into a SQLite store."""
+    if store.is_sqlite(save_to_file):
+        store.write_members(members, save_to_file)
+    elif is_parquet(save_to_file):
+        write_members_parquet(members, save_to_file)
+    else:
+        with open(save_to_file, 'w', encoding='utf-8') as f:
+            json.dump(members, f, ensure_ascii=False, indent=4)
+
+def load_members(members_file):
+    """Load members saved by `save_members` (or `scrape_member_data_all`)."""
+    if is_parquet(members_file):
+        return read_members_parquet(members_file)
+    if store.is_sqlite(members_file):
+        return store.read_members(members_file)
+    with open(members_file, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def members_file(save_to_file):
+    """The members side table of a voting dataset, e.g. `votings.members.json` for `votings.jsonl`.
+
+    A SQLite store keeps the members in its own `members` table.
+    """
+    if store.is_sqlite(save_to_file):
+        return save_to_file
+    if is_parquet(save_to_file):
+        return os.path.join(save_to_file.rstrip('/'), 'members.parquet')
+    return f"{os.path.splitext(save_to_file)[0]}.members.json"
 
-    for _, voting in voting_data.items():
+def add_member_info(voting, member_cache, logger):
+    """Add the bio and memberships to every vote of one voting, members missing in `member_cache` are scraped into it."""
+    with metrics.timer('enrich_seconds', stage='member'):
         for member in voting['hlasovanie']:
             member_id = member['poslanec_id']
             member['poslanec_bio'] = {}
             member['poslanec_clenstvo'] = []
-            if member_id in member_cache:
+            if member_id not in member_cache:
+                member_data = scrape_member_data(member_id, save_to_file=None, logger=logger)
+                member_cache[member_id] = member_data[member_id] if member_data else None
+            if member_cache[member_id]:
                 member["poslanec_bio"] = member_cache[member_id]["info"]
                 member["poslanec_clenstvo"] = member_cache[member_id]["clenstvo"]
-            else:
+    return voting
+
+def collect_member_info(voting, member_cache, logger):
+    """Scrape the members of one voting missing in `member_cache` into it, the voting is left as it is (normalized mode)."""
+    with metrics.timer('enrich_seconds', stage='member'):
+        for member in voting['hlasovanie']:
+            member_id = member['poslanec_id']
+            if member_id not in member_cache:
                 member_data = scrape_member_data(member_id, save_to_file=None, logger=logger)
-                if member_data:
-                    member_cache[member_id] = member_data[member_id]
-                    member["poslanec_bio"] = member_data[member_id]["info"]
-                    member["poslanec_clenstvo"] = member_data[member_id]["clenstvo"]
+                member_cache[member_id] = member_data[member_id] if member_data else None
+    return voting
+
+def add_member_info_to_voting_data(voting_data, logger=None, save_to_file=None, normalized=False, members_to_file=None, workers: int = DEFAULT_MEMBER_WORKERS):
+    """Add the bio and memberships of every member to each of their votes.
+
+    In the normalized mode the votes keep only `poslanec_id` and every member is saved
+    once to a side table (see `members_file`), which is merged with the members already
+    saved there. `join_member_info` attaches the member info back when reading.
+    All members are prefetched concurrently before the votings are enriched.
+
+    Args:
+        voting_data (dict | str | JsonlVotings): The votings, or a JSON/JSONL file with votings.
+        logger (Logger): The logger object.
+        save_to_file (str): The JSON/JSONL file to save the result to. JSONL is written
+            voting by voting without loading all votings into memory.
+        normalized (bool): Save the member info to the side table instead of each vote.
+        members_to_file (str): The side table of the normalized mode, by default `members_file(save_to_file)`.
+        workers (int): Number of members fetched concurrently.
+    """
+    logger = logger or logging.getLogger(__name__)
+    # members failing here are retried once when enriching the first of their votes
+    member_cache = {member_id: member_data for member_id, member_data in prefetch_members(extract_member_ids(voting_data), logger, workers).items() if member_data}
+
+    if normalized:
+        members_to_file = members_to_file or (save_to_file and members_file(save_to_file))
+        if not members_to_file:
+            raise ValueError("The normalized member info requires save_to_file or members_to_file")
+        votings = ((voting_id, collect_member_info(voting, member_cache, logger)) for voting_id, voting in iter_votings(voting_data))
+    else:
+        votings = ((voting_id, add_member_info(voting, member_cache, logger)) for voting_id, voting in iter_votings(voting_data))
 
     if save_to_file:
-        with open(save_to_file, 'w', encoding='utf-8') as f:
-            json.dump(voting_data, f, ensure_ascii=False, indent=4)
+        result = write_votings(votings, save_to_file)
+    elif isinstance(voting_data, dict):
+        for _ in votings:
+            pass
+        result = voting_data
+    else:
+        result = dict(votings)
+
+    if normalized:
+        merge_members(member_cache, members_to_file, logger)
+    return result
+
+def merge_members(member_cache, members_to_file, logger):
+    """Merge the scraped members (None = failed) into the side table of the normalized mode."""
+    members = load_members(members_to_file) if os.path.exists(members_to_file) else {}
+    scraped = {member_id: member_data for member_id, member_data in member_cache.items() if member_data}
+    members.update(scraped)
+    save_members(members, members_to_file)
+    logger.info(f"Saved {len(scraped)} members to {members_to_file}")
+
+def join_member_info(voting_data, members):
+    """Lazily attach the member info of a normalized dataset to the votes.
+
+    The votings are read one by one and every vote references the single copy of its
+    member's bio and memberships, so the joined data is not materialized.
+
+    Args:
+        voting_data (dict | str | JsonlVotings): The normalized votings, or a JSON/JSONL file with them.
+        members (dict | str): The members, or their side table file.
 
-    return voting_data
\ No newline at end of file
+    Yields:
+        tuple[str, dict]: (voting_id, voting) in the shape of `add_member_info_to_voting_data` output.
+    """
+    if isinstance(members, str):
+        members = load_members(members)
+    for voting_id, voting in iter_votings(voting_data):
+        for vote in voting['hlasovanie']:
+            member = members.get(vote['poslanec_id'], {})
+            vote['poslanec_bio'] = member.get('info', {})
+            vote['poslanec_clenstvo'] = member.get('clenstvo', [])
+        yield voting_id, voting
@@ -0,0 +1,148 @@
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+PREFIX = 'nrsr_'
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_started = time.monotonic()
+
+def _key(name, labels):
+    # label values are strings as in Prometheus, so keys with e.g. status=200 and status='ReadTimeout' sort together
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def inc(name, value=1, **labels):
+    """Add `value` to the counter, e.g. `inc('fetch_bytes', len(content), kind='voting')`."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    """Record a duration in the latency histogram."""
+    key = _key(name, labels)
+    with _lock:
+        if key not in _histograms:
+            _histograms[key] = Histogram()
+        _histograms[key].observe(seconds)
+
+@contextmanager
+def timer(name, **labels):
+    """Time the block into the `name` histogram (exceptions included)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _started = time.monotonic()
+
+def _label_str(labels):
+    return ','.join(f"{k}={v}" for k, v in labels)
+
+def snapshot():
+    """All counters and histogram summaries plus the derived cache hit ratio."""
+    with _lock:
+        counters = {name + (f"{{{_label_str(labels)}}}" if labels else ''): value for (name, labels), value in sorted(_counters.items())}
+        histograms = {}
+        for (name, labels), histogram in sorted(_histograms.items()):
+            histograms[name + (f"{{{_label_str(labels)}}}" if labels else '')] = {
+                'count': histogram.count,
+                'sum': round(histogram.sum, 6),
+                'mean': round(histogram.sum / histogram.count, 6) if histogram.count else None,
+                'p50': histogram.quantile(0.5),
+                'p95': histogram.quantile(0.95),
+                'p99': histogram.quantile(0.99),
+            }
+        hits = sum(value for (name, _), value in _counters.items() if name == 'cache_hits')
+        lookups = hits + sum(value for (name, _), value in _counters.items() if name in ('cache_misses', 'cache_revalidated'))
+    return {
+        'elapsed_seconds': round(time.monotonic() - _started, 3),
+        'cache_hit_ratio': round(hits / lookups, 4) if lookups else None,
+        'counters': counters,
+        'histograms': {name: {k: (None if v == math.inf else v) for k, v in summary.items()} for name, summary in histograms.items()},
+    }
+
+def _prometheus_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels) + '}'
+
+def to_prometheus():
+    """The metrics in the Prometheus text exposition format (for the node exporter textfile collector)."""
+    lines = []
+    with _lock:
+        # samples are sorted by name, so every metric family is typed once before its samples
+        family = None
+        for (name, labels), value in sorted(_counters.items()):
+            if name != family:
+                lines.append(f"# TYPE {PREFIX}{name}_total counter")
+                family = name
+            lines.append(f"{PREFIX}{name}_total{_prometheus_labels(labels)} {value}")
+        family = None
+        for (name, labels), histogram in sorted(_histograms.items()):
+            if name != family:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                family = name
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append(f"{PREFIX}{name}_bucket{_prometheus_labels(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_sum{_prometheus_labels(labels)} {histogram.sum}")
+            lines.append(f"{PREFIX}{name}_count{_prometheus_labels(labels)} {histogram.count}")
+    return '\n'.join(lines) + '\n'
+
+def write_metrics(path):
+    """Save the metrics - Prometheus text format for `.prom` files, JSON otherwise."""
+    if path.endswith('.prom'):
+        content = to_prometheus()
+    else:
+        content = json.dumps(snapshot(), indent=4)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+def summary_lines():
+    """Short human readable summary of the histograms for the log."""
+    data = snapshot()
+    lines = [f"{name}: n={h['count']} total={h['sum']:.2f}s mean={h['mean']:.4f}s p95<={h['p95']}s" for name, h in data['histograms'].items()]
+    if data['cache_hit_ratio'] is not None:
+        lines.append(f"cache hit ratio: {data['cache_hit_ratio']:.2%}")
+    return lines
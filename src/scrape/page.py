@@ -0,0 +1,42 @@
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    PARSER = 'lxml'
+except ImportError:
+    PARSER = 'html.parser'
+
+# Panels needed from the member page ('box' holds the memberships)
+MEMBER_PANELS = SoupStrainer('div', class_=['mp_personal_data', 'mp_foto', 'box'])
+DOCUMENT_PANELS = SoupStrainer('div', class_='parliamentary_press_details')
+DOCUMENT_TABLE = SoupStrainer('table', class_='tab_zoznam')
+
+def make_soup(content, parse_only=None):
+    """Parse the page once - with lxml if installed, html.parser otherwise.
+
+    Already parsed pages are returned as they are, so the parse_* functions accept both
+    the raw content and a soup shared between them.
+
+    Args:
+        content (bytes | BeautifulSoup): The html content of the page.
+        parse_only (SoupStrainer): Build the tree only from the matching panels.
+    """
+    if isinstance(content, BeautifulSoup):
+        return content
+    return BeautifulSoup(content, PARSER, parse_only=parse_only)
+
+def label_values(panel):
+    """Map every `<strong>label</strong>` in the panel to the `<span>` holding its value.
+
+    NRSR pages render fields as a label followed by a value span. Collecting them in one
+    pass replaces a separate `find('strong', text=...)` scan per field. The first occurrence
+    of a label wins.
+    """
+    values = {}
+    for strong in panel.find_all('strong'):
+        if strong.string is None:
+            continue
+        label = strong.string.strip()
+        if label not in values:
+            values[label] = strong.find_next('span')
+    return values
@@ -0,0 +1,137 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from scrape import metrics
+from scrape.ratelimit import HostRateLimiter
+from scrape.voting import _fetch_voting, build_voting_record, voting_url
+
+_DONE = object()
+
+def _parse_voting(voting_id, content):
+    """Runs in a parser process - only plain bytes go in, a plain dict and the parse time come out."""
+    started = time.perf_counter()
+    record = build_voting_record(voting_id, content, logging.getLogger(__name__))
+    return record, time.perf_counter() - started
+
+def _fetch_worker(pending, pending_lock, limiter, pages, window, in_window, logger):
+    try:
+        while True:
+            with pending_lock:
+                item = next(pending, None)
+            if item is None:
+                break
+            seq, voting_id = item
+            # a voting stuck in retries must not let the others run ahead without bound
+            with window:
+                window.wait_for(lambda: in_window(seq))
+            try:
+                limiter.bucket(voting_url(voting_id)).acquire_blocking()
+                logger.info(f"Scraping data for voting ID {voting_id}")
+                content, failed = _fetch_voting(voting_id, logger)
+            except Exception as e:
+                # the seq has to reach the writer, otherwise it waits for it forever
+                logger.error(f"Fetching voting ID {voting_id} failed: {e}")
+                content, failed = None, True
+            # blocks while the queue is full - fetching waits for the parsers
+            pages.put((seq, voting_id, content, failed))
+    finally:
+        pages.put(_DONE)
+
+def scrape_votings_pipelined(voting_ids, emit, failed, logger, fetch_workers: int = 8, parse_workers: int | None = None, rate: float = 10.0, queue_size: int = 64):
+    """Fetch votings in threads and parse them in a process pool.
+
+    Fetch threads put raw pages on a bounded queue, the pages are parsed by a
+    `ProcessPoolExecutor` (parsing holds the GIL, so threads alone stop scaling at one
+    core). Both the queue and the number of pages handed to the parsers are bounded,
+    so memory stays flat; no voting is fetched more than `queue_size` positions ahead of
+    the oldest one not yet emitted. Finished votings are passed to `emit` in the order of `voting_ids`.
+
+    Args:
+        voting_ids (Iterable[int]): The voting IDs.
+        emit (Callable): Called with (voting_id, record) for every parsed voting.
+        failed (list): IDs of votings whose request or parsing failed are appended here.
+        logger (Logger): The logger object.
+        fetch_workers (int): Number of fetching threads.
+        parse_workers (int): Number of parser processes, defaults to the number of CPUs.
+        rate (float): Maximum number of requests per second per host.
+        queue_size (int): Maximum number of fetched pages waiting for a parser, and of
+            finished votings waiting for an earlier one.
+    """
+    parse_workers = parse_workers or os.cpu_count() or 1
+    pages = queue.Queue(maxsize=queue_size)
+    pending = enumerate(voting_ids)
+    pending_lock = threading.Lock()
+    limiter = HostRateLimiter(rate)
+
+    finished = {}
+    next_seq = 0
+    window = threading.Condition()
+
+    def in_window(seq):
+        return seq - next_seq <= queue_size
+
+    def flush():
+        nonlocal next_seq
+        start = next_seq
+        while next_seq in finished:
+            voting_id, record, voting_failed = finished.pop(next_seq)
+            if record:
+                emit(voting_id, record)
+            elif voting_failed:
+                failed.append(voting_id)
+            next_seq += 1
+        if next_seq != start:
+            with window:
+                window.notify_all()
+
+    def collect(parsing, timeout=None):
+        done, _ = wait(parsing, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            seq, voting_id = parsing.pop(future)
+            record, seconds = future.result()
+            metrics.observe('parse_seconds', seconds, stage='voting')
+            finished[seq] = (voting_id, record, record is None)
+        flush()
+
+    fetchers = [
+        threading.Thread(target=_fetch_worker, args=(pending, pending_lock, limiter, pages, window, in_window, logger), daemon=True)
+        for _ in range(fetch_workers)
+    ]
+    for fetcher in fetchers:
+        fetcher.start()
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as executor:
+        parsing = {}
+        running = fetch_workers
+        while running:
+            try:
+                # never block on the queue while a parse is running - the fetchers may all
+                # wait for it to move the window
+                item = pages.get(timeout=0.05) if parsing else pages.get()
+            except queue.Empty:
+                collect(parsing, timeout=0.05)
+                continue
+            if item is _DONE:
+                running -= 1
+                continue
+            seq, voting_id, content, voting_failed = item
+            if content is None:
+                finished[seq] = (voting_id, None, voting_failed)
+            else:
+                parsing[executor.submit(_parse_voting, voting_id, content)] = (seq, voting_id)
+            # backpressure - at most two pages per parser are in flight
+            while len(parsing) >= 2 * parse_workers:
+                collect(parsing)
+            if parsing:
+                collect(parsing, timeout=0)
+            else:
+                flush()
+        while parsing:
+            collect(parsing)
+
+    for fetcher in fetchers:
+        fetcher.join()
+    flush()
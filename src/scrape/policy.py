@@ -0,0 +1,188 @@
+import random
+import threading
+import time
+
+# Responses worth retrying - throttling and server side errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class AimdLimiter:
+    """Adaptive limit of requests in flight (additive increase, multiplicative decrease).
+
+    Every healthy response (no error, latency under `latency_target`) raises the limit by
+    1/limit, i.e. by one per round of requests; an error or a slow response cuts it by
+    `backoff`, at most once per `latency_target` seconds so one burst of errors does not
+    collapse it to the minimum.
+
+    Args:
+        max_limit (int): The upper bound, e.g. the number of fetching threads.
+        min_limit (int): The lower bound.
+        initial (int): The starting limit, defaults to a quarter of `max_limit`.
+        latency_target (float): Responses slower than this many seconds count as congestion.
+        backoff (float): The factor the limit is multiplied with on congestion.
+    """
+    def __init__(self, max_limit: int = 16, min_limit: int = 1, initial: int | None = None, latency_target: float = 2.0, backoff: float = 0.5):
+        self.max_limit = max(max_limit, min_limit)
+        self.min_limit = min_limit
+        self.limit = float(initial if initial is not None else max(min_limit, self.max_limit // 4))
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self._in_flight = 0
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, ok: bool, latency: float):
+        with self._cond:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if ok and latency <= self.latency_target:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif now - self._last_cut > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_cut = now
+            self._cond.notify_all()
+
+    def cancel(self):
+        """Free the slot of a request which ended without a response to judge (e.g. an unexpected error)."""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+class CircuitBreaker:
+    """Pause all requests while the site is down.
+
+    After `failure_threshold` failed requests in a row the breaker opens and every request
+    waits. Once `reset_timeout` passes a single probe request is let through (half-open):
+    its success closes the breaker, its failure opens it again for twice as long
+    (up to `max_timeout`).
+
+    Args:
+        failure_threshold (int): Number of consecutive failures opening the breaker.
+        reset_timeout (float): Seconds the breaker stays open before the probe.
+        max_timeout (float): Upper bound of the doubled open time.
+    """
+    def __init__(self, failure_threshold: int = 10, reset_timeout: float = 30.0, max_timeout: float = 600.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_timeout = max_timeout
+        self._timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._cond = threading.Condition()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def wait(self, logger):
+        """Block while the breaker is open; returns once the caller may send its request.
+
+        Returns:
+            bool: True if the request is the half-open probe - it has to end with
+                `record_success`, `record_failure` or `cancel_probe`.
+        """
+        with self._cond:
+            while self._opened_at is not None:
+                remaining = self._opened_at + self._timeout - time.monotonic()
+                if remaining <= 0 and not self._probing:
+                    logger.info("Circuit breaker half-open - sending a probe request")
+                    self._probing = True
+                    return True
+                self._cond.wait(timeout=remaining if remaining > 0 else None)
+            return False
+
+    def cancel_probe(self):
+        """The probe ended without a response to judge (e.g. an unexpected error) - the next request probes again."""
+        with self._cond:
+            self._probing = False
+            self._cond.notify_all()
+
+    def record_success(self):
+        with self._cond:
+            if self._opened_at is not None:
+                self._timeout = self.reset_timeout
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+            self._cond.notify_all()
+
+    def record_failure(self, logger):
+        with self._cond:
+            self._failures += 1
+            if self._probing:
+                self._probing = False
+                self._timeout = min(self.max_timeout, self._timeout * 2)
+                self._opened_at = time.monotonic()
+                logger.warning(f"Probe request failed - pausing requests for {self._timeout:.0f}s")
+            elif self._opened_at is None and self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                logger.warning(f"{self._failures} failed requests in a row - pausing requests for {self._timeout:.0f}s")
+            self._cond.notify_all()
+
+class FetchPolicy:
+    """Retry, backoff, adaptive concurrency and circuit breaking shared by all requests.
+
+    Retryable failures (timeouts, connection errors, `RETRY_STATUSES`) are retried up to
+    `retries` times after a full-jitter exponential backoff (`Retry-After` is honoured).
+    URLs which still fail are kept in `dead_letters` with the last error.
+
+    Args:
+        retries (int): Number of retries after the first attempt, 0 disables retrying.
+        base_delay (float): The backoff of the first retry in seconds.
+        max_delay (float): Upper bound of a single backoff.
+        limiter (AimdLimiter): The adaptive concurrency limit.
+        breaker (CircuitBreaker): The circuit breaker.
+        stage_limiters (dict[str, AimdLimiter]): Own limits of page kinds (see `cache.page_kind`),
+            e.g. the member pages fetched by the prefetch workers; other kinds share `limiter`.
+    """
+    def __init__(self, retries: int = 3, base_delay: float = 0.5, max_delay: float = 30.0, limiter: AimdLimiter | None = None, breaker: CircuitBreaker | None = None, stage_limiters: dict | None = None):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = limiter or AimdLimiter()
+        self.stage_limiters = stage_limiters or {}
+        self.breaker = breaker or CircuitBreaker()
+        self.dead_letters = {}
+        self._lock = threading.Lock()
+
+    def limiter_for(self, kind: str) -> AimdLimiter:
+        return self.stage_limiters.get(kind, self.limiter)
+
+    def backoff(self, attempt: int, retry_after: str | None = None):
+        """Seconds to wait before the retry number `attempt` (from 0)."""
+        if retry_after and retry_after.isdigit():
+            return min(self.max_delay, float(retry_after))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def add_dead_letter(self, url, reason):
+        with self._lock:
+            self.dead_letters[url] = reason
+
+    def remove_dead_letter(self, url):
+        with self._lock:
+            self.dead_letters.pop(url, None)
+
+def redrive(items, attempt, logger):
+    """Retry failed items once more after the main pass, e.g. when the site is back up.
+
+    Args:
+        items (Iterable): The failed items.
+        attempt (Callable): Called with each item, returns True on success.
+        logger (Logger): The logger object.
+
+    Returns:
+        list: The items which failed again.
+    """
+    items = list(items)
+    if items:
+        logger.info(f"Re-driving {len(items)} failed items...")
+    still_failed = [item for item in items if not attempt(item)]
+    if items:
+        logger.info(f"Re-drive recovered {len(items) - len(still_failed)} of {len(items)} items")
+    return still_failed
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+class TokenBucket:
+    """Token bucket limiting the number of requests per second.
+
+    Args:
+        rate (float): Tokens added per second, i.e. the sustained request rate.
+        capacity (float): Maximum number of tokens, i.e. the allowed burst. Defaults to `rate`.
+    """
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take one token and return the number of seconds the caller has to wait for it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+class HostRateLimiter:
+    """Keeps one token bucket per host so that every site gets its own budget.
+    """
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.capacity)
+            return self._buckets[host]
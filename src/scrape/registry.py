@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+import time
+
+class DocumentRegistry:
+    """Append-only registry of parsed parliamentary press (CPT) details keyed by CPT number.
+
+    Every line of the JSONL file is `{"cislo_parlamentna_tlac": ..., "scraped_at": <unix time>,
+    "details": <parse_document_details record>}`. The index (CPT number -> latest record) is
+    loaded once when the registry is opened; a re-scraped CPT is appended and the last line
+    wins. Without a path the registry is kept in memory only.
+
+    Args:
+        path (str | None): The JSONL file, created if missing.
+        max_age (float | None): Records older than this many seconds are treated as missing
+            and re-scraped, None = never.
+    """
+    def __init__(self, path: str | None = None, max_age: float | None = None):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._index = {}
+        self._file = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                self._load()
+            self._file = open(path, 'a', encoding='utf-8')
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line of a crashed run may be cut in half
+                    continue
+                self._index[record['cislo_parlamentna_tlac']] = record
+
+    def get(self, cislo_parlamentna_tlac):
+        """The parsed details of the CPT, None if it is not registered (or too old)."""
+        record = self._index.get(cislo_parlamentna_tlac)
+        if record is None:
+            return None
+        if self.max_age is not None and time.time() - record['scraped_at'] > self.max_age:
+            return None
+        return record['details']
+
+    def put(self, cislo_parlamentna_tlac, details):
+        record = {'cislo_parlamentna_tlac': cislo_parlamentna_tlac, 'scraped_at': time.time(), 'details': details}
+        with self._lock:
+            self._index[cislo_parlamentna_tlac] = record
+            if self._file is not None:
+                self._file.write(json.dumps(record, ensure_ascii=False))
+                self._file.write('\n')
+                self._file.flush()
+
+    def __contains__(self, cislo_parlamentna_tlac):
+        return self.get(cislo_parlamentna_tlac) is not None
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
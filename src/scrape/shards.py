@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from scrape.jsonl import iter_votings, write_votings
+from scrape.voting import failed_ids_file, scrape_voting_data
+
+DEFAULT_SHARD_SIZE = 500
+DEFAULT_LEASE_SECONDS = 300.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shards (
+    shard_id INTEGER PRIMARY KEY,
+    start_id INTEGER NOT NULL,
+    end_id INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    output TEXT,
+    UNIQUE (start_id, end_id)
+);
+CREATE INDEX IF NOT EXISTS shards_status ON shards (status, shard_id);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+def worker_name():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class WorkQueue:
+    """Shared queue of voting ID shards in a SQLite file.
+
+    A shard is `pending`, `leased` by one worker until `lease_until`, or `done` with the
+    path of its output. Workers extend their lease by heartbeats; a lease which expires
+    (the worker died or hangs) is re-queued by the next `lease` call, and a late worker
+    can no longer complete the shard. Every state change is one transaction, so any
+    number of worker processes can share the file - on several machines it has to be on
+    a filesystem with working locks (not NFS).
+
+    Args:
+        path (str): The SQLite file, created if missing.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+
+    def _transaction(self, function):
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                result = function(self._db)
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+            self._db.execute('COMMIT')
+            return result
+
+    def create_shards(self, id_start: int, id_end: int, shard_size: int = DEFAULT_SHARD_SIZE, scrape_type: str = 'voting'):
+        """Split the ID range (both ends included) into shards; existing shards are kept.
+
+        Returns:
+            int: Number of new shards.
+        """
+        def create(db):
+            db.execute("INSERT OR REPLACE INTO meta VALUES ('type', ?)", (scrape_type,))
+            before = db.execute('SELECT COUNT(*) FROM shards').fetchone()[0]
+            db.executemany(
+                'INSERT OR IGNORE INTO shards (start_id, end_id) VALUES (?, ?)',
+                [(start, min(start + shard_size - 1, id_end)) for start in range(id_start, id_end + 1, shard_size)]
+            )
+            return db.execute('SELECT COUNT(*) FROM shards').fetchone()[0] - before
+        return self._transaction(create)
+
+    @property
+    def scrape_type(self):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'type'").fetchone()
+        return row[0] if row else 'voting'
+
+    def lease(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """Lease the next pending shard, expired leases are re-queued first.
+
+        Returns:
+            tuple | None: (shard_id, start_id, end_id), None when no shard is pending.
+        """
+        def lease(db):
+            now = time.time()
+            db.execute("UPDATE shards SET status = 'pending', worker = NULL WHERE status = 'leased' AND lease_until < ?", (now,))
+            row = db.execute("SELECT shard_id, start_id, end_id FROM shards WHERE status = 'pending' ORDER BY shard_id LIMIT 1").fetchone()
+            if row:
+                db.execute(
+                    "UPDATE shards SET status = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE shard_id = ?",
+                    (worker, now + lease_seconds, row[0])
+                )
+            return row
+        return self._transaction(lease)
+
+    def heartbeat(self, shard_id: int, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        """Extend the lease; False if the worker lost it (it expired and was re-queued)."""
+        def heartbeat(db):
+            return db.execute(
+                "UPDATE shards SET lease_until = ? WHERE shard_id = ? AND worker = ? AND status = 'leased'",
+                (time.time() + lease_seconds, shard_id, worker)
+            ).rowcount == 1
+        return self._transaction(heartbeat)
+
+    def complete(self, shard_id: int, worker: str, output: str):
+        """Mark the shard done with its output; False if the worker lost the lease."""
+        def complete(db):
+            return db.execute(
+                "UPDATE shards SET status = 'done', output = ?, lease_until = NULL WHERE shard_id = ? AND worker = ? AND status = 'leased'",
+                (output, shard_id, worker)
+            ).rowcount == 1
+        return self._transaction(complete)
+
+    def release(self, shard_id: int, worker: str):
+        """Give the shard back to the queue, e.g. after an error."""
+        def release(db):
+            db.execute("UPDATE shards SET status = 'pending', worker = NULL, lease_until = NULL WHERE shard_id = ? AND worker = ? AND status = 'leased'", (shard_id, worker))
+        self._transaction(release)
+
+    def status(self):
+        """Number of shards per status."""
+        with self._lock:
+            return dict(self._db.execute('SELECT status, COUNT(*) FROM shards GROUP BY status').fetchall())
+
+    def done_shards(self):
+        """(start_id, end_id, output) of the finished shards ordered by start ID."""
+        with self._lock:
+            return self._db.execute("SELECT start_id, end_id, output FROM shards WHERE status = 'done' ORDER BY start_id").fetchall()
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _heartbeat(work_queue, shard_id, worker, lease_seconds, stop, logger):
+    while not stop.wait(lease_seconds / 3):
+        if not work_queue.heartbeat(shard_id, worker, lease_seconds):
+            logger.warning(f"Lease of shard {shard_id} was lost - its output will be ignored")
+            return
+
+def run_worker(queue_path: str, shard_dir: str, scrape_shard=None, logger=None, worker: str | None = None, lease_seconds: float = DEFAULT_LEASE_SECONDS, **scrape_kwargs):
+    """Lease and scrape shards until the queue is empty.
+
+    Every shard is saved to its own JSONL file in `shard_dir` (named by the range and the
+    worker, so a re-queued shard never overwrites the output of another worker) together
+    with its failed IDs file.
+
+    Args:
+        queue_path (str): The SQLite file of the `WorkQueue`.
+        shard_dir (str): The directory of the shard outputs.
+        scrape_shard (Callable): Called as `scrape_shard(start_id, end_id, save_to_file, logger=logger, **scrape_kwargs)`,
+            `scrape_voting_data` by default.
+        logger (Logger): The logger object.
+        worker (str): The worker name, host and PID by default.
+        lease_seconds (float): The lease duration, extended every third of it while the shard runs.
+        scrape_kwargs: Passed to `scrape_shard`.
+
+    Returns:
+        int: Number of shards completed by this worker.
+    """
+    logger = logger or logging.getLogger(__name__)
+    scrape_shard = scrape_shard or scrape_voting_data
+    worker = worker or worker_name()
+    os.makedirs(shard_dir, exist_ok=True)
+    completed = 0
+    with WorkQueue(queue_path) as work_queue:
+        while (shard := work_queue.lease(worker, lease_seconds)) is not None:
+            shard_id, start_id, end_id = shard
+            output = os.path.join(shard_dir, f"shard_{start_id}-{end_id}.{worker}.jsonl")
+            logger.info(f"Worker {worker} scraping shard {shard_id} ({start_id}-{end_id})")
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=_heartbeat, args=(work_queue, shard_id, worker, lease_seconds, stop, logger), daemon=True)
+            heartbeat.start()
+            try:
+                scrape_shard(start_id, end_id, output, logger=logger, **scrape_kwargs)
+            except Exception:
+                work_queue.release(shard_id, worker)
+                raise
+            finally:
+                stop.set()
+                heartbeat.join()
+            if work_queue.complete(shard_id, worker, output):
+                completed += 1
+            else:
+                logger.warning(f"Shard {shard_id} was re-queued meanwhile - output {output} discarded")
+    logger.info(f"Worker {worker} finished - {completed} shards completed")
+    return completed
+
+def merge_shards(queue_path: str, save_to_file: str, logger=None):
+    """Combine the shard outputs into one dataset ordered by voting ID.
+
+    The result is the same as of one `scrape_voting_data` run over the whole range - with
+    the failed IDs of all shards in the failed IDs file of `save_to_file`.
+
+    Raises:
+        RuntimeError: If some shards are not done yet.
+
+    Returns:
+        dict | JsonlVotings | ParquetVotings: The saved data - a dict for JSON, a lazy view otherwise.
+    """
+    logger = logger or logging.getLogger(__name__)
+    with WorkQueue(queue_path) as work_queue:
+        status = work_queue.status()
+        shards = work_queue.done_shards()
+    unfinished = sum(count for state, count in status.items() if state != 'done')
+    if unfinished:
+        raise RuntimeError(f"{unfinished} shards are not done yet: {status}")
+
+    failed = []
+    for _, _, output in shards:
+        if os.path.exists(failed_ids_file(output)):
+            with open(failed_ids_file(output), 'r', encoding='utf-8') as f:
+                failed.extend(json.load(f))
+
+    def votings():
+        # shards are disjoint ranges, sorting each of them orders the whole dataset
+        # (also shard files written before the re-driven votings were put back in order)
+        for _, _, output in shards:
+            yield from sorted(iter_votings(output), key=lambda item: int(item[0]))
+
+    data = write_votings(votings(), save_to_file)
+    if failed:
+        with open(failed_ids_file(save_to_file), 'w', encoding='utf-8') as f:
+            json.dump(sorted(failed), f)
+    logger.info(f"Merged {len(shards)} shards into {save_to_file} ({len(failed)} failed votings)")
+    return data
@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+from scrape.document import DocumentIndex, add_documents
+from scrape.jsonl import write_votings
+from scrape.member import DEFAULT_MEMBER_WORKERS, add_member_info, collect_member_info, members_file, merge_members, prefetch_members
+from scrape.registry import DocumentRegistry
+from scrape.voting import scrape_voting_data
+
+_DONE = object()
+
+def _document_step(registry, logger):
+    document_index = DocumentIndex(logger)
+    return lambda voting: add_documents(voting, document_index, registry, logger)
+
+def _member_step(member_cache, normalized, workers, logger):
+    add = collect_member_info if normalized else add_member_info
+
+    def step(voting):
+        # members not seen yet (all of them for the first voting) are fetched concurrently
+        missing = {vote['poslanec_id'] for vote in voting['hlasovanie']} - member_cache.keys()
+        if missing:
+            member_cache.update(prefetch_members(missing, logger, workers))
+        return add(voting, member_cache, logger)
+    return step
+
+def _run_stage(step, source, target, errors):
+    """Apply `step` to every voting from `source` and pass it on to `target`.
+
+    After an error the rest of `source` is drained, so the stages before it do not block
+    on a full queue.
+    """
+    try:
+        while (item := source.get()) is not _DONE:
+            if errors:
+                continue
+            voting_id, voting = item
+            target.put((voting_id, step(voting)))
+    except BaseException as e:
+        errors.append(e)
+        while source.get() is not _DONE:
+            pass
+    finally:
+        target.put(_DONE)
+
+def _drain(source, errors):
+    while (item := source.get()) is not _DONE:
+        yield item
+    # a failed run must not replace the saved data with a partial one
+    if errors:
+        raise errors[0]
+
+def scrape_enriched_voting_data(id_start: int, id_end: int, save_to_file: str, document: bool = True, member: bool = True, registry=None, normalized: bool = False, members_to_file=None, logger=None, member_workers: int = DEFAULT_MEMBER_WORKERS, queue_size: int = 64, fsync_every: int = 100, **scrape_kwargs):
+    """Scrape the votings and add the documents and member info in one streaming pass.
+
+    Every voting flows through the stages as soon as it is parsed: the voting scrape, the
+    document and the member enrichment run in their own threads connected by bounded
+    queues, and the result is written once at the end of the chain. The stages overlap,
+    so the run takes about as long as the slowest stage instead of the sum of all of them;
+    each stage handles the votings one by one, which keeps the voting ID order.
+    The overlap needs a request budget of every stage - the document and member pages should
+    have their own limiters in the fetch policy (`FetchPolicy.stage_limiters`), as `main.py` sets up.
+
+    Args:
+        id_start (int): The first voting ID.
+        id_end (int): The last voting ID.
+        save_to_file (str): The JSON/JSONL file or the Parquet dataset to save the data to.
+        document (bool): Add the parliamentary press (CPT) details.
+        member (bool): Add the member info.
+        registry (DocumentRegistry): The registry of parsed CPT details, in-memory if None.
+        normalized (bool): Save the member info to the side table instead of each vote
+            (see `add_member_info_to_voting_data`).
+        members_to_file (str): The side table of the normalized mode, by default `members_file(save_to_file)`.
+        logger (Logger): The logger object.
+        member_workers (int): Number of members fetched concurrently.
+        queue_size (int): Maximum number of votings waiting between two stages.
+        fsync_every (int): Number of JSONL records between two fsync calls.
+        scrape_kwargs: Passed to `scrape_voting_data` (concurrency, rate, voting_ids...).
+
+    Returns:
+        dict | JsonlVotings | ParquetVotings: The saved data - a dict for JSON, a lazy view otherwise.
+    """
+    logger = logger or logging.getLogger(__name__)
+    registry = registry if registry is not None else DocumentRegistry()
+    members_to_file = members_to_file or members_file(save_to_file)
+    member_cache = {}
+
+    steps = []
+    if document:
+        steps.append(_document_step(registry, logger))
+    if member:
+        steps.append(_member_step(member_cache, normalized, member_workers, logger))
+
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(steps) + 1)]
+    errors = []
+
+    def produce():
+        try:
+            scrape_voting_data(id_start, id_end, save_to_file, logger=logger, on_voting=lambda voting_id, voting: queues[0].put((voting_id, voting)), **scrape_kwargs)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            queues[0].put(_DONE)
+
+    threads = [threading.Thread(target=produce, daemon=True)]
+    threads += [threading.Thread(target=_run_stage, args=(step, source, target, errors), daemon=True) for step, source, target in zip(steps, queues, queues[1:])]
+    for thread in threads:
+        thread.start()
+
+    data = write_votings(_drain(queues[-1], errors), save_to_file, fsync_every=fsync_every)
+    for thread in threads:
+        thread.join()
+
+    if member and normalized:
+        merge_members(member_cache, members_to_file, logger)
+    logger.info(f"Scraping completed. Data saved to {save_to_file}")
+    return data
@@ -0,0 +1,337 @@
+"""Indexed SQLite store of votings, votes, members, memberships and CPT documents.
+
+A store is a single file (`*.sqlite` or `*.db`) usable wherever a JSON/JSONL file or a
+Parquet dataset is - writes are upserts keyed by the voting ID, `poslanec_id` and
+`cislo_parlamentna_tlac`, so a stage updates only the rows it touches instead of
+rewriting the whole dataset. Tables:
+
+- `votings` - one row per voting, indexed by meeting and voting number and by date;
+  `cislo_parlamentna_tlac` is NULL until the documents are added ('' = no document)
+- `votes` - one row per member vote, indexed by `poslanec_id`
+- `members` and `memberships` - bio and memberships of each member
+- `documents` - the parliamentary press (CPT) details
+"""
+import json
+import os
+import sqlite3
+from datetime import datetime
+from scrape import metrics
+from scrape.columnar import DOCUMENT_FIELDS, INT_FIELDS, MEMBER_FIELDS, STR_FIELDS, to_int, to_str
+
+BATCH_SIZE = 1000
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS votings (
+    voting_id INTEGER PRIMARY KEY,
+    {', '.join(f'{field} TEXT' for field in STR_FIELDS)},
+    datum TEXT,
+    cislo_schodze INTEGER,
+    cislo_hlasovania INTEGER,
+    {', '.join(f'{field} INTEGER' for field in INT_FIELDS)},
+    cislo_parlamentna_tlac TEXT,
+    member_info INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS votings_meeting ON votings (cislo_schodze, cislo_hlasovania);
+CREATE INDEX IF NOT EXISTS votings_datum ON votings (datum);
+CREATE TABLE IF NOT EXISTS votes (
+    voting_id INTEGER NOT NULL,
+    poradie INTEGER NOT NULL,
+    poslanec_id INTEGER,
+    hlas_id TEXT,
+    poslanec_meno TEXT,
+    hlasovanie_klub TEXT,
+    PRIMARY KEY (voting_id, poradie)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS votes_member ON votes (poslanec_id, voting_id);
+CREATE TABLE IF NOT EXISTS members (
+    poslanec_id INTEGER PRIMARY KEY,
+    {', '.join(f'{field} TEXT' for field in MEMBER_FIELDS)}
+);
+CREATE TABLE IF NOT EXISTS memberships (
+    poslanec_id INTEGER NOT NULL,
+    poradie INTEGER NOT NULL,
+    clenstvo TEXT,
+    PRIMARY KEY (poslanec_id, poradie)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS documents (
+    {' TEXT, '.join(DOCUMENT_FIELDS)} TEXT,
+    dokumenty_parlamentna_tlac TEXT,
+    PRIMARY KEY (cislo_parlamentna_tlac)
+);
+"""
+
+VOTING_COLUMNS = ['voting_id'] + STR_FIELDS + ['datum', 'cislo_schodze', 'cislo_hlasovania'] + INT_FIELDS + ['cislo_parlamentna_tlac', 'member_info']
+DOCUMENT_COLUMNS = DOCUMENT_FIELDS + ['dokumenty_parlamentna_tlac']
+
+def is_sqlite(path):
+    return isinstance(path, str) and path.endswith(('.sqlite', '.db'))
+
+def connect(path):
+    """Open the store, the tables are created if missing."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=60)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.executescript(SCHEMA)
+    return db
+
+def _upsert(table, columns, key, keep=()):
+    """INSERT ... ON CONFLICT DO UPDATE; the `keep` columns are not overwritten with NULL."""
+    updates = [f"{column} = COALESCE(excluded.{column}, {table}.{column})" if column in keep else f"{column} = excluded.{column}" for column in columns if column != key]
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) ON CONFLICT ({key}) DO UPDATE SET {', '.join(updates)}"
+
+UPSERT_VOTING = _upsert('votings', VOTING_COLUMNS, 'voting_id', keep=['cislo_parlamentna_tlac']).replace(
+    'member_info = excluded.member_info', 'member_info = MAX(excluded.member_info, votings.member_info)'
+)
+UPSERT_MEMBER = _upsert('members', ['poslanec_id'] + MEMBER_FIELDS, 'poslanec_id')
+UPSERT_DOCUMENT = _upsert('documents', DOCUMENT_COLUMNS, 'cislo_parlamentna_tlac')
+
+def _datum(cas_hlasovania):
+    """'12. 3. 2024 10:05' -> '2024-03-12 10:05', sortable and indexed."""
+    try:
+        return datetime.strptime(cas_hlasovania, '%d. %m. %Y %H:%M').strftime('%Y-%m-%d %H:%M')
+    except (TypeError, ValueError):
+        return None
+
+def _upsert_member(db, member_id, info, memberships):
+    db.execute(UPSERT_MEMBER, [to_int(member_id)] + [info.get(field) for field in MEMBER_FIELDS])
+    db.execute('DELETE FROM memberships WHERE poslanec_id = ?', (to_int(member_id),))
+    db.executemany('INSERT INTO memberships VALUES (?, ?, ?)', [(to_int(member_id), i, clenstvo) for i, clenstvo in enumerate(memberships)])
+
+def _upsert_document(db, document):
+    db.execute(UPSERT_DOCUMENT, [document.get(field) for field in DOCUMENT_FIELDS] + [json.dumps(document.get('dokumenty_parlamentna_tlac', []), ensure_ascii=False)])
+
+class SqliteVotingWriter:
+    """Upsert votings into the store, committed every `batch_size` votings.
+
+    Has the same `write(voting_id, voting)`/`close()` interface as `JsonlWriter`. The votes
+    of a written voting replace its previous votes; the member info and documents found
+    in the votings are upserted into their tables.
+
+    Args:
+        path (str): The store file, created if missing.
+        batch_size (int): Number of votings per transaction.
+    """
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.count = 0
+        self._db = connect(path)
+        self._members = set()
+
+    def write(self, voting_id, voting):
+        with metrics.timer('write_seconds', format='sqlite'):
+            self._write(int(voting_id), voting)
+            self.count += 1
+            if self.count % self.batch_size == 0:
+                self._db.commit()
+
+    def _write(self, voting_id, voting):
+        votes = voting.get('hlasovanie', [])
+        member_info = any('poslanec_bio' in vote for vote in votes)
+        document = voting.get('parlamentna_tlac')
+        if document:
+            _upsert_document(self._db, document)
+        cislo_parlamentna_tlac = None if document is None else (document['cislo_parlamentna_tlac'] if document else '')
+
+        self._db.execute(UPSERT_VOTING, (
+            voting_id,
+            *(voting.get(field) for field in STR_FIELDS),
+            _datum(voting.get('cas_hlasovania')),
+            to_int(voting.get('cislo_schodze')),
+            to_int(voting.get('cislo_hlasovania')),
+            *(to_int(voting.get(field)) for field in INT_FIELDS),
+            cislo_parlamentna_tlac,
+            int(member_info),
+        ))
+        self._db.execute('DELETE FROM votes WHERE voting_id = ?', (voting_id,))
+        self._db.executemany('INSERT INTO votes VALUES (?, ?, ?, ?, ?, ?)', [
+            (voting_id, i, to_int(vote.get('poslanec_id')), vote.get('hlas_id'), vote.get('poslanec_meno'), vote.get('hlasovanie_klub'))
+            for i, vote in enumerate(votes)
+        ])
+        for vote in votes:
+            if vote.get('poslanec_bio') and vote['poslanec_id'] not in self._members:
+                self._members.add(vote['poslanec_id'])
+                _upsert_member(self._db, vote['poslanec_id'], vote['poslanec_bio'], vote.get('poslanec_clenstvo', []))
+
+    def close(self):
+        if self._db is not None:
+            self._db.commit()
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _read_members(db):
+    members = {str(row[0]): {'info': dict(zip(MEMBER_FIELDS, row[1:])), 'clenstvo': []} for row in db.execute(f"SELECT poslanec_id, {', '.join(MEMBER_FIELDS)} FROM members")}
+    for member_id, clenstvo in db.execute('SELECT poslanec_id, clenstvo FROM memberships ORDER BY poslanec_id, poradie'):
+        if str(member_id) in members:
+            members[str(member_id)]['clenstvo'].append(clenstvo)
+    return members
+
+def _document(row):
+    document = dict(zip(DOCUMENT_COLUMNS, row))
+    document['dokumenty_parlamentna_tlac'] = json.loads(document['dokumenty_parlamentna_tlac'] or '[]')
+    return document
+
+def iter_sqlite_votings(path):
+    """Yield (voting_id, voting) pairs in the nested JSON shape, ordered by voting ID.
+
+    The votings are read one by one, only the members and documents are loaded up front.
+    """
+    db = connect(path)
+    try:
+        members = None
+        documents = {row[0]: _document(row) for row in db.execute(f"SELECT {', '.join(DOCUMENT_COLUMNS)} FROM documents")}
+        votes_cursor = db.cursor()
+        for row in db.execute(f"SELECT {', '.join(VOTING_COLUMNS)} FROM votings ORDER BY voting_id"):
+            voting = dict(zip(VOTING_COLUMNS, row))
+            record = {field: voting[field] for field in STR_FIELDS[:2]}
+            record['cislo_schodze'] = to_str(voting['cislo_schodze'])
+            record['cislo_hlasovania'] = to_str(voting['cislo_hlasovania'])
+            record.update({field: voting[field] for field in STR_FIELDS[2:]})
+            record.update({field: to_str(voting[field]) for field in INT_FIELDS})
+            record['hlasovanie'] = []
+            if voting['member_info'] and members is None:
+                members = _read_members(db)
+            for hlas_id, poslanec_id, poslanec_meno, hlasovanie_klub in votes_cursor.execute(
+                'SELECT hlas_id, poslanec_id, poslanec_meno, hlasovanie_klub FROM votes WHERE voting_id = ? ORDER BY poradie', (voting['voting_id'],)
+            ):
+                vote = {'hlas_id': hlas_id, 'poslanec_id': to_str(poslanec_id), 'poslanec_meno': poslanec_meno, 'hlasovanie_klub': hlasovanie_klub}
+                if voting['member_info']:
+                    member = members.get(vote['poslanec_id'], {})
+                    vote['poslanec_bio'] = member.get('info', {})
+                    vote['poslanec_clenstvo'] = member.get('clenstvo', [])
+                record['hlasovanie'].append(vote)
+            if voting['cislo_parlamentna_tlac'] is not None:
+                record['parlamentna_tlac'] = documents.get(voting['cislo_parlamentna_tlac'], [])
+            yield str(voting['voting_id']), record
+    finally:
+        db.close()
+
+class SqliteVotings:
+    """Read-only dict-like view of the votings in a store."""
+    def __init__(self, path: str):
+        self.path = path
+
+    def items(self):
+        return iter_sqlite_votings(self.path)
+
+    def values(self):
+        return (voting for _, voting in iter_sqlite_votings(self.path))
+
+    def __iter__(self):
+        return (str(voting_id) for voting_id in voting_ids(self.path))
+
+    def __len__(self):
+        return _query(self.path, 'SELECT COUNT(*) FROM votings')[0][0]
+
+def _query(path, sql, parameters=()):
+    db = connect(path)
+    try:
+        return db.execute(sql, parameters).fetchall()
+    finally:
+        db.close()
+
+def voting_ids(path):
+    """IDs of the votings in the store, ascending."""
+    return [row[0] for row in _query(path, 'SELECT voting_id FROM votings ORDER BY voting_id')]
+
+def member_ids(path):
+    """Unique member IDs (str) of all votes - read from the `poslanec_id` index."""
+    return {str(row[0]) for row in _query(path, 'SELECT DISTINCT poslanec_id FROM votes WHERE poslanec_id IS NOT NULL')}
+
+def write_members(members, path):
+    """Upsert members (`{poslanec_id: {'info': {...}, 'clenstvo': [...]}}`) into the store."""
+    db = connect(path)
+    try:
+        with db:
+            for member_id, member in members.items():
+                _upsert_member(db, member_id, member['info'], member.get('clenstvo', []))
+    finally:
+        db.close()
+
+def read_members(path):
+    """The members of the store as `{poslanec_id: {'info': {...}, 'clenstvo': [...]}}`."""
+    db = connect(path)
+    try:
+        return _read_members(db)
+    finally:
+        db.close()
+
+def write_documents(documents, path):
+    """Upsert the CPT details and link them to their votings.
+
+    Args:
+        documents (Iterable[dict]): Rows of `scrape_voting_documents` - `cislo_schodze`,
+            `cislo_hlasovania`, `url_parlamentna_tlac` and the `get_document_details` fields.
+        path (str): The store file.
+    """
+    db = connect(path)
+    try:
+        with db:
+            for row in documents:
+                _upsert_document(db, {
+                    'cislo_parlamentna_tlac': row['cislo_parlamentna_tlac'],
+                    'url_parlamentna_tlac': row.get('url_parlamentna_tlac'),
+                    'typ_parlamentna_tlac': row.get('parlamentna_tlac_typ'),
+                    'cas_parlamentna_tlac': row.get('parlamentna_tlac_datum'),
+                    'nazov_parlamentna_tlac': row.get('parlamentna_tlac_nazov'),
+                    'dokumenty_parlamentna_tlac': row.get('parlamentna_tlac_dokumenty', []),
+                })
+                db.execute(
+                    'UPDATE votings SET cislo_parlamentna_tlac = ? WHERE cislo_schodze = ? AND cislo_hlasovania = ?',
+                    (row['cislo_parlamentna_tlac'], to_int(row['cislo_schodze']), to_int(row['cislo_hlasovania']))
+                )
+    finally:
+        db.close()
+
+def read_voting_documents(path):
+    """The CPT of every voting with a document, in the shape of `scrape_voting_documents` rows (one per meeting and voting number)."""
+    sql = (
+        'SELECT DISTINCT v.cas_hlasovania, v.cislo_schodze, v.cislo_hlasovania, d.cislo_parlamentna_tlac, d.url_parlamentna_tlac, '
+        'd.typ_parlamentna_tlac AS parlamentna_tlac_typ, d.cas_parlamentna_tlac AS parlamentna_tlac_datum, '
+        'd.nazov_parlamentna_tlac AS parlamentna_tlac_nazov, d.dokumenty_parlamentna_tlac AS parlamentna_tlac_dokumenty '
+        'FROM votings v JOIN documents d ON d.cislo_parlamentna_tlac = v.cislo_parlamentna_tlac ORDER BY v.cislo_schodze, v.cislo_hlasovania'
+    )
+    db = connect(path)
+    try:
+        cursor = db.execute(sql)
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor]
+    finally:
+        db.close()
+    for row in rows:
+        row['parlamentna_tlac_dokumenty'] = json.loads(row['parlamentna_tlac_dokumenty'] or '[]')
+    return rows
+
+def votes_of_member(path, poslanec_id, date_from: str | None = None, date_to: str | None = None):
+    """Votes of one member with their votings, e.g. `votes_of_member(store, 1001, '2024-01-01', '2025-01-01')`.
+
+    Args:
+        path (str): The store file.
+        poslanec_id (int | str): The member ID.
+        date_from (str | None): The first day (ISO date), included.
+        date_to (str | None): The end day (ISO date), excluded.
+
+    Returns:
+        list[dict]: The votes ordered by voting ID. Votings without a date (`datum` is NULL)
+            are included only when no date bound is given.
+    """
+    sql = (
+        'SELECT v.voting_id, v.datum, v.cislo_schodze, v.cislo_hlasovania, v.nazov_hlasovania, v.vysledok_hlasovania, '
+        't.hlas_id, t.hlasovanie_klub FROM votes t JOIN votings v ON v.voting_id = t.voting_id '
+        'WHERE t.poslanec_id = ? AND (? IS NULL OR v.datum >= ?) AND (? IS NULL OR v.datum < ?) ORDER BY v.voting_id'
+    )
+    db = connect(path)
+    try:
+        cursor = db.execute(sql, (to_int(poslanec_id), date_from, date_from, date_to, date_to))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+    finally:
+        db.close()
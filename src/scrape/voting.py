@@ -1,24 +1,43 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
 import json
 import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from scrape import client, metrics
+from scrape.columnar import ParquetVotingWriter, ParquetVotings, is_parquet
+from scrape.jsonl import JsonlVotings, JsonlWriter, is_jsonl, iter_jsonl, write_votings
+from scrape.page import make_soup, label_values
+from scrape.policy import redrive
+from scrape.store import SqliteVotingWriter, SqliteVotings, is_sqlite
+from scrape.ratelimit import HostRateLimiter
 
-def fetch_voting_content(voting_id, logger):
-    url = f"https://www.nrsr.sk/web/Default.aspx?sid=schodze/hlasovanie/hlasklub&ID={voting_id}"
-    response = requests.get(url)
+def failed_ids_file(save_to_file):
+    """The file next to the saved votings keeping IDs of votings which failed and have to be retried."""
+    # next to (not inside) a Parquet dataset directory, which is replaced on every write
+    return f"{save_to_file.rstrip('/')}.failed.json"
+
+def voting_url(voting_id):
+    return f"{client.SITE_URL}?sid=schodze/hlasovanie/hlasklub&ID={voting_id}"
+
+def _fetch_voting(voting_id, logger):
+    """Return (content, failed). Content is None for failed requests and nonexistent votings, failed is True only for the former."""
+    url = voting_url(voting_id)
+    response = client.get(url, logger)
     
-    if response.status_code != 200:
+    if response is None or response.status_code != 200:
         logger.error(f"Failed to fetch content for voting ID {voting_id}")
-        return None
+        return None, True
     if "unexpected error" in response.text:
         logger.info(f"Skipping {voting_id} - no such page")
-        return None
+        return None, False
   
-    return response.content
+    return response.content, False
+
+def fetch_voting_content(voting_id, logger):
+    return _fetch_voting(voting_id, logger)[0]
 
 def parse_voting_summary(content, logger):
-    soup = BeautifulSoup(content, 'html.parser')
+    soup = make_soup(content)
     summary_div = soup.find('div', class_='voting_stats_summary_panel')
     
     if not summary_div:
@@ -40,7 +59,7 @@ def parse_voting_summary(content, logger):
     return summary
 
 def parse_voting_stats(content, logger):
-    soup = BeautifulSoup(content, 'html.parser')
+    soup = make_soup(content)
     stats_div = soup.find('div', id="_sectionLayoutContainer_ctl01_ctl00__resultsTablePanel")
     
     if not stats_div:
@@ -50,25 +69,26 @@ def parse_voting_stats(content, logger):
     stats = {}
     
     try:
-        stats['pritomni'] = stats_div.find('strong', text='Prítomní').find_next('span').text.strip()
-        stats['hlasujucich'] = stats_div.find('strong', text='Hlasujúcich').find_next('span').text.strip()
-        stats['za_hlasovalo'] = stats_div.find('strong', text='[Z] Za hlasovalo').find_next('span').text.strip()
-        stats['proti_hlasovalo'] = stats_div.find('strong', text='[P] Proti hlasovalo').find_next('span').text.strip()
-        stats['zdrzalo_sa'] = stats_div.find('strong', text='[?] Zdržalo sa hlasovania').find_next('span').text.strip()
-        stats['nehlasovalo'] = stats_div.find('strong', text='[N] Nehlasovalo').find_next('span').text.strip()
-        stats['nepritomni'] = stats_div.find('strong', text='[0] Neprítomní').find_next('span').text.strip()
+        labels = label_values(stats_div)
+        stats['pritomni'] = labels['Prítomní'].text.strip()
+        stats['hlasujucich'] = labels['Hlasujúcich'].text.strip()
+        stats['za_hlasovalo'] = labels['[Z] Za hlasovalo'].text.strip()
+        stats['proti_hlasovalo'] = labels['[P] Proti hlasovalo'].text.strip()
+        stats['zdrzalo_sa'] = labels['[?] Zdržalo sa hlasovania'].text.strip()
+        stats['nehlasovalo'] = labels['[N] Nehlasovalo'].text.strip()
+        stats['nepritomni'] = labels['[0] Neprítomní'].text.strip()
         try:
-            stats['neplatne'] = stats_div.find('strong', text='[X] Neplatných hlasov').find_next('span').text.strip()
-        except AttributeError:
+            stats['neplatne'] = labels['[X] Neplatných hlasov'].text.strip()
+        except (AttributeError, KeyError):
             stats['neplatne'] = "0"
-    except AttributeError:
+    except (AttributeError, KeyError):
         logger.error("Error parsing voting stats")
         return None
     
     return stats
 
 def parse_voting_results(content, logger):
-    soup = BeautifulSoup(content, 'html.parser')
+    soup = make_soup(content)
     results_table = soup.find('table', id="_sectionLayoutContainer_ctl01__resultsTable")
     
     if not results_table:
@@ -105,40 +125,195 @@ def parse_voting_results(content, logger):
     
     return results
 
-def scrape_voting_data(id_start: int, id_end: int, save_to_file: str | None, logger = None):
+def build_voting_record(voting_id, content, logger):
+    """Parse the voting page and return the record stored under the voting ID (None if parsing fails).
+    """
+    content = make_soup(content)
+    summary = parse_voting_summary(content, logger)
+    stats = parse_voting_stats(content, logger)
+    results = parse_voting_results(content, logger)
+
+    if not (summary and stats and results):
+        return None
+
+    return {
+        'cas_hlasovania': summary.get('datum_cas'),
+        'schodza': summary.get('schodza'),
+        'cislo_schodze': summary.get('schodza').split()[-1],
+        'cislo_hlasovania': summary.get('cislo_hlasovania'),
+        'nazov_hlasovania': summary.get('nazov_hlasovania'),
+        'vysledok_hlasovania': summary.get('vysledok_hlasovania'),
+        'url_hlasovania': voting_url(voting_id),
+        'pritomni': stats.get('pritomni'),
+        'hlasujucich': stats.get('hlasujucich'),
+        'za_hlasovalo': stats.get('za_hlasovalo'),
+        'proti_hlasovalo': stats.get('proti_hlasovalo'),
+        'zdrzalo_sa': stats.get('zdrzalo_sa'),
+        'nehlasovalo': stats.get('nehlasovalo'),
+        'nepritomni': stats.get('nepritomni'),
+        'neplatne': stats.get('neplatne'),
+        'hlasovanie': results
+    }
+
+def scrape_voting(voting_id, logger):
+    """Fetch and parse one voting.
+
+    Returns:
+        tuple: (record, failed) - the record is None for nonexistent and failed votings,
+            failed is True if the request or the parsing failed, i.e. the voting should be retried.
+    """
+    content, failed = _fetch_voting(voting_id, logger)
+    if content is None:
+        return None, failed
+    with metrics.timer('parse_seconds', stage='voting'):
+        record = build_voting_record(voting_id, content, logger)
+    return record, record is None
+
+async def _scrape_voting_data_async(voting_ids, concurrency, rate, logger, emit, failed, queue_size: int = 64):
+    """Fetch and parse votings with at most `concurrency` requests in flight.
+
+    Requests are paced by a per-host token bucket instead of a fixed sleep. The blocking
+    fetch and parse functions run in a dedicated thread pool. Finished votings are passed
+    to `emit` in voting ID order, so the output is the same as in the serial path; no
+    voting is fetched more than `queue_size` positions ahead of the oldest one not yet emitted.
+    """
+    loop = asyncio.get_running_loop()
+    limiter = HostRateLimiter(rate)
+    pending = enumerate(voting_ids)
+    finished = {}
+    next_seq = 0
+    window = asyncio.Condition()
+
+    def flush():
+        nonlocal next_seq
+        while next_seq in finished:
+            voting_id, record, voting_failed = finished.pop(next_seq)
+            if record:
+                emit(voting_id, record)
+            elif voting_failed:
+                failed.append(voting_id)
+            next_seq += 1
+
+    async def worker(executor):
+        for seq, voting_id in pending:
+            # a voting stuck in retries must not let the others run ahead without bound
+            async with window:
+                await window.wait_for(lambda: seq - next_seq <= queue_size)
+            await limiter.bucket(voting_url(voting_id)).acquire()
+            logger.info(f"Scraping data for voting ID {voting_id}")
+            record, voting_failed = await loop.run_in_executor(executor, scrape_voting, voting_id, logger)
+            finished[seq] = (voting_id, record, voting_failed)
+            flush()
+            async with window:
+                window.notify_all()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        await asyncio.gather(*(worker(executor) for _ in range(concurrency)))
+
+def scrape_voting_data(id_start: int, id_end: int, save_to_file: str | None, logger = None, concurrency: int = 1, rate: float = 10.0, fsync_every: int = 100, voting_ids = None, failed: list | None = None, parse_workers: int = 0, redrive_failed: bool = True, on_voting=None):
+    """Scrape all votings in the ID range (both ends included) and save them to a JSON or JSONL file.
+
+    With a `.jsonl` file every voting is appended as soon as it is parsed and nothing is
+    kept in memory - a lazy `JsonlVotings` view of the file is returned instead of a dict.
+    A `.parquet` path is written as a columnar dataset (see `scrape.columnar`) in batches,
+    into a `.sqlite`/`.db` store (see `scrape.store`) the votings are upserted.
+
+    Args:
+        id_start (int): The first voting ID.
+        id_end (int): The last voting ID.
+        save_to_file (str | None): The JSON/JSONL file, the Parquet dataset or the SQLite store to save the data to.
+        logger (Logger): The logger object.
+        concurrency (int): Number of requests in flight. 1 keeps the original serial scraping.
+        rate (float): Maximum number of requests per second per host when concurrency > 1.
+        fsync_every (int): Number of JSONL records between two fsync calls.
+        voting_ids (Iterable[int]): Scrape these IDs instead of the range, in the given order.
+        failed (list): IDs of votings whose request or parsing failed are appended here.
+        parse_workers (int): Parse in this many processes fed by `concurrency` fetching threads
+            (see `scrape.pipeline`). 0 parses in the fetching threads.
+        redrive_failed (bool): Retry the failed votings once more at the end of the run. The
+            re-driven votings are put back in voting ID order in JSON and JSONL files (Parquet
+            and SQLite are read ordered by voting ID anyway).
+        on_voting (Callable): Called with (voting_id, record) for every voting, in voting ID order
+            with the re-driven votings at the end (`write_votings` puts them back in order),
+            instead of saving it - nothing is written or kept in memory and None is returned.
+            `save_to_file` then only names the failed IDs file.
+    """
     logger = logger or logging.getLogger(__name__)
-    data = {}
-    for voting_id in range(id_start, id_end + 1):
-        logger.info(f"Scraping data for voting ID {voting_id}")
-        content = fetch_voting_content(voting_id, logger)
-        if content:
-            summary = parse_voting_summary(content, logger)
-            stats = parse_voting_stats(content, logger)
-            results = parse_voting_results(content, logger)
-            
-            if summary and stats and results:
-                data[voting_id] = {
-                    'cas_hlasovania': summary.get('datum_cas'),
-                    'schodza': summary.get('schodza'),
-                    'cislo_schodze': summary.get('schodza').split()[-1],
-                    'cislo_hlasovania': summary.get('cislo_hlasovania'),
-                    'nazov_hlasovania': summary.get('nazov_hlasovania'),
-                    'vysledok_hlasovania': summary.get('vysledok_hlasovania'),
-                    'url_hlasovania': f"https://www.nrsr.sk/web/Default.aspx?sid=schodze/hlasovanie/hlasklub&ID={voting_id}",
-                    'pritomni': stats.get('pritomni'),
-                    'hlasujucich': stats.get('hlasujucich'),
-                    'za_hlasovalo': stats.get('za_hlasovalo'),
-                    'proti_hlasovalo': stats.get('proti_hlasovalo'),
-                    'zdrzalo_sa': stats.get('zdrzalo_sa'),
-                    'nehlasovalo': stats.get('nehlasovalo'),
-                    'nepritomni': stats.get('nepritomni'),
-                    'neplatne': stats.get('neplatne'),
-                    'hlasovanie': results
-                }
-                time.sleep(0.1)  # Pause for 0.1 second between each successful request
-    
-    with open(save_to_file, 'w') as f:
-        json.dump(data, f, indent=4)
-    
-    logger.info(f"Scraping completed. Data saved to {save_to_file}")
-    return data
\ No newline at end of file
+    voting_ids = voting_ids if voting_ids is not None else range(id_start, id_end + 1)
+    failed = failed if failed is not None else []
+    redriven = []
+
+    if on_voting is not None:
+        writer = None
+        data = None
+        emit = on_voting
+    elif is_jsonl(save_to_file):
+        writer = JsonlWriter(save_to_file, fsync_every=fsync_every)
+        data = JsonlVotings(save_to_file)
+        emit = writer.write
+    elif is_parquet(save_to_file):
+        writer = ParquetVotingWriter(save_to_file)
+        data = ParquetVotings(save_to_file)
+        emit = writer.write
+    elif is_sqlite(save_to_file):
+        writer = SqliteVotingWriter(save_to_file)
+        data = SqliteVotings(save_to_file)
+        emit = writer.write
+    else:
+        writer = None
+        data = {}
+        emit = data.__setitem__
+
+    sink = emit
+
+    def emit(voting_id, record):
+        metrics.inc('votings_scraped')
+        sink(voting_id, record)
+
+    try:
+        if parse_workers > 0:
+            # imported here as the pipeline module builds on this one
+            from scrape.pipeline import scrape_votings_pipelined
+            scrape_votings_pipelined(voting_ids, emit, failed, logger, fetch_workers=concurrency, parse_workers=parse_workers, rate=rate)
+        elif concurrency > 1:
+            asyncio.run(_scrape_voting_data_async(voting_ids, concurrency, rate, logger, emit, failed))
+        else:
+            for voting_id in voting_ids:
+                logger.info(f"Scraping data for voting ID {voting_id}")
+                record, voting_failed = scrape_voting(voting_id, logger)
+                if record:
+                    emit(voting_id, record)
+                    time.sleep(0.1)  # Pause for 0.1 second between each successful request
+                elif voting_failed:
+                    failed.append(voting_id)
+
+        if failed and redrive_failed:
+            def attempt(voting_id):
+                record, voting_failed = scrape_voting(voting_id, logger)
+                if record:
+                    emit(voting_id, record)
+                    redriven.append(voting_id)
+                return not voting_failed
+            failed[:] = redrive(failed, attempt, logger)
+    finally:
+        if writer:
+            writer.close()
+
+    if redriven and is_jsonl(save_to_file) and writer is not None:
+        # the re-driven votings were appended at the end of the file
+        data = write_votings(iter_jsonl(save_to_file), save_to_file, fsync_every=fsync_every)
+    elif redriven and isinstance(data, dict):
+        data = {voting_id: data[voting_id] for voting_id in sorted(data, key=int)}
+    if save_to_file and data is not None and writer is None:
+        with metrics.timer('write_seconds', format='json'), open(save_to_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+    if failed:
+        metrics.inc('votings_failed', len(failed))
+        logger.warning(f"Scraping failed for {len(failed)} votings: {failed}")
+        if save_to_file:
+            with open(failed_ids_file(save_to_file), 'w', encoding='utf-8') as f:
+                json.dump(sorted(failed), f)
+    if save_to_file and on_voting is None:
+        logger.info(f"Scraping completed. Data saved to {save_to_file}")
+
+    return data
@@ -0,0 +1,28 @@
+import logging
+import pytest
+from fixture_server import base_url, start_server
+from scrape import client, metrics
+from scrape.policy import AimdLimiter, CircuitBreaker, FetchPolicy
+
+# The fixture server answers IDs above this with the nrsr.sk error page
+MAX_VOTING_ID = 1011
+
+@pytest.fixture(autouse=True)
+def fresh_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+@pytest.fixture
+def logger():
+    return logging.getLogger('tests')
+
+@pytest.fixture
+def server(monkeypatch):
+    """The fixture server with the client pointed to it - no page cache, no retries."""
+    srv = start_server(max_voting_id=MAX_VOTING_ID)
+    monkeypatch.setattr(client, 'BASE_URL', base_url(srv))
+    client.configure(policy=FetchPolicy(retries=0, limiter=AimdLimiter(max_limit=16, initial=16), breaker=CircuitBreaker(failure_threshold=1000)))
+    yield srv
+    srv.shutdown()
+    srv.server_close()
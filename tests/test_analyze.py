@@ -0,0 +1,29 @@
+from analyze.cohesion import party_cohesion, rebellions
+from analyze.vote_matrix import NO_PARTY_NAME, VoteMatrix
+
+def _vote(member_id, vote, party):
+    return {'poslanec_id': str(member_id), 'poslanec_meno': f"Poslanec {member_id}", 'hlas_id': vote, 'hlasovanie_klub': party}
+
+VOTINGS = {
+    '1': {'cislo_schodze': '1', 'cas_hlasovania': '12. 3. 2024 10:05', 'hlasovanie': [
+        _vote(1, '[Z]', 'A'), _vote(2, '[P]', 'A'), _vote(3, '[Z]', None), _vote(4, '[Z]', 'B'),
+    ]},
+    '2': {'cislo_schodze': '1', 'cas_hlasovania': '12. 3. 2024 10:10', 'hlasovanie': [
+        _vote(1, '[Z]', 'A'), _vote(2, '[Z]', 'A'), _vote(3, '[P]', None), _vote(4, '[0]', 'B'),
+    ]},
+}
+
+def test_party_cohesion_with_missing_party():
+    matrix = VoteMatrix.from_votings(VOTINGS)
+    assert NO_PARTY_NAME in matrix.party_names
+
+    cohesion = party_cohesion(matrix).set_index(['voting_id', 'poslanec_klub'])
+    assert cohesion.loc[(1, 'A'), 'rice_index'] == 0
+    assert cohesion.loc[(2, 'A'), 'rice_index'] == 1
+    assert cohesion.loc[(1, NO_PARTY_NAME), 'za'] == 1
+    assert len(rebellions(matrix)) == 4
+
+def test_saved_matrix_with_none_party(tmp_path):
+    matrix = VoteMatrix.from_votings(VOTINGS)
+    matrix.party_names[matrix.party_names.index(NO_PARTY_NAME)] = None
+    assert VoteMatrix(matrix.votes, matrix.parties, matrix.voting_ids, matrix.member_ids, matrix.meetings, matrix.dates, matrix.party_names, matrix.member_names).party_names.count(NO_PARTY_NAME) == 1
@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+from convert.convert_to_excel import write_csv, write_xlsx
+
+def _chunks(fail_after=None):
+    for i in range(3):
+        if fail_after is not None and i == fail_after:
+            raise ValueError('row check failed')
+        yield pd.DataFrame({'voting_id': range(i * 10, i * 10 + 10), 'hlas': ['[Z]'] * 10})
+
+def test_xlsx_split_into_sheets_and_files(tmp_path):
+    path = str(tmp_path / 'votes.xlsx')
+    assert write_xlsx(path, [('hlasovanie', _chunks())], max_rows=12) == [path]
+    sheets = pd.read_excel(path, sheet_name=None)
+    assert list(sheets) == ['hlasovanie', 'hlasovanie_2', 'hlasovanie_3']
+    assert pd.concat(sheets.values(), ignore_index=True)['voting_id'].tolist() == list(range(30))
+
+    files = write_xlsx(path, [('hlasovanie', _chunks())], max_rows=12, split='files')
+    assert files == [path, str(tmp_path / 'votes_2.xlsx'), str(tmp_path / 'votes_3.xlsx')]
+    assert pd.concat([pd.read_excel(file) for file in files], ignore_index=True)['voting_id'].tolist() == list(range(30))
+
+@pytest.mark.parametrize('name', ['votes.xlsx', 'votes.csv', 'votes.csv.gz'])
+def test_failed_export_leaves_no_partial_file(tmp_path, name):
+    path = str(tmp_path / name)
+    write = write_xlsx if name.endswith('.xlsx') else write_csv
+    with pytest.raises(ValueError):
+        write(path, [('hlasovanie', _chunks(fail_after=2)), ('poslanci', [pd.DataFrame({'poslanec_id': [1]})])])
+    assert list(tmp_path.iterdir()) == []
+
+def test_csv_with_lookup_tables(tmp_path):
+    path = str(tmp_path / 'votes.csv.gz')
+    files = write_csv(path, [('hlasovanie', _chunks()), ('poslanci', [pd.DataFrame({'poslanec_id': [1, 2]})])])
+    assert files == [path, str(tmp_path / 'votes_poslanci.csv.gz')]
+    assert pd.read_csv(path)['voting_id'].tolist() == list(range(30))
+    assert pd.read_csv(files[1])['poslanec_id'].tolist() == [1, 2]
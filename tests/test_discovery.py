@@ -0,0 +1,18 @@
+import pytest
+from conftest import MAX_VOTING_ID
+from scrape.discovery import VotingIdProbe, find_frontier, map_voting_ranges, ranges_to_ids
+
+def test_find_frontier(server, logger):
+    assert find_frontier(1000, logger) == MAX_VOTING_ID
+
+def test_map_voting_ranges(server, logger):
+    ranges = map_voting_ranges(1000, MAX_VOTING_ID + 100, logger, step=20)
+    assert ranges == [(1000, MAX_VOTING_ID)]
+    assert ranges_to_ids(ranges) == list(range(1000, MAX_VOTING_ID + 1))
+
+def test_empty_range(logger):
+    assert map_voting_ranges(1010, 1000, logger) == []
+
+def test_probe_needs_an_attempt(logger):
+    with pytest.raises(ValueError):
+        VotingIdProbe(logger, retries=0)
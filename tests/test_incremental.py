@@ -0,0 +1,33 @@
+import json
+import pytest
+from conftest import MAX_VOTING_ID
+from scrape.incremental import update_voting_data
+from scrape.jsonl import iter_votings
+from scrape.voting import failed_ids_file, scrape_voting_data
+
+START_ID = 1000
+END_ID = MAX_VOTING_ID + 2
+FORMATS = ['json', 'jsonl', 'parquet', 'sqlite']
+
+@pytest.mark.parametrize('extension', FORMATS)
+def test_update_matches_full_scrape(server, logger, tmp_path, extension):
+    full = str(tmp_path / f"full.{extension}")
+    scrape_voting_data(START_ID, END_ID, full, logger=logger, concurrency=4, rate=1000.0)
+
+    # 1003 failed in the first run, so the update backfills it below the high-watermark
+    dataset = str(tmp_path / f"dataset.{extension}")
+    scrape_voting_data(START_ID, 1006, dataset, logger=logger, voting_ids=[1000, 1001, 1002, 1004, 1005, 1006], concurrency=4, rate=1000.0)
+    with open(failed_ids_file(dataset), 'w', encoding='utf-8') as f:
+        json.dump([1003], f)
+
+    new_data = update_voting_data(dataset, START_ID, END_ID, logger=logger, concurrency=4, rate=1000.0)
+    assert sorted(int(voting_id) for voting_id in new_data) == [1003] + list(range(1007, MAX_VOTING_ID + 1))
+    assert list(iter_votings(dataset)) == list(iter_votings(full))
+    with open(failed_ids_file(dataset), 'r', encoding='utf-8') as f:
+        assert json.load(f) == []
+
+@pytest.mark.parametrize('extension', FORMATS)
+def test_update_of_missing_dataset(server, logger, tmp_path, extension):
+    dataset = str(tmp_path / f"dataset.{extension}")
+    update_voting_data(dataset, START_ID, END_ID, logger=logger, concurrency=4, rate=1000.0)
+    assert [int(voting_id) for voting_id, _ in iter_votings(dataset)] == list(range(START_ID, MAX_VOTING_ID + 1))
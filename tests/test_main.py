@@ -0,0 +1,16 @@
+import os
+import subprocess
+import sys
+import pytest
+
+MAIN = os.path.join(os.path.dirname(__file__), os.pardir, 'src', 'main.py')
+
+@pytest.mark.parametrize('options', [['--format', 'jsonl', '--save-to', 'documents.xlsx'], ['--save-to', 'documents.json'], []])
+def test_document_type_rejects_json_output(tmp_path, options):
+    result = subprocess.run(
+        [sys.executable, MAIN, '--type', 'document', '--input-file', 'votings.jsonl', *options],
+        cwd=tmp_path, capture_output=True, text=True
+    )
+    assert result.returncode == 2
+    assert '--type document saves to .xlsx' in result.stderr
+    assert not (tmp_path / 'scraper.log').exists()
@@ -0,0 +1,28 @@
+import json
+from scrape import metrics
+
+def test_mixed_label_types(tmp_path):
+    metrics.inc('fetch_requests', kind='voting', status=200)
+    metrics.inc('fetch_requests', kind='voting', status='ReadTimeout')
+    metrics.inc('fetch_requests', kind='voting', status=200)
+    metrics.observe('fetch_seconds', 0.02, kind='voting', status=200)
+    metrics.observe('fetch_seconds', 0.5, kind='voting', status='too_large')
+
+    counters = metrics.snapshot()['counters']
+    assert counters['fetch_requests{kind=voting,status=200}'] == 2
+    assert counters['fetch_requests{kind=voting,status=ReadTimeout}'] == 1
+    assert metrics.summary_lines()
+
+    metrics.write_metrics(str(tmp_path / 'metrics.json'))
+    assert json.loads((tmp_path / 'metrics.json').read_text())['counters'] == counters
+
+def test_prometheus_families_typed():
+    metrics.inc('fetch_requests', kind='voting', status=200)
+    metrics.inc('fetch_requests', kind='member', status='ConnectionError')
+    metrics.observe('fetch_seconds', 0.02, kind='voting')
+
+    lines = metrics.to_prometheus().splitlines()
+    assert lines.count('# TYPE nrsr_fetch_requests_total counter') == 1
+    assert lines.count('# TYPE nrsr_fetch_seconds histogram') == 1
+    assert 'nrsr_fetch_requests_total{kind="member",status="ConnectionError"} 1' in lines
+    assert 'nrsr_fetch_seconds_bucket{kind="voting",le="+Inf"} 1' in lines
@@ -0,0 +1,61 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from scrape import pipeline
+
+def _run(voting_ids, logger, **kwargs):
+    """Run the pipeline in a thread, so a deadlock fails the test instead of hanging it."""
+    emitted, failed = [], []
+    thread = threading.Thread(
+        target=pipeline.scrape_votings_pipelined,
+        args=(voting_ids, lambda voting_id, record: emitted.append(voting_id), failed, logger),
+        kwargs=dict(rate=1000.0, **kwargs),
+        daemon=True
+    )
+    thread.start()
+    thread.join(timeout=20)
+    assert not thread.is_alive(), 'the pipeline deadlocked'
+    return emitted, failed
+
+@pytest.fixture
+def in_threads(monkeypatch):
+    # parse in threads, so the patched parser is used and may sleep
+    monkeypatch.setattr(pipeline, 'ProcessPoolExecutor', ThreadPoolExecutor)
+
+def test_slow_first_parse_with_empty_pages(monkeypatch, in_threads, logger):
+    def fetch(voting_id, logger):
+        return (b'<html></html>', False) if voting_id == 0 else (None, False)
+
+    def parse(voting_id, content):
+        time.sleep(0.5)
+        return {'voting_id': voting_id}, 0.5
+
+    monkeypatch.setattr(pipeline, '_fetch_voting', fetch)
+    monkeypatch.setattr(pipeline, '_parse_voting', parse)
+    emitted, failed = _run(range(50), logger, fetch_workers=8, parse_workers=2, queue_size=4)
+    assert emitted == [0]
+    assert failed == []
+
+def test_reorder_window_and_fetch_errors(monkeypatch, in_threads, logger):
+    started = []
+
+    def fetch(voting_id, logger):
+        started.append(voting_id)
+        if voting_id == 0:
+            time.sleep(0.5)
+        if voting_id == 5:
+            raise ValueError('unexpected')
+        return b'<html></html>', False
+
+    monkeypatch.setattr(pipeline, '_fetch_voting', fetch)
+    monkeypatch.setattr(pipeline, '_parse_voting', lambda voting_id, content: ({'voting_id': voting_id}, 0.0))
+    started_while_stuck = []
+    probe = threading.Timer(0.3, lambda: started_while_stuck.append(len(started)))
+    probe.start()
+    emitted, failed = _run(range(40), logger, fetch_workers=8, parse_workers=2, queue_size=4)
+
+    # while ID 0 is stuck, nothing beyond queue_size positions ahead of it is fetched
+    assert started_while_stuck == [5]
+    assert emitted == [voting_id for voting_id in range(40) if voting_id != 5]
+    assert failed == [5]
@@ -0,0 +1,45 @@
+import threading
+import time
+import pytest
+from scrape import client
+from scrape.policy import AimdLimiter, CircuitBreaker, FetchPolicy
+
+def _get(url, logger, results):
+    try:
+        results.append(client.get(url, logger))
+    except Exception as e:
+        results.append(e)
+
+def test_breaker_recovers_from_an_unexpected_probe_error(server, logger, monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    limiter = AimdLimiter(max_limit=1, initial=1)
+    client.configure(policy=FetchPolicy(retries=0, limiter=limiter, breaker=breaker))
+    breaker.record_failure(logger)
+    time.sleep(0.1)
+
+    download = client._download
+    monkeypatch.setattr(client, '_download', lambda *args, **kwargs: (_ for _ in ()).throw(RuntimeError('unexpected')))
+    url = f"{client.SITE_URL}?sid=schodze/hlasovanie/hlasklub&ID=1000"
+    with pytest.raises(RuntimeError):
+        client.get(url, logger)
+    monkeypatch.setattr(client, '_download', download)
+
+    # the next request probes again (and gets the only limiter slot) instead of waiting forever
+    results = []
+    thread = threading.Thread(target=_get, args=(url, logger, results), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive(), 'the breaker stayed half-open'
+    assert results[0].status_code == 200
+    assert not breaker.is_open
+
+def test_breaker_probe_failure_reopens(logger):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    assert breaker.wait(logger) is False
+    breaker.record_failure(logger)
+    breaker.record_failure(logger)
+    assert breaker.is_open
+    assert breaker.wait(logger) is True
+    breaker.record_failure(logger)
+    assert breaker.is_open
+    assert breaker._timeout == 0.1
@@ -0,0 +1,45 @@
+import filecmp
+import os
+import threading
+import time
+from conftest import MAX_VOTING_ID
+from scrape.shards import WorkQueue, merge_shards, run_worker
+from scrape.voting import failed_ids_file, scrape_voting_data
+
+def test_expired_lease_is_requeued(tmp_path):
+    with WorkQueue(str(tmp_path / 'queue.sqlite')) as work_queue:
+        assert work_queue.create_shards(1000, 1011, shard_size=5) == 3
+        assert work_queue.create_shards(1000, 1011, shard_size=5) == 0
+        shard_id, start_id, end_id = work_queue.lease('a', lease_seconds=0.05)
+        assert (start_id, end_id) == (1000, 1004)
+        assert work_queue.lease('b')[1:] == (1005, 1009)
+
+        time.sleep(0.1)
+        assert work_queue.lease('c')[0] == shard_id
+        assert not work_queue.heartbeat(shard_id, 'a', lease_seconds=0.05)
+        assert not work_queue.complete(shard_id, 'a', 'a.jsonl')
+        assert work_queue.complete(shard_id, 'c', 'c.jsonl')
+        assert work_queue.status() == {'done': 1, 'leased': 1, 'pending': 1}
+
+def test_merged_shards_match_single_run(server, logger, tmp_path):
+    end_id = MAX_VOTING_ID + 2
+    single = str(tmp_path / 'single.jsonl')
+    scrape_voting_data(1000, end_id, single, logger=logger, concurrency=4, rate=1000.0)
+
+    queue = str(tmp_path / 'queue.sqlite')
+    with WorkQueue(queue) as work_queue:
+        work_queue.create_shards(1000, end_id, shard_size=4)
+    workers = [
+        threading.Thread(target=run_worker, args=(queue, str(tmp_path / 'shards')), kwargs={'logger': logger, 'worker': worker, 'concurrency': 4, 'rate': 1000.0})
+        for worker in ('a', 'b')
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    merged = str(tmp_path / 'merged.jsonl')
+    merge_shards(queue, merged, logger=logger)
+    assert filecmp.cmp(single, merged, shallow=False)
+    # the IDs past the last voting do not exist, they are not failed
+    assert not os.path.exists(failed_ids_file(merged))
@@ -0,0 +1,17 @@
+import filecmp
+from scrape.document import add_documents_to_voting_data
+from scrape.member import add_member_info_to_voting_data
+from scrape.stages import scrape_enriched_voting_data
+from scrape.voting import scrape_voting_data
+
+def test_overlapped_stages_match_sequential_stages(server, logger, tmp_path):
+    votings = str(tmp_path / 'votings.jsonl')
+    documents = str(tmp_path / 'documents.jsonl')
+    sequential = str(tmp_path / 'sequential.jsonl')
+    scrape_voting_data(1000, 1005, votings, logger=logger, concurrency=4, rate=1000.0)
+    add_documents_to_voting_data(votings, logger=logger, save_to_file=documents)
+    add_member_info_to_voting_data(documents, logger=logger, save_to_file=sequential)
+
+    overlapped = str(tmp_path / 'overlapped.jsonl')
+    scrape_enriched_voting_data(1000, 1005, overlapped, logger=logger, concurrency=4, rate=1000.0)
+    assert filecmp.cmp(sequential, overlapped, shallow=False)
@@ -0,0 +1,29 @@
+import copy
+from scrape import store
+from scrape.jsonl import iter_votings, write_votings
+from scrape.voting import scrape_voting_data
+
+def test_round_trip_and_upsert(server, logger, tmp_path):
+    data = scrape_voting_data(1000, 1003, None, logger=logger, concurrency=4, rate=1000.0)
+    path = str(tmp_path / 'votings.sqlite')
+    write_votings(data.items(), path)
+    assert list(iter_votings(path)) == [(str(voting_id), voting) for voting_id, voting in sorted(data.items())]
+
+    # writing a voting again replaces it, the other votings are kept
+    changed = copy.deepcopy(data[1001])
+    changed['nazov_hlasovania'] = 'Zmenený názov'
+    write_votings([(1001, changed)], path)
+    stored = dict(iter_votings(path))
+    assert len(stored) == 4
+    assert stored['1001']['nazov_hlasovania'] == 'Zmenený názov'
+
+def test_votes_of_member_without_date(server, logger, tmp_path):
+    data = scrape_voting_data(1000, 1001, None, logger=logger)
+    data[1001]['cas_hlasovania'] = ''
+    path = str(tmp_path / 'votings.sqlite')
+    write_votings(data.items(), path)
+    member_id = data[1000]['hlasovanie'][0]['poslanec_id']
+
+    assert [vote['voting_id'] for vote in store.votes_of_member(path, member_id)] == [1000, 1001]
+    assert store.votes_of_member(path, member_id)[1]['datum'] is None
+    assert [vote['voting_id'] for vote in store.votes_of_member(path, member_id, date_from='1990-01-01')] == [1000]
@@ -0,0 +1,20 @@
+import filecmp
+import pytest
+from conftest import MAX_VOTING_ID
+from scrape.jsonl import iter_votings
+from scrape.voting import scrape_voting_data
+
+START_ID = 1000
+END_ID = MAX_VOTING_ID + 3
+
+@pytest.mark.parametrize('extension', ['json', 'jsonl'])
+def test_serial_concurrent_and_pipelined_output_identical(server, logger, tmp_path, extension):
+    serial = tmp_path / f"serial.{extension}"
+    scrape_voting_data(START_ID, END_ID, str(serial), logger=logger)
+    ids = [int(voting_id) for voting_id, _ in iter_votings(str(serial))]
+    assert ids == list(range(START_ID, MAX_VOTING_ID + 1))
+
+    for name, kwargs in [('concurrent', dict(concurrency=4)), ('pipelined', dict(concurrency=4, parse_workers=2))]:
+        path = tmp_path / f"{name}.{extension}"
+        scrape_voting_data(START_ID, END_ID, str(path), logger=logger, rate=1000.0, **kwargs)
+        assert filecmp.cmp(serial, path, shallow=False), name